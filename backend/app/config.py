@@ -3,11 +3,52 @@ from functools import lru_cache
 
 class Settings(BaseSettings):
     gemini_api_key: str
+    gemini_base_url: str = ""
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "business_growth"
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_max_entries: int = 10_000
+    password_bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 64
+    password_hash_queue_timeout_seconds: float = 5.0
+    check_query_plans_on_startup: bool = False
+    index_builds_in_background: bool = False
+    profiling_admin_token: str = ""
+    profiling_sample_rate: float = 0.0
+    profiling_interval_seconds: float = 0.001
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 200
+    export_batch_size: int = 2000
+    ingest_chunk_size: int = 1000
+    metrics_storage: str = "collection"  # or "timeseries" (MongoDB 7.0+)
+    idempotency_ttl_seconds: int = 24 * 3600
+    idempotency_lease_seconds: float = 300.0
+    interaction_archive_after_days: int = 90
+    interaction_purge_after_days: int = 0
+    gemini_timeout_seconds: float = 30.0
+    gemini_executor_workers: int = 16
+    gemini_max_retries: int = 2
+    gemini_retry_base_delay_seconds: float = 0.5
+    gemini_retry_max_delay_seconds: float = 8.0
+    gemini_breaker_failure_threshold: int = 5
+    gemini_breaker_reset_seconds: float = 30.0
+    disconnect_poll_seconds: float = 0.5
+    ai_cache_max_entries: int = 1024
+    ai_cache_shared: bool = False
+    ai_cache_stale_grace_seconds: int = 7 * 24 * 3600
+    ai_max_in_flight: int = 16
+    ai_max_in_flight_per_business: int = 2
+    ai_max_in_flight_anonymous: int = 4
+    ai_max_queue: int = 100
+    ai_queue_timeout_seconds: float = 10.0
+    ai_job_workers: int = 4
+    ai_job_stale_seconds: float = 600.0
+    ai_metrics_token_budget: int = 1500
+    ai_metrics_recent_points: int = 12
     
     class Config:
         env_file = ".env"
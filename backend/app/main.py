@@ -1,7 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import business, ai, auth
+from fastapi.responses import JSONResponse, Response
+from pymongo import monitoring
+from app.routers import business, ai, auth, admin
 from app.models.database import init_db, close_db
+from app.services.gemini_service import gemini_service, GeminiTimeoutError, GeminiUnavailableError
+from app.services import passwords
+from app.services.instrumentation import (
+    PrometheusMiddleware,
+    METRICS_CONTENT_TYPE,
+    mongo_listener,
+    monitor_event_loop_lag,
+    render_metrics,
+    stats_collector
+)
+from app.services.profiling import ProfilingMiddleware
+from app.services.admission import AdmissionRejected
+from app.services.job_queue import job_queue
+from app.services.idempotency import IdempotencyConflict
+from app.services.query_plans import verify_query_plans
+from app.config import get_settings
+import asyncio
 
 app = FastAPI(
     title="Business Growth Platform API",
@@ -17,20 +36,63 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(PrometheusMiddleware)
+
+# Registered before init_db creates the client, so every driver command is timed
+monitoring.register(mongo_listener)
+stats_collector.register("gemini", gemini_service.stats)
+stats_collector.register("principal_cache", auth.principal_cache.stats)
+stats_collector.register("password_hashing", passwords.stats)
+lag_monitor = None
 
 # Initialize database
 @app.on_event("startup")
 async def startup_event():
     await init_db()
+    settings = get_settings()
+    if settings.check_query_plans_on_startup:
+        await verify_query_plans()
+    await job_queue.start(settings.ai_job_workers, settings.ai_job_stale_seconds)
+    global lag_monitor
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if lag_monitor:
+        lag_monitor.cancel()
+    await job_queue.stop()
     await close_db()
 
+@app.exception_handler(GeminiTimeoutError)
+async def gemini_timeout_handler(request: Request, exc: GeminiTimeoutError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.exception_handler(GeminiUnavailableError)
+async def gemini_unavailable_handler(request: Request, exc: GeminiUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(IdempotencyConflict)
+async def idempotency_conflict_handler(request: Request, exc: IdempotencyConflict):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(business.router)
 app.include_router(ai.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def root():
@@ -43,3 +105,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
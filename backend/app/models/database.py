@@ -1,8 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
+from bson import Binary, ObjectId
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from pymongo import InsertOne, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 from app.config import get_settings
+from app.models.indexes import ensure_indexes, COLLECTION_LAYOUT, TIMESERIES_LAYOUT
+from app.models.periods import format_period, parse_period, MONTH
+import zlib
 
 settings = get_settings()
 
@@ -14,6 +19,236 @@ database = None
 businesses_collection = None
 metrics_collection = None
 interactions_collection = None
+interactions_archive_collection = None
+ai_cache_collection = None
+jobs_collection = None
+rollups_collection = None
+idempotency_collection = None
+forecasts_collection = None
+metrics_repository = None
+index_build_task = None
+
+# Time-series options for business_metrics. Points are monthly, so buckets span
+# up to a year of one (business_id, metric_type) series. Custom bucketing needs
+# MongoDB 6.3+, but replacing a point deletes on `period`, a non-meta field,
+# which needs 7.0+, so 7.0 is the minimum for this layout
+TIMESERIES_OPTIONS = {
+    "timeField": "period",
+    "metaField": "meta",
+    "bucketMaxSpanSeconds": 365 * 24 * 3600,
+    "bucketRoundingSeconds": 365 * 24 * 3600
+}
+
+# Cold storage for old interactions; zstd block compression on top of the
+# per-document body compression
+ARCHIVE_STORAGE_ENGINE = {"wiredTiger": {"configString": "block_compressor=zstd"}}
+
+# Interaction history lists only this much of each response
+INTERACTION_PREVIEW_CHARS = 200
+
+# Responses shorter than this are stored as plain text; zlib overhead outweighs the saving
+INTERACTION_COMPRESS_MIN_BYTES = 512
+
+# History listing projection. Documents written before previews existed only
+# have `response`, so their preview is cut server-side instead of shipping the body
+_LEGACY_RESPONSE = {"$ifNull": ["$response", ""]}
+INTERACTION_PREVIEW_PROJECTION = {
+    "query": 1,
+    "interaction_type": 1,
+    "timestamp": 1,
+    "preview": {"$ifNull": ["$preview", {"$substrCP": [_LEGACY_RESPONSE, 0, INTERACTION_PREVIEW_CHARS]}]},
+    "response_length": {"$ifNull": ["$response_length", {"$strLenCP": _LEGACY_RESPONSE}]}
+}
+
+# Metric fields kept in the time-series metaField, and every field callers see
+METRIC_META_FIELDS = ("business_id", "metric_type")
+METRIC_DOCUMENT_FIELDS = ("business_id", "metric_type", "value", "period", "granularity", "metadata", "timestamp")
+
+def metric_key(metric: Dict[str, Any]) -> Dict[str, Any]:
+    """The unique (business_id, metric_type, period) filter of a metric document"""
+    return {"business_id": metric["business_id"], "metric_type": metric["metric_type"], "period": metric["period"]}
+
+def metric_update(metric: Dict[str, Any]) -> Dict[str, Any]:
+    """Update writing a metric's value onto the document for its key"""
+    return {"$set": {
+        "value": metric["value"],
+        "granularity": metric["granularity"],
+        "metadata": metric["metadata"],
+        "timestamp": metric["timestamp"]
+    }}
+
+def _key_tuple(metric: Dict[str, Any]) -> tuple:
+    return (metric["business_id"], metric["metric_type"], metric["period"])
+
+class MetricsRepository:
+    """Access to business_metrics in either storage layout.
+
+    In the collection layout every metric is a plain document, unique on
+    (business_id, metric_type, period). In the time-series layout business_id
+    and metric_type live in the metaField. Callers always pass filters and get
+    documents in the plain shape; translation happens here.
+
+    Write methods return {"inserted", "upserted", "updated", "unchanged", "failed"}
+    counts, with "failed" mapping the index of each rejected metric to its error.
+    """
+
+    def __init__(self, collection, layout: str = COLLECTION_LAYOUT):
+        if layout not in (COLLECTION_LAYOUT, TIMESERIES_LAYOUT):
+            raise ValueError(f"Unknown metrics storage layout {layout!r}")
+        self.collection = collection
+        self.layout = layout
+        self.timeseries = layout == TIMESERIES_LAYOUT
+
+    def storage_filter(self, query: Any) -> Any:
+        """Rewrite a plain-shape filter (or $match) for this layout"""
+        if not self.timeseries:
+            return query
+        if isinstance(query, dict):
+            return {
+                (f"meta.{key}" if key in METRIC_META_FIELDS else key): self.storage_filter(value)
+                for key, value in query.items()
+            }
+        if isinstance(query, list):
+            return [self.storage_filter(value) for value in query]
+        return query
+
+    def storage_document(self, metric: Dict[str, Any]) -> Dict[str, Any]:
+        """The document actually written for a plain-shape metric"""
+        if not self.timeseries:
+            return dict(metric)
+        doc = {key: value for key, value in metric.items() if key not in METRIC_META_FIELDS}
+        doc["meta"] = {field: metric[field] for field in METRIC_META_FIELDS}
+        return doc
+
+    def read_projection(self, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Projection returning plain-shape documents"""
+        if not self.timeseries:
+            return projection
+        if projection is None:
+            projection = {field: 1 for field in METRIC_DOCUMENT_FIELDS}
+        return {
+            field: f"$meta.{field}" if field in METRIC_META_FIELDS and include else include
+            for field, include in projection.items()
+        }
+
+    def find(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None):
+        """Motor cursor over metrics matching a plain-shape filter"""
+        return self.collection.find(self.storage_filter(query), self.read_projection(projection))
+
+    def storage_pipeline(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rewrite a pipeline written against plain-shape documents for this layout"""
+        if not self.timeseries:
+            return pipeline
+        head = []
+        if pipeline and "$match" in pipeline[0]:
+            # Keep the leading $match first so it still filters on the meta index
+            head, pipeline = [{"$match": self.storage_filter(pipeline[0]["$match"])}], pipeline[1:]
+        flatten = {"$addFields": {field: f"$meta.{field}" for field in METRIC_META_FIELDS}}
+        return head + [flatten] + pipeline
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs):
+        """Run a pipeline written against plain-shape documents"""
+        return self.collection.aggregate(self.storage_pipeline(pipeline), **kwargs)
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        return await self.collection.count_documents(self.storage_filter(query))
+
+    async def estimated_document_count(self) -> int:
+        return await self.collection.estimated_document_count()
+
+    async def delete_many(self, query: Dict[str, Any]) -> int:
+        result = await self.collection.delete_many(self.storage_filter(query))
+        return result.deleted_count
+
+    async def upsert_one(self, metric: Dict[str, Any]) -> Dict[str, Any]:
+        """Write one metric onto its key and return the stored document"""
+        if not self.timeseries:
+            return await self.collection.find_one_and_update(
+                metric_key(metric),
+                metric_update(metric),
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        # Time-series collections cannot upsert: replace the point instead
+        await self.collection.delete_many(self.storage_filter(metric_key(metric)))
+        result = await self.collection.insert_one(self.storage_document(metric))
+        return {**metric, "_id": result.inserted_id}
+
+    async def upsert_many(self, metrics: List[Dict[str, Any]], with_ids: bool = False) -> Dict[str, Any]:
+        """Write metrics (one per key) onto their keys; with_ids sets `_id` on every metric"""
+        if self.timeseries:
+            return await self._replace_points(metrics)
+
+        summary = {"inserted": 0, "upserted": 0, "updated": 0, "unchanged": 0, "failed": {}}
+        operations = [UpdateOne(metric_key(m), metric_update(m), upsert=True) for m in metrics]
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            details, upserted = result.bulk_api_result, result.upserted_ids
+        except BulkWriteError as e:
+            details = e.details
+            upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+            summary["failed"] = {error["index"]: error.get("errmsg", "write failed") for error in details.get("writeErrors", [])}
+
+        summary["upserted"] = details.get("nUpserted", 0)
+        summary["updated"] = details.get("nModified", 0)
+        # Re-submitted metrics with an identical value match without modifying anything
+        summary["unchanged"] = details.get("nMatched", 0) - details.get("nModified", 0)
+
+        for index, upserted_id in upserted.items():
+            metrics[index]["_id"] = upserted_id
+        if with_ids:
+            existing = [m for i, m in enumerate(metrics) if "_id" not in m and i not in summary["failed"]]
+            if existing:
+                cursor = self.collection.find({"$or": [metric_key(m) for m in existing]}, {"business_id": 1, "metric_type": 1, "period": 1})
+                ids = {_key_tuple(doc): doc["_id"] async for doc in cursor}
+                for metric in existing:
+                    metric["_id"] = ids[_key_tuple(metric)]
+        return summary
+
+    async def insert_new(self, metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Insert metrics whose key does not exist yet; existing keys are reported as failed"""
+        summary = {"inserted": 0, "upserted": 0, "updated": 0, "unchanged": 0, "failed": {}}
+        if self.timeseries:
+            # No unique index to enforce the key, so check for existing points first
+            cursor = self.find({"$or": [metric_key(m) for m in metrics]}, {"business_id": 1, "metric_type": 1, "period": 1})
+            existing = {_key_tuple(doc) async for doc in cursor}
+            seen = set()
+            for index, metric in enumerate(metrics):
+                key = _key_tuple(metric)
+                if key in existing or key in seen:
+                    summary["failed"][index] = "Duplicate (business_id, metric_type, period)"
+                seen.add(key)
+
+        candidates = [(i, m) for i, m in enumerate(metrics) if i not in summary["failed"]]
+        if not candidates:
+            return summary
+        try:
+            result = await self.collection.bulk_write(
+                [InsertOne(self.storage_document(m)) for _, m in candidates],
+                ordered=False
+            )
+            summary["inserted"] = result.inserted_count
+        except BulkWriteError as e:
+            summary["inserted"] = e.details.get("nInserted", 0)
+            for error in e.details.get("writeErrors", []):
+                summary["failed"][candidates[error["index"]][0]] = error.get("errmsg", "write failed")
+        return summary
+
+    async def _replace_points(self, metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+        summary = {"inserted": 0, "upserted": 0, "updated": 0, "unchanged": 0, "failed": {}}
+        deleted = await self.delete_many({"$or": [metric_key(m) for m in metrics]})
+        docs = [self.storage_document(m) for m in metrics]
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            summary["failed"] = {error["index"]: error.get("errmsg", "write failed") for error in e.details.get("writeErrors", [])}
+        for metric, doc in zip(metrics, docs):
+            if "_id" in doc:
+                metric["_id"] = doc["_id"]
+        written = len(metrics) - len(summary["failed"])
+        summary["updated"] = min(deleted, written)
+        summary["upserted"] = written - summary["updated"]
+        return summary
 
 def get_database():
     """Get the MongoDB database instance"""
@@ -24,16 +259,51 @@ def get_businesses_collection():
     return businesses_collection
 
 def get_metrics_collection():
-    """Get metrics collection"""
+    """Get the raw metrics collection; prefer get_metrics_repository outside of maintenance tools"""
     return metrics_collection
 
+def get_metrics_repository() -> MetricsRepository:
+    """Get metrics access for the configured storage layout"""
+    return metrics_repository
+
+async def stored_metrics_layout(database) -> Optional[str]:
+    """Layout business_metrics currently has in the database, or None if it does not exist yet"""
+    cursor = await database.list_collections(filter={"name": "business_metrics"})
+    for info in await cursor.to_list(length=1):
+        return TIMESERIES_LAYOUT if info.get("type") == "timeseries" else COLLECTION_LAYOUT
+    return None
+
 def get_interactions_collection():
     """Get interactions collection"""
     return interactions_collection
 
-async def init_db():
+def get_interactions_archive_collection():
+    """Get archived (cold) interactions collection"""
+    return interactions_archive_collection
+
+def get_ai_cache_collection():
+    """Get the shared AI response cache collection (None when the shared tier is disabled)"""
+    return ai_cache_collection
+
+def get_rollups_collection():
+    """Get per-period metric rollups collection"""
+    return rollups_collection
+
+def get_jobs_collection():
+    """Get background AI jobs collection"""
+    return jobs_collection
+
+def get_idempotency_collection():
+    """Get stored responses for client idempotency keys"""
+    return idempotency_collection
+
+def get_forecasts_collection():
+    """Get nightly metric forecasts and anomalies collection"""
+    return forecasts_collection
+
+async def init_db(create_indexes: bool = True):
     """Initialize MongoDB connection and create indexes"""
-    global client, database, businesses_collection, metrics_collection, interactions_collection
+    global client, database, index_build_task, businesses_collection, metrics_collection, interactions_collection, interactions_archive_collection, ai_cache_collection, jobs_collection, rollups_collection, idempotency_collection, forecasts_collection, metrics_repository
     
     client = AsyncIOMotorClient(settings.mongodb_url)
     database = client[settings.database_name]
@@ -42,13 +312,37 @@ async def init_db():
     businesses_collection = database["businesses"]
     metrics_collection = database["business_metrics"]
     interactions_collection = database["ai_interactions"]
+    interactions_archive_collection = database["ai_interactions_archive"]
+    jobs_collection = database["ai_jobs"]
+    rollups_collection = database["metric_rollups"]
+    idempotency_collection = database["idempotency_keys"]
+    forecasts_collection = database["metric_forecasts"]
+    metrics_repository = MetricsRepository(metrics_collection, settings.metrics_storage)
+    
+    if not create_indexes:
+        return
+    
+    stored_layout = await stored_metrics_layout(database)
+    if stored_layout is None and metrics_repository.timeseries:
+        await database.create_collection("business_metrics", timeseries=TIMESERIES_OPTIONS)
+    elif stored_layout not in (None, settings.metrics_storage):
+        raise RuntimeError(
+            f"business_metrics uses the {stored_layout} layout but METRICS_STORAGE is {settings.metrics_storage}; "
+            f"run `python -m app.services.migrations to-{settings.metrics_storage}` first"
+        )
     
-    # Create indexes
-    await businesses_collection.create_index("name")
-    await businesses_collection.create_index("owner_email")
-    await metrics_collection.create_index("business_id")
-    await interactions_collection.create_index("business_id")
-    await interactions_collection.create_index("timestamp")
+    if not await database.list_collection_names(filter={"name": "ai_interactions_archive"}):
+        await database.create_collection("ai_interactions_archive", storageEngine=ARCHIVE_STORAGE_ENGINE)
+    
+    if settings.ai_cache_shared:
+        ai_cache_collection = database["ai_response_cache"]
+    
+    # Every collection's indexes are declared in app.models.indexes
+    index_build_task = await ensure_indexes(
+        database,
+        settings.metrics_storage,
+        background=settings.index_builds_in_background
+    )
 
 async def close_db():
     """Close MongoDB connection"""
@@ -68,6 +362,13 @@ def business_helper(business) -> dict:
         "owner_email": business["owner_email"]
     }
 
+def _period_label(period) -> str:
+    """YYYY-MM for a stored period; string periods not yet migrated are normalized, or passed through if unparseable"""
+    try:
+        return format_period(parse_period(period))
+    except ValueError:
+        return str(period)
+
 def metric_helper(metric) -> dict:
     """Convert metric document to dict"""
     return {
@@ -75,18 +376,70 @@ def metric_helper(metric) -> dict:
         "business_id": metric["business_id"],
         "metric_type": metric["metric_type"],
         "value": metric["value"],
-        "period": metric["period"],
-        "timestamp": metric["timestamp"],
+        "period": _period_label(metric["period"]),
+        "granularity": metric.get("granularity", MONTH),
+        "timestamp": metric.get("timestamp"),
         "metadata": metric.get("metadata")
     }
 
+def interaction_body_fields(response: str) -> dict:
+    """Stored form of a response: a short preview plus the body, compressed when large"""
+    fields = {"preview": response[:INTERACTION_PREVIEW_CHARS], "response_length": len(response)}
+    encoded = response.encode()
+    if len(encoded) >= INTERACTION_COMPRESS_MIN_BYTES:
+        fields["response_z"] = Binary(zlib.compress(encoded))
+    else:
+        fields["response"] = response
+    return fields
+
+def interaction_document(business_id: str, query: str, response: str, interaction_type: str) -> dict:
+    """Build a stored interaction"""
+    return {
+        "business_id": business_id,
+        "query": query,
+        **interaction_body_fields(response),
+        "interaction_type": interaction_type,
+        "timestamp": datetime.utcnow()
+    }
+
+def interaction_body(interaction) -> str:
+    """Full response text of a stored interaction"""
+    if "response_z" in interaction:
+        return zlib.decompress(interaction["response_z"]).decode()
+    return interaction.get("response", "")
+
 def interaction_helper(interaction) -> dict:
     """Convert interaction document to dict"""
     return {
         "id": str(interaction["_id"]),
         "business_id": interaction["business_id"],
         "query": interaction["query"],
-        "response": interaction["response"],
+        "response": interaction_body(interaction),
         "interaction_type": interaction["interaction_type"],
         "timestamp": interaction["timestamp"]
     }
+
+def interaction_preview_helper(interaction) -> dict:
+    """Convert an INTERACTION_PREVIEW_PROJECTION document to a history list entry"""
+    return {
+        "id": str(interaction["_id"]),
+        "query": interaction["query"],
+        "preview": interaction["preview"],
+        "truncated": interaction["response_length"] > len(interaction["preview"]),
+        "type": interaction["interaction_type"],
+        "timestamp": interaction["timestamp"]
+    }
+
+def job_helper(job) -> dict:
+    """Convert AI job document to dict"""
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "business_id": job["business_id"],
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at")
+    }
@@ -0,0 +1,204 @@
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import OperationFailure
+from typing import Any, Dict, List, Optional
+from app.config import get_settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+
+# Storage layouts for business_metrics (METRICS_STORAGE)
+COLLECTION_LAYOUT = "collection"
+TIMESERIES_LAYOUT = "timeseries"
+
+# Every index the application relies on, declared per collection in one place.
+# Key orders match the hot queries' equality and sort fields so they are served
+# by index-ordered scans. Each extra index costs a write per insert, so a query
+# that can use the prefix of a compound index gets no index of its own.
+MANAGED_INDEXES: Dict[str, List[IndexModel]] = {
+    "businesses": [
+        IndexModel([("name", ASCENDING)]),
+        # Login and signup look accounts up by email
+        IndexModel([("owner_email", ASCENDING)]),
+    ],
+    "business_metrics": [
+        # One document per (business_id, metric_type, period); writes upsert on it
+        IndexModel(
+            [("business_id", ASCENDING), ("metric_type", ASCENDING), ("period", ASCENDING)],
+            unique=True
+        ),
+        # Keyset pagination order for GET /{business_id}/metrics
+        IndexModel([("business_id", ASCENDING), ("period", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "metric_rollups": [
+        IndexModel(
+            [("business_id", ASCENDING), ("metric_type", ASCENDING), ("period", ASCENDING)],
+            unique=True
+        ),
+    ],
+    # Keyset pagination order for GET /api/ai/history/{business_id}, newest first
+    "ai_interactions": [
+        IndexModel([("business_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        # Retention selects old interactions across every business
+        IndexModel([("timestamp", ASCENDING)]),
+    ],
+    "ai_interactions_archive": [
+        IndexModel([("business_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("timestamp", ASCENDING)]),
+    ],
+    "ai_jobs": [
+        # At most one active job per input; finished jobs drop out of the index
+        IndexModel([("input_hash", ASCENDING)], unique=True, partialFilterExpression={"active": True}),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "metric_forecasts": [
+        IndexModel([("business_id", ASCENDING), ("metric_type", ASCENDING)], unique=True),
+        # Lets the nightly batch drop forecasts it did not refresh
+        IndexModel([("generated_at", ASCENDING)]),
+    ],
+}
+
+# Time-series collections cannot have unique or _id-keyed secondary indexes,
+# so business_metrics gets meta-field indexes instead in that layout
+TIMESERIES_METRIC_INDEXES: List[IndexModel] = [
+    IndexModel([("meta.business_id", ASCENDING), ("meta.metric_type", ASCENDING), ("period", ASCENDING)]),
+    IndexModel([("meta.business_id", ASCENDING), ("period", ASCENDING)]),
+]
+
+# Indexes earlier versions created that a managed compound index now serves
+# through its prefix, or that no query reads any more (dashboard reads moved to
+# metric_rollups); ensure_indexes drops them to save the write per insert
+REDUNDANT_INDEXES: Dict[str, List[str]] = {
+    "business_metrics": ["business_id_1", "business_id_1_metric_type_1_period_1_value_1"],
+    "ai_interactions": ["business_id_1"],
+}
+
+def managed_indexes(metrics_layout: str = COLLECTION_LAYOUT) -> Dict[str, List[IndexModel]]:
+    """Managed indexes for a storage layout, including the TTL indexes whose expiry is configured"""
+    settings = get_settings()
+    managed = dict(MANAGED_INDEXES)
+    if metrics_layout == TIMESERIES_LAYOUT:
+        managed["business_metrics"] = TIMESERIES_METRIC_INDEXES
+    managed["idempotency_keys"] = [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.idempotency_ttl_seconds)
+    ]
+    if settings.ai_cache_shared:
+        # Expired answers are kept for a grace period as a fallback while Gemini is down
+        managed["ai_response_cache"] = [
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=settings.ai_cache_stale_grace_seconds)
+        ]
+    return managed
+
+async def _missing_indexes(collection, indexes: List[IndexModel]) -> List[IndexModel]:
+    existing = {}
+    async for info in collection.list_indexes():
+        existing[info["name"]] = info
+    return [
+        index for index in indexes
+        if index.document["name"] not in existing
+        or existing[index.document["name"]].get("expireAfterSeconds") != index.document.get("expireAfterSeconds")
+    ]
+
+async def _build(database, collection_name: str, indexes: List[IndexModel]):
+    collection = database[collection_name]
+    try:
+        await collection.create_indexes(indexes)
+    except OperationFailure as e:
+        if e.code == INDEX_OPTIONS_CONFLICT:
+            # Only the TTL can legitimately change between deploys; collMod updates it in place
+            for index in indexes:
+                if "expireAfterSeconds" in index.document:
+                    await database.command(
+                        "collMod", collection_name,
+                        index={"name": index.document["name"], "expireAfterSeconds": index.document["expireAfterSeconds"]}
+                    )
+            return
+        if e.code != DUPLICATE_KEY_ERROR:
+            raise
+        raise RuntimeError(
+            f"Cannot build a unique index on {collection_name} while it holds duplicates; "
+            "run `python -m app.services.migrations dedupe-metrics` first"
+        ) from e
+
+async def drop_redundant_indexes(database) -> List[str]:
+    """Drop indexes superseded by managed compound indexes; return the dropped names"""
+    dropped = []
+    for collection_name, names in REDUNDANT_INDEXES.items():
+        for name in names:
+            try:
+                await database[collection_name].drop_index(name)
+            except OperationFailure as e:
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+                continue
+            dropped.append(f"{collection_name}.{name}")
+    return dropped
+
+async def ensure_indexes(database, metrics_layout: str = COLLECTION_LAYOUT, background: bool = False) -> Optional[asyncio.Task]:
+    """Create every missing managed index and drop the redundant ones.
+
+    Only indexes that are missing (or whose TTL changed) are sent to the
+    server, so this is cheap once the indexes exist. With background=True the
+    builds run in a task and the caller does not wait for them; failures are
+    logged instead of raised. The server builds indexes without blocking reads
+    and writes either way (MongoDB 4.2+).
+    """
+    pending = {}
+    for collection_name, indexes in managed_indexes(metrics_layout).items():
+        missing = await _missing_indexes(database[collection_name], indexes)
+        if missing:
+            pending[collection_name] = missing
+
+    async def build():
+        for collection_name, missing in pending.items():
+            await _build(database, collection_name, missing)
+        # Drop only once the replacements exist, so queries never lose their index
+        for name in await drop_redundant_indexes(database):
+            logger.info("Dropped redundant index %s", name)
+
+    if not background:
+        await build()
+        return None
+
+    async def build_logged():
+        try:
+            await build()
+        except Exception:
+            logger.exception("Background index build failed")
+
+    return asyncio.create_task(build_logged())
+
+async def index_usage(database, metrics_layout: str = COLLECTION_LAYOUT) -> List[Dict[str, Any]]:
+    """Per-index access counts ($indexStats) and sizes for every collection that has managed indexes.
+
+    Counters reset when mongod restarts, so read `ops` relative to `since`.
+    """
+    managed = managed_indexes(metrics_layout)
+    existing = set(await database.list_collection_names())
+    report = []
+    for collection_name in sorted((set(managed) | set(REDUNDANT_INDEXES)) & existing):
+        collection = database[collection_name]
+        managed_names = {index.document["name"] for index in managed.get(collection_name, [])}
+        sizes = {}
+        async for stats in collection.aggregate([{"$collStats": {"storageStats": {}}}]):
+            sizes = stats["storageStats"].get("indexSizes", {})
+        if metrics_layout == TIMESERIES_LAYOUT and collection_name == "business_metrics":
+            # $indexStats reads the underlying buckets collection of a time-series collection
+            collection = database[f"system.buckets.{collection_name}"]
+        async for stats in collection.aggregate([{"$indexStats": {}}, {"$sort": {"name": ASCENDING}}]):
+            name = stats["name"]
+            report.append({
+                "collection": collection_name,
+                "name": name,
+                "key": stats["key"],
+                "ops": stats["accesses"]["ops"],
+                "since": stats["accesses"]["since"],
+                "size_bytes": sizes.get(name),
+                "managed": name in managed_names or name == "_id_",
+                "redundant": name in REDUNDANT_INDEXES.get(collection_name, [])
+            })
+    return report
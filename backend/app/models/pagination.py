@@ -0,0 +1,41 @@
+from bson import ObjectId
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import base64
+import json
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(sort_value: Any, doc_id: ObjectId) -> str:
+    """Opaque cursor pointing just past the document with this (sort_value, _id)"""
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "id": str(doc_id)}
+    else:
+        payload = {"v": sort_value, "id": str(doc_id)}
+    return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Inverse of encode_cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(payload["d"]) if "d" in payload else payload["v"]
+        return value, ObjectId(payload["id"])
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+def keyset_filter(field: str, cursor: Optional[str], descending: bool = False) -> Dict[str, Any]:
+    """Filter selecting documents after the cursor in (field, _id) order"""
+    if not cursor:
+        return {}
+    value, doc_id = decode_cursor(cursor)
+    op, inclusive = ("$lt", "$lte") if descending else ("$gt", "$gte")
+    # The inclusive bound keeps the scan on a single index range; the $or
+    # then only discards the already-returned ties on field
+    return {"$and": [
+        {field: {inclusive: value}},
+        {"$or": [
+            {field: {op: value}},
+            {field: value, "_id": {op: doc_id}}
+        ]}
+    ]}
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any
+import re
+
+# Metrics are reported per calendar month. The granularity is stored with
+# every metric so coarser periods can be added without guessing later.
+MONTH = "month"
+
+# "2024-03", "2024/3", "202403", or a full date such as "2024-03-15" (day ignored)
+_MONTH_PATTERNS = [
+    re.compile(r"^(\d{4})[-/](\d{1,2})$"),
+    re.compile(r"^(\d{4})(\d{2})$"),
+    re.compile(r"^(\d{4})-(\d{2})-\d{2}(?:[T ].*)?$"),
+]
+
+def parse_period(value: Any) -> datetime:
+    """Normalize a period label or datetime to the start of its month"""
+    if isinstance(value, datetime):
+        return datetime(value.year, value.month, 1)
+    text = str(value).strip()
+    for pattern in _MONTH_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            if 1 <= month <= 12:
+                return datetime(year, month, 1)
+            break
+    try:
+        parsed = datetime.strptime(text, "%b %Y")
+    except ValueError:
+        raise ValueError(f"Invalid period {value!r}, expected a month such as 2024-03")
+    return datetime(parsed.year, parsed.month, 1)
+
+def format_period(period: datetime) -> str:
+    """The YYYY-MM label the API uses for a stored period"""
+    return period.strftime("%Y-%m")
+
+def add_months(period: datetime, months: int) -> datetime:
+    """Month start `months` after (or before, if negative) the given month start"""
+    index = period.year * 12 + period.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def current_period() -> datetime:
+    """Start of the current UTC month"""
+    return parse_period(datetime.utcnow())
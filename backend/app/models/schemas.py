@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from app.models.periods import parse_period, format_period
 
 class BusinessCreate(BaseModel):
     name: str
@@ -26,18 +27,28 @@ class MetricCreate(BaseModel):
     period: str
     metadata: Optional[Dict[str, Any]] = None
 
+    @field_validator("period", mode="before")
+    @classmethod
+    def normalize_period(cls, value: Any) -> str:
+        return format_period(parse_period(value))
+
 class MetricResponse(BaseModel):
     id: str
     business_id: str
     metric_type: str
     value: float
     period: str
+    granularity: str
     timestamp: datetime
     metadata: Optional[Dict[str, Any]]
     
     class Config:
         from_attributes = True
 
+class MetricPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
 class AIQuery(BaseModel):
     business_id: str
     query: str
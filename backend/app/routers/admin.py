@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.services.profiling import is_admin_token, list_profiles, profile_path, PROFILE_FORMATS
+import asyncio
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow only requests carrying the configured admin token"""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def get_profiles():
+    """List recent request profiles, newest first"""
+    return await asyncio.to_thread(list_profiles)
+
+@router.get("/profiles/{profile_id}/{fmt}")
+async def download_profile(profile_id: str, fmt: str):
+    """Download one profile as speedscope JSON or collapsed stacks"""
+    if fmt not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(PROFILE_FORMATS)}")
+
+    path = profile_path(profile_id, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return FileResponse(path, filename=path.name)
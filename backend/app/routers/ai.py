@@ -1,25 +1,87 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Awaitable, AsyncIterator, Optional, TypeVar
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+import asyncio
+import json
 from app.models.database import (
     get_businesses_collection,
-    get_metrics_collection,
-    get_interactions_collection,
     business_helper,
     metric_helper,
-    interaction_helper
+    interaction_helper,
+    job_helper
 )
 from app.models.schemas import AIQuery, AIResponse, BusinessAnalysisRequest, GrowthRecommendation
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import gemini_service, current_business_id, GeminiTimeoutError, GeminiUnavailableError
+from app.services.admission import AdmissionRejected
+from app.services.job_queue import job_queue
+from app.routers.auth import get_current_user
+from app.services.export import export_response
+from app.services.interactions import record_interaction, history_page, get_interaction, history_cursor
+from app.models.pagination import InvalidCursor
+from app.services.metric_summary import load_metric_summaries, render_metric_summaries
+from app.config import get_settings
 
+settings = get_settings()
 router = APIRouter(prefix="/api/ai", tags=["ai"])
+optional_bearer = HTTPBearer(auto_error=False)
+
+T = TypeVar("T")
+
+async def run_until_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """Await a Gemini call, cancelling it if the HTTP client goes away first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.disconnect_poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _sse(data: Dict[str, Any], event: str = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_interaction(
+    chunks: AsyncIterator[str],
+    business_id: str,
+    query: str,
+    interaction_type: str
+) -> StreamingResponse:
+    """Forward model output as SSE and store the interaction once the stream completes"""
+    async def events():
+        current_business_id.set(business_id)
+        parts = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield _sse({"text": chunk})
+        except (GeminiTimeoutError, GeminiUnavailableError, AdmissionRejected) as e:
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        
+        response = "".join(parts)
+        await record_interaction(business_id, query, response, interaction_type)
+        yield _sse({"response": response, "interaction_type": interaction_type}, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/insights/{business_id}")
-async def get_business_insights(business_id: str):
+async def get_business_insights(business_id: str, request: Request):
     """Get AI-powered business insights"""
     businesses = get_businesses_collection()
-    interactions = get_interactions_collection()
     
     try:
         business = await businesses.find_one({"_id": ObjectId(business_id)})
@@ -35,26 +97,44 @@ async def get_business_insights(business_id: str):
         "description": business["description"]
     }
     
-    insights = await gemini_service.get_business_insights(business_data)
+    current_business_id.set(business_id)
+    insights = await run_until_disconnect(request, gemini_service.get_business_insights(business_data))
     
     # Store interaction
-    interaction_doc = {
-        "business_id": business_id,
-        "query": "Business insights request",
-        "response": insights,
-        "interaction_type": "insight",
-        "timestamp": datetime.utcnow()
-    }
-    await interactions.insert_one(interaction_doc)
+    await record_interaction(business_id, "Business insights request", insights, "insight")
     
     return {"response": insights, "interaction_type": "insight"}
 
+@router.post("/insights/{business_id}/stream")
+async def stream_business_insights(business_id: str):
+    """Stream AI-powered business insights as server-sent events"""
+    businesses = get_businesses_collection()
+    
+    try:
+        business = await businesses.find_one({"_id": ObjectId(business_id)})
+    except:
+        raise HTTPException(status_code=400, detail="Invalid business ID format")
+    
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    
+    business_data = {
+        "name": business["name"],
+        "industry": business["industry"],
+        "description": business["description"]
+    }
+    
+    return stream_interaction(
+        gemini_service.stream_business_insights(business_data),
+        business_id,
+        "Business insights request",
+        "insight"
+    )
+
 @router.post("/analyze-metrics/{business_id}")
-async def analyze_business_metrics(business_id: str):
+async def analyze_business_metrics(business_id: str, request: Request):
     """Analyze business metrics with AI"""
     businesses = get_businesses_collection()
-    metrics_coll = get_metrics_collection()
-    interactions = get_interactions_collection()
     
     try:
         business = await businesses.find_one({"_id": ObjectId(business_id)})
@@ -64,39 +144,22 @@ async def analyze_business_metrics(business_id: str):
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    metrics_data = []
-    async for metric in metrics_coll.find({"business_id": business_id}):
-        metrics_data.append({
-            "metric_type": metric["metric_type"],
-            "value": metric["value"],
-            "period": metric["period"]
-        })
-    
-    if not metrics_data:
+    summaries = await load_metric_summaries(business_id, settings.ai_metrics_recent_points)
+    if not summaries:
         raise HTTPException(status_code=404, detail="No metrics found for this business")
     
-    analysis = await gemini_service.analyze_metrics(metrics_data)
+    metrics_summary = render_metric_summaries(summaries, settings.ai_metrics_token_budget)
+    current_business_id.set(business_id)
+    analysis = await run_until_disconnect(request, gemini_service.analyze_metrics(metrics_summary))
     
     # Store interaction
-    interaction_doc = {
-        "business_id": business_id,
-        "query": "Metrics analysis request",
-        "response": analysis,
-        "interaction_type": "analysis",
-        "timestamp": datetime.utcnow()
-    }
-    await interactions.insert_one(interaction_doc)
+    await record_interaction(business_id, "Metrics analysis request", analysis, "analysis")
     
     return {"response": analysis, "interaction_type": "analysis"}
 
-@router.post("/growth-plan/{business_id}")
-async def generate_growth_plan(
-    business_id: str,
-    timeframe: str = "6 months"
-):
-    """Generate a comprehensive growth plan"""
+async def _load_business_data(business_id: str) -> Dict[str, Any]:
+    """Fetch the business fields prompts are built from"""
     businesses = get_businesses_collection()
-    interactions = get_interactions_collection()
     
     try:
         business = await businesses.find_one({"_id": ObjectId(business_id)})
@@ -106,37 +169,71 @@ async def generate_growth_plan(
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    business_data = {
+    return {
         "name": business["name"],
         "industry": business["industry"],
         "description": business["description"]
     }
-    
+
+async def _create_growth_plan(business_id: str, business_data: Dict[str, Any], timeframe: str) -> Dict[str, Any]:
+    """Generate a growth plan and store the interaction"""
     growth_plan = await gemini_service.generate_growth_plan(business_data, timeframe)
     
     # Store interaction
-    interaction_doc = {
-        "business_id": business_id,
-        "query": f"Growth plan request ({timeframe})",
-        "response": str(growth_plan),
-        "interaction_type": "growth_plan",
-        "timestamp": datetime.utcnow()
-    }
-    await interactions.insert_one(interaction_doc)
+    await record_interaction(business_id, f"Growth plan request ({timeframe})", json.dumps(growth_plan, default=str), "growth_plan")
     
     return growth_plan
 
+async def _create_recommendations(business_id: str, business_data: Dict[str, Any], focus_area: str) -> List[Dict[str, Any]]:
+    """Generate recommendations and store the interaction"""
+    recommendations = await gemini_service.generate_recommendations(business_data, focus_area)
+    
+    # Store interaction
+    await record_interaction(business_id, f"Recommendations request (focus: {focus_area})", json.dumps(recommendations, default=str), "recommendations")
+    
+    return recommendations
+
+async def _growth_plan_job(business_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    business_data = await _load_business_data(business_id)
+    return await _create_growth_plan(business_id, business_data, params["timeframe"])
+
+async def _recommendations_job(business_id: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    business_data = await _load_business_data(business_id)
+    return await _create_recommendations(business_id, business_data, params["focus_area"])
+
+job_queue.register("growth_plan", _growth_plan_job)
+job_queue.register("recommendations", _recommendations_job)
+
+@router.post("/growth-plan/{business_id}")
+async def generate_growth_plan(
+    business_id: str,
+    request: Request,
+    timeframe: str = "6 months"
+):
+    """Generate a comprehensive growth plan"""
+    business_data = await _load_business_data(business_id)
+    
+    current_business_id.set(business_id)
+    return await run_until_disconnect(request, _create_growth_plan(business_id, business_data, timeframe))
+
 @router.get("/market-insights/{industry}")
-async def get_market_insights(industry: str):
+async def get_market_insights(
+    industry: str,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+):
     """Get market insights for an industry"""
-    insights = await gemini_service.get_market_insights(industry)
+    # Signed-in users are admitted as their business; others share the capped anonymous tenant
+    if credentials:
+        current_user = await get_current_user(credentials)
+        current_business_id.set(current_user["business_id"])
+    insights = await run_until_disconnect(request, gemini_service.get_market_insights(industry))
     return {"industry": industry, "insights": insights}
 
 @router.post("/ask")
-async def ask_question(query: AIQuery):
+async def ask_question(query: AIQuery, request: Request):
     """Ask a business question with AI assistance"""
     businesses = get_businesses_collection()
-    interactions = get_interactions_collection()
     
     try:
         business = await businesses.find_one({"_id": ObjectId(query.business_id)})
@@ -153,77 +250,121 @@ async def ask_question(query: AIQuery):
         **(query.context or {})
     }
     
-    answer = await gemini_service.answer_business_question(query.query, business_context)
+    current_business_id.set(query.business_id)
+    answer = await run_until_disconnect(request, gemini_service.answer_business_question(query.query, business_context))
     
     # Store interaction
-    interaction_doc = {
-        "business_id": query.business_id,
-        "query": query.query,
-        "response": answer,
-        "interaction_type": "question",
-        "timestamp": datetime.utcnow()
-    }
-    await interactions.insert_one(interaction_doc)
+    await record_interaction(query.business_id, query.query, answer, "question")
     
     return {"response": answer, "interaction_type": "question"}
 
-@router.post("/recommendations/{business_id}")
-async def get_recommendations(
-    business_id: str,
-    focus_area: str = "general"
-) -> List[GrowthRecommendation]:
-    """Get AI-powered growth recommendations"""
+@router.post("/ask/stream")
+async def stream_question(query: AIQuery):
+    """Ask a business question and stream the answer as server-sent events"""
     businesses = get_businesses_collection()
-    interactions = get_interactions_collection()
     
     try:
-        business = await businesses.find_one({"_id": ObjectId(business_id)})
+        business = await businesses.find_one({"_id": ObjectId(query.business_id)})
     except:
         raise HTTPException(status_code=400, detail="Invalid business ID format")
     
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     
-    business_data = {
+    business_context = {
         "name": business["name"],
         "industry": business["industry"],
-        "description": business["description"]
+        "description": business["description"],
+        **(query.context or {})
     }
     
-    recommendations = await gemini_service.generate_recommendations(business_data, focus_area)
+    return stream_interaction(
+        gemini_service.stream_business_question(query.query, business_context),
+        query.business_id,
+        query.query,
+        "question"
+    )
+
+@router.post("/recommendations/{business_id}")
+async def get_recommendations(
+    business_id: str,
+    request: Request,
+    focus_area: str = "general"
+) -> List[GrowthRecommendation]:
+    """Get AI-powered growth recommendations"""
+    business_data = await _load_business_data(business_id)
     
-    # Store interaction
-    interaction_doc = {
-        "business_id": business_id,
-        "query": f"Recommendations request (focus: {focus_area})",
-        "response": str(recommendations),
-        "interaction_type": "recommendations",
-        "timestamp": datetime.utcnow()
-    }
-    await interactions.insert_one(interaction_doc)
+    current_business_id.set(business_id)
+    return await run_until_disconnect(request, _create_recommendations(business_id, business_data, focus_area))
+
+@router.post("/jobs/growth-plan/{business_id}", status_code=202)
+async def submit_growth_plan_job(business_id: str, timeframe: str = "6 months"):
+    """Queue a growth plan generation and return its job id"""
+    await _load_business_data(business_id)
+    job, deduplicated = await job_queue.submit("growth_plan", business_id, {"timeframe": timeframe})
+    return {"job_id": str(job["_id"]), "status": job["status"], "deduplicated": deduplicated}
+
+@router.post("/jobs/recommendations/{business_id}", status_code=202)
+async def submit_recommendations_job(business_id: str, focus_area: str = "general"):
+    """Queue a recommendations generation and return its job id"""
+    await _load_business_data(business_id)
+    job, deduplicated = await job_queue.submit("recommendations", business_id, {"focus_area": focus_area})
+    return {"job_id": str(job["_id"]), "status": job["status"], "deduplicated": deduplicated}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    """Get a background AI job, long-polling up to `wait` seconds for it to finish"""
+    try:
+        job = await job_queue.get(job_id, wait=wait)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
     
-    return recommendations
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job_helper(job)
 
 @router.get("/history/{business_id}")
 async def get_interaction_history(
     business_id: str,
-    limit: int = 10
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None
 ):
-    """Get AI interaction history for a business"""
-    interactions = get_interactions_collection()
-    
-    history = []
-    cursor = interactions.find({"business_id": business_id})\
-        .sort("timestamp", -1)\
-        .limit(limit)
-    
-    async for interaction in cursor:
-        history.append({
-            "id": str(interaction["_id"]),
-            "query": interaction["query"],
-            "response": interaction["response"],
-            "type": interaction["interaction_type"],
-            "timestamp": interaction["timestamp"]
-        })
-    
-    return history
+    """Get AI interaction history previews for a business, newest first.
+    
+    Pass the returned `next_cursor` back as `cursor` for the next page, and
+    fetch a full response with GET /history/{business_id}/{interaction_id}.
+    """
+    try:
+        return await history_page(business_id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/history/{business_id}/export")
+async def export_interaction_history(
+    business_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """Stream the full AI interaction history of a business as NDJSON or CSV"""
+    cursor = history_cursor(business_id, settings.export_batch_size)
+    
+    columns = ["id", "business_id", "query", "response", "interaction_type", "timestamp"]
+    return export_response(cursor, interaction_helper, columns, format, f"ai-history-{business_id}")
+
+@router.get("/history/{business_id}/{interaction_id}")
+async def get_interaction_detail(business_id: str, interaction_id: str):
+    """Get one AI interaction with its full response"""
+    try:
+        interaction = await get_interaction(business_id, ObjectId(interaction_id))
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid interaction ID format")
+    
+    if not interaction:
+        raise HTTPException(status_code=404, detail="Interaction not found")
+    
+    return interaction_helper(interaction)
+
+@router.get("/stats")
+async def get_ai_stats():
+    """Get AI response cache and request coalescing counters"""
+    return gemini_service.stats()
@@ -5,12 +5,14 @@ from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from bson import ObjectId
 from app.models.database import get_businesses_collection
+from app.services.principal_cache import PrincipalCache
+from app.services.passwords import hash_password, verify_password
 from app.config import get_settings
-import hashlib
 from typing import Optional
 
 settings = get_settings()
 security = HTTPBearer()
+principal_cache = PrincipalCache(settings.principal_cache_ttl_seconds, settings.principal_cache_max_entries)
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
@@ -32,14 +34,6 @@ class AuthResponse(BaseModel):
     email: str
     name: str
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
-
-def get_password_hash(password: str) -> str:
-    """Hash a password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -65,7 +59,7 @@ async def signup(request: SignupRequest):
         )
     
     # Hash password
-    hashed_password = get_password_hash(request.password)
+    hashed_password = await hash_password(request.password, request.email)
     
     # Create business document
     business_doc = {
@@ -100,20 +94,23 @@ async def login(request: LoginRequest):
     
     # Find business by email
     business = await businesses.find_one({"owner_email": request.email})
-    if not business:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
-        )
     
-    # Verify password
-    is_password_valid = verify_password(request.password, business["password_hash"] )
+    # Verify password (unknown emails cost the same as wrong passwords)
+    stored_hash = business.get("password_hash") if business else None
+    is_password_valid, new_hash = await verify_password(request.password, stored_hash, request.email)
     if not is_password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Upgrade legacy SHA-256 or lower-cost hashes now that the plain password is known
+    if new_hash:
+        await businesses.update_one(
+            {"_id": business["_id"], "password_hash": stored_hash},
+            {"$set": {"password_hash": new_hash}}
+        )
+    
     business_id = str(business["_id"])
     
     # Create access token
@@ -137,8 +134,12 @@ async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] =
             detail="Missing authorization header"
         )
     
+    token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return dict(principal)
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
         business_id: str = payload.get("business_id")
@@ -158,13 +159,15 @@ async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] =
                 detail="User not found"
             )
         
-        return {
+        principal = {
             "business_id": business_id,
             "email": business["owner_email"],
             "name": business["name"],
             "industry": business["industry"],
             "has_completed_metrics": business.get("has_completed_metrics", False)
         }
+        principal_cache.set(token, principal, payload.get("exp"))
+        return dict(principal)
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -181,6 +184,7 @@ async def mark_metrics_completed(business_id: str):
             {"_id": ObjectId(business_id)},
             {"$set": {"has_completed_metrics": True}}
         )
+        principal_cache.invalidate_business(business_id)
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Business not found")
@@ -1,18 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Header
+from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
+import zlib
 from app.models.database import (
     get_businesses_collection,
-    get_metrics_collection,
+    get_metrics_repository,
+    get_rollups_collection,
     business_helper,
     metric_helper
 )
-from app.models.schemas import BusinessCreate, BusinessResponse, MetricCreate, MetricResponse
+from app.models.schemas import BusinessCreate, BusinessResponse, MetricCreate, MetricResponse, MetricPage
+from app.models.pagination import encode_cursor, keyset_filter
+from app.models.periods import parse_period, format_period
 from app.services.gemini_service import gemini_service
+from app.services.rollups import (
+    apply_metrics,
+    kpis_from_rollups,
+    monthly_series,
+    KPI_STAGES,
+    REVENUE_TREND_STAGES,
+    GROWTH_STAGES,
+    dashboard_pipeline
+)
+from app.services.export import export_response
+from app.services.forecasting import forecast_business, detect_anomalies, ANOMALY_THRESHOLDS
+from app.services.ingest import MetricIngestor, parse_rows, metric_document, latest_per_key, upsert_metrics
+from app.services.idempotency import idempotent, fingerprint, StreamDigest
 from app.routers.auth import get_current_user
-from app.config import Settings
+from app.config import get_settings
 
+settings = get_settings()
 router = APIRouter(prefix="/api/business", tags=["business"])
 
 @router.post("/", response_model=BusinessResponse)
@@ -56,168 +74,220 @@ async def get_business(business_id: str):
     return business_helper(business)
 
 @router.post("/metrics", response_model=MetricResponse)
-async def add_metric(metric: MetricCreate):
-    """Add a business metric"""
-    metrics = get_metrics_collection()
+async def add_metric(metric: MetricCreate, idempotency_key: Optional[str] = Header(None)):
+    """Add or update the business metric for a (business_id, metric_type, period)"""
+    metrics = get_metrics_repository()
     
-    metric_dict = metric.model_dump()
-    metric_dict["timestamp"] = datetime.utcnow()
+    metric_dict = metric_document(metric)
     
-    result = await metrics.insert_one(metric_dict)
-    new_metric = await metrics.find_one({"_id": result.inserted_id})
+    async def write():
+        metric_dict["timestamp"] = datetime.utcnow()
+        stored = await metrics.upsert_one(metric_dict)
+        await apply_metrics([stored])
+        return metric_helper(stored)
     
-    return metric_helper(new_metric)
+    return await idempotent("metrics", idempotency_key, write, fingerprint(metric_dict))
 
 @router.post("/metrics/batch", response_model=List[MetricResponse])
-async def add_metrics_batch(metrics_data: List[MetricCreate]):
-    """Add a batch of business metrics"""
-    metrics = get_metrics_collection()
+async def add_metrics_batch(metrics_data: List[MetricCreate], idempotency_key: Optional[str] = Header(None)):
+    """Add or update a batch of business metrics; repeats of a key keep the last one"""
+    if not metrics_data:
+        raise HTTPException(status_code=400, detail="No metrics provided")
     
-    new_metrics = []
-    for metric in metrics_data:
-        metric_dict = metric.model_dump()
-        metric_dict["timestamp"] = datetime.utcnow()
-        new_metrics.append(metric_dict)
+    new_metrics = [metric_document(metric) for metric in metrics_data]
     
-    if not new_metrics:
-        raise HTTPException(status_code=400, detail="No metrics provided")
+    async def write():
+        now = datetime.utcnow()
+        for metric_dict in new_metrics:
+            metric_dict["timestamp"] = now
+        return [metric_helper(metric) for metric in await upsert_metrics(latest_per_key(new_metrics))]
+    
+    return await idempotent("metrics/batch", idempotency_key, write, fingerprint(new_metrics))
+
+@router.post("/metrics/ingest")
+async def ingest_metrics(request: Request, upsert: bool = True, idempotency_key: Optional[str] = Header(None)):
+    """Bulk-ingest metrics and return a summary count.
 
-    result = await metrics.insert_many(new_metrics)
+    The body is a JSON array, or NDJSON when the content type is
+    application/x-ndjson (or application/gzip). Send Content-Encoding: gzip
+    for compressed bodies. NDJSON bodies are decoded and written in chunks
+    as they arrive. Rows upsert onto their (business_id, metric_type, period);
+    with upsert=false an existing key is rejected instead.
+    """
+    content_type = request.headers.get("content-type", "")
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip" or content_type.startswith("application/gzip")
+    ndjson = "ndjson" in content_type or content_type.startswith("application/gzip")
+    body = StreamDigest(request.stream())
     
-    inserted_ids = result.inserted_ids
+    async def write():
+        ingestor = MetricIngestor(chunk_size=settings.ingest_chunk_size, upsert=upsert)
+        try:
+            return await ingestor.run(parse_rows(body.stream(), ndjson=ndjson, gzipped=gzipped))
+        except (ValueError, zlib.error) as e:
+            raise HTTPException(status_code=400, detail=f"Malformed request body: {e}")
     
-    created_metrics = []
-    cursor = metrics.find({"_id": {"$in": inserted_ids}})
-    async for metric in cursor:
-        created_metrics.append(metric_helper(metric))
-        
-    return created_metrics
+    # The body is streamed, so it is hashed as it is read and a replayed key must match its digest
+    options = fingerprint({"upsert": upsert, "ndjson": ndjson, "gzipped": gzipped})
+    return await idempotent("metrics/ingest", idempotency_key, write, options, body=body)
+
+# Fields a client may request through ?fields=; id is always returned
+METRIC_FIELDS = ("business_id", "metric_type", "value", "period", "granularity", "timestamp", "metadata")
 
-@router.get("/{business_id}/metrics", response_model=List[MetricResponse])
-async def get_metrics(business_id: str):
-    """Get metrics for a business"""
-    metrics = get_metrics_collection()
+@router.get("/{business_id}/metrics", response_model=MetricPage)
+async def get_metrics(
+    business_id: str,
+    metric_type: Optional[List[str]] = Query(None),
+    period_from: Optional[str] = Query(None, alias="from"),
+    period_to: Optional[str] = Query(None, alias="to"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of metric fields"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get a page of metrics for a business, ordered by period"""
+    metrics = get_metrics_repository()
     
-    metric_list = []
-    cursor = metrics.find({"business_id": business_id})
-    async for metric in cursor:
-        metric_list.append(metric_helper(metric))
+    query = {"business_id": business_id}
+    if metric_type:
+        query["metric_type"] = {"$in": metric_type}
+    try:
+        if period_from or period_to:
+            query["period"] = {}
+            if period_from:
+                query["period"]["$gte"] = parse_period(period_from)
+            if period_to:
+                query["period"]["$lte"] = parse_period(period_to)
+        query.update(keyset_filter("period", cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return metric_list
-
-@router.get("/{business_id}/kpis", response_model=dict)
-async def get_kpis(business_id: str):
-    """Get key performance indicators for a business"""
-    metrics = get_metrics_collection()
-    
-    kpis = {
-        "monthly_revenue": 0,
-        "monthly_revenue_change": 0,
-        "customer_growth": 0,
-        "customer_growth_change": 0,
-        "conversion_rate": 0,
-        "conversion_rate_change": 0
-    }
+    projection = None
+    selected = None
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(selected) - set(METRIC_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown metric fields: {', '.join(sorted(unknown))}")
+        # period is always read because the next cursor is built from it
+        projection = {field: 1 for field in {*selected, "period"}}
+    
+    docs = await metrics.find(query, projection)\
+        .sort([("period", 1), ("_id", 1)])\
+        .limit(limit + 1)\
+        .to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["period"], docs[-1]["_id"])
+    
+    if selected is None:
+        items = [metric_helper(doc) for doc in docs]
+    else:
+        items = [{"id": str(doc["_id"]), **{f: doc.get(f) for f in selected}} for doc in docs]
+        if "period" in selected:
+            for item in items:
+                item["period"] = format_period(item["period"])
+    
+    return {"items": items, "next_cursor": next_cursor}
 
-    revenue_metrics = await metrics.find({"business_id": business_id, "metric_type": "revenue"}).sort("period", -1).to_list(length=2)
-    if len(revenue_metrics) > 0:
-        kpis["monthly_revenue"] = revenue_metrics[0]["value"]
-        if len(revenue_metrics) > 1:
-            kpis["monthly_revenue_change"] = (revenue_metrics[0]["value"] - revenue_metrics[1]["value"]) / revenue_metrics[1]["value"] if revenue_metrics[1]["value"] != 0 else 0
+@router.get("/{business_id}/metrics/monthly", response_model=list)
+async def get_monthly_metric(
+    business_id: str,
+    metric_type: str = "revenue",
+    months: int = Query(12, ge=1, le=120),
+    end: Optional[str] = Query(None, description="Last month to include (YYYY-MM), defaults to the current month"),
+    yoy: bool = Query(False, description="Include the same month a year earlier and the change against it")
+):
+    """Get one bucket per month of a metric over the last N months"""
+    try:
+        end_period = parse_period(end) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return await monthly_series(business_id, metric_type, months, end_period, year_over_year=yoy)
 
-    customer_metrics = await metrics.find({"business_id": business_id, "metric_type": "customers"}).sort("period", -1).to_list(length=2)
-    if len(customer_metrics) > 0:
-        kpis["customer_growth"] = customer_metrics[0]["value"]
-        if len(customer_metrics) > 1:
-            kpis["customer_growth_change"] = (customer_metrics[0]["value"] - customer_metrics[1]["value"]) / customer_metrics[1]["value"] if customer_metrics[1]["value"] != 0 else 0
+@router.get("/{business_id}/forecast", response_model=list)
+async def get_forecast(
+    business_id: str,
+    metric_type: Optional[List[str]] = Query(None),
+    horizon: int = Query(6, ge=1, le=36, description="Months to forecast"),
+    window: int = Query(3, ge=1, le=24, description="Moving average window in months")
+):
+    """Get moving averages and a seasonality-aware forecast per metric series"""
+    return await forecast_business(business_id, metric_type, horizon, window)
 
-    conversion_metrics = await metrics.find({"business_id": business_id, "metric_type": "conversion_rate"}).sort("period", -1).to_list(length=2)
-    if len(conversion_metrics) > 0:
-        kpis["conversion_rate"] = conversion_metrics[0]["value"]
-        if len(conversion_metrics) > 1:
-            kpis["conversion_rate_change"] = (conversion_metrics[0]["value"] - conversion_metrics[1]["value"]) / conversion_metrics[1]["value"] if conversion_metrics[1]["value"] != 0 else 0
+@router.get("/{business_id}/anomalies", response_model=list)
+async def get_anomalies(
+    business_id: str,
+    metric_type: Optional[List[str]] = Query(None),
+    method: str = Query("zscore", pattern="^(zscore|iqr)$"),
+    threshold: Optional[float] = Query(None, gt=0, description="Defaults to 3 for zscore and 1.5 for iqr")
+):
+    """Get months whose metric value departs from its trend and seasonality"""
+    threshold = threshold or ANOMALY_THRESHOLDS[method]
+    return await detect_anomalies(business_id, metric_type, method, threshold)
 
-    return kpis
+@router.get("/{business_id}/kpis", response_model=dict)
+async def get_kpis(business_id: str):
+    """Get key performance indicators for a business"""
+    rollups = get_rollups_collection()
+    
+    pipeline = [{"$match": {"business_id": business_id}}] + KPI_STAGES
+    rows = await rollups.aggregate(pipeline).to_list(length=None)
+    return kpis_from_rollups(rows)
 
 @router.get("/{business_id}/revenue-trends", response_model=list)
 async def get_revenue_trends(business_id: str):
     """Get revenue and customer trends for a business"""
-    metrics = get_metrics_collection()
-    
-    # Aggregate revenue by period
-    revenue_pipeline = [
-        {"$match": {"business_id": business_id, "metric_type": "revenue"}},
-        {"$group": {
-            "_id": "$period",
-            "revenue": {"$sum": "$value"}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    # Aggregate customers by period
-    customers_pipeline = [
-        {"$match": {"business_id": business_id, "metric_type": "customers"}},
-        {"$group": {
-            "_id": "$period",
-            "customers": {"$sum": "$value"}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    revenue_data = await metrics.aggregate(revenue_pipeline).to_list(length=None)
-    customers_data = await metrics.aggregate(customers_pipeline).to_list(length=None)
-    
-    # Create a dictionary for easy lookup
-    customers_dict = {item["_id"]: item["customers"] for item in customers_data}
-    
-    # Combine the data
-    trends = []
-    for item in revenue_data:
-        period = item["_id"]
-        trends.append({
-            "month": period,
-            "revenue": item["revenue"],
-            "customers": customers_dict.get(period, 0)
-        })
-    
-    return trends
+    rollups = get_rollups_collection()
+    
+    pipeline = [{"$match": {"business_id": business_id}}] + REVENUE_TREND_STAGES
+    return await rollups.aggregate(pipeline).to_list(length=None)
 
 @router.get("/{business_id}/growth-by-category", response_model=list)
 async def get_growth_by_category(business_id: str):
     """Get growth by category for a business"""
-    metrics = get_metrics_collection()
-    
-    pipeline = [
-        {"$match": {"business_id": business_id}},
-        {"$sort": {"period": 1}},
-        {"$group": {
-            "_id": "$metric_type",
-            "first": {"$first": "$value"},
-            "last": {"$last": "$value"}
-        }},
-        {"$project": {
-            "category": "$_id",
-            "growth": {
-                "$cond": [
-                    {"$eq": ["$first", 0]},
-                    0,
-                    {"$multiply": [{"$divide": [{"$subtract": ["$last", "$first"]}, "$first"]}, 100]}
-                ]
-            }
-        }}
-    ]
-    
-    growth_data = await metrics.aggregate(pipeline).to_list(length=None)
-    return growth_data
+    rollups = get_rollups_collection()
+    
+    pipeline = [{"$match": {"business_id": business_id}}] + GROWTH_STAGES
+    return await rollups.aggregate(pipeline).to_list(length=None)
 
+@router.get("/{business_id}/dashboard", response_model=dict)
+async def get_dashboard(business_id: str):
+    """Get KPIs, revenue trends and category growth in a single query"""
+    rollups = get_rollups_collection()
+    
+    result = (await rollups.aggregate(dashboard_pipeline(business_id)).to_list(length=1))[0]
+    return {
+        "kpis": kpis_from_rollups(result["kpis"]),
+        "revenue_trends": result["revenue_trends"],
+        "growth_by_category": result["growth_by_category"]
+    }
+
+
+@router.get("/{business_id}/export/metrics")
+async def export_metrics(
+    business_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """Stream every metric of a business as NDJSON or CSV"""
+    metrics = get_metrics_repository()
+    
+    cursor = metrics.find({"business_id": business_id})\
+        .sort([("period", 1), ("_id", 1)])\
+        .batch_size(settings.export_batch_size)
+    
+    return export_response(cursor, metric_helper, ["id", *METRIC_FIELDS], format, f"metrics-{business_id}")
 
 @router.get("/debug/all-metrics")
-async def debug_all_metrics():
-    """Debug: Get ALL metrics from database"""
-    metrics = get_metrics_collection()
-    all_metrics = await metrics.find({}).to_list(length=None)
+async def debug_all_metrics(limit: int = Query(20, ge=1, le=100)):
+    """Debug: metric count and the most recently written metrics"""
+    metrics = get_metrics_repository()
+    
+    count = await metrics.estimated_document_count()
+    recent = await metrics.find({}).sort("_id", -1).limit(limit).to_list(length=limit)
     return {
-        "count": len(all_metrics),
-        "database": Settings.database_name,
-        "metrics": [metric_helper(m) for m in all_metrics]
-    }
\ No newline at end of file
+        "count": count,
+        "database": settings.database_name,
+        "metrics": [metric_helper(m) for m in recent]
+    }
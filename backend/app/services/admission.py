@@ -0,0 +1,134 @@
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Any, Optional
+import asyncio
+import math
+import time
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted; the caller should retry after retry_after seconds"""
+
+    def __init__(self, reason: str, retry_after: int, service: str = "AI service"):
+        super().__init__(f"{service} is busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bound concurrent upstream calls globally and per tenant, with a fair bounded wait queue"""
+
+    def __init__(self, max_in_flight: int, max_per_tenant: int, max_queue: int, max_wait: float, service: str = "AI service",
+                 tenant_limits: Optional[Dict[str, int]] = None):
+        self.service = service
+        self.max_in_flight = max_in_flight
+        self.max_per_tenant = max_per_tenant
+        # Per-tenant overrides of max_per_tenant, e.g. for the shared anonymous tenant
+        self.tenant_limits = tenant_limits or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        self._tenant_in_flight = Counter()
+        # Tenants with waiting callers, in round-robin order
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.admitted = 0
+        self.rejected = Counter()
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self, tenant: str):
+        """Hold one upstream slot for tenant for the duration of the block"""
+        await self._acquire(tenant)
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    async def _acquire(self, tenant: str):
+        if tenant not in self._queues and self._has_capacity(tenant):
+            self._start(tenant)
+            self._record_wait(0.0)
+            return
+
+        if self.queued >= self.max_queue:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(tenant, deque()).append(future)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._dequeue(tenant, future)
+                self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if future.done():
+                self._release(tenant)
+            else:
+                self._dequeue(tenant, future)
+            raise
+        self._record_wait(time.monotonic() - started)
+
+    def _has_capacity(self, tenant: str) -> bool:
+        limit = self.tenant_limits.get(tenant, self.max_per_tenant)
+        return self.in_flight < self.max_in_flight and self._tenant_in_flight[tenant] < limit
+
+    def _start(self, tenant: str):
+        self.in_flight += 1
+        self._tenant_in_flight[tenant] += 1
+        self.admitted += 1
+
+    def _release(self, tenant: str):
+        self.in_flight -= 1
+        self._tenant_in_flight[tenant] -= 1
+        if self._tenant_in_flight[tenant] <= 0:
+            del self._tenant_in_flight[tenant]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiting tenants in round-robin order"""
+        while self.in_flight < self.max_in_flight:
+            tenant = next((t for t in self._queues if self._has_capacity(t)), None)
+            if tenant is None:
+                return
+            waiters = self._queues[tenant]
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            self._start(tenant)
+            future.set_result(None)
+
+    def _dequeue(self, tenant: str, future: asyncio.Future):
+        waiters = self._queues.get(tenant)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._queues[tenant]
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, retry_after=max(1, math.ceil(self.max_wait)), service=self.service)
+
+    def _record_wait(self, seconds: float):
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and cumulative admission counters"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_tenants": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "wait_seconds_max": self.wait_seconds_max
+        }
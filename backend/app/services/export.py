@@ -0,0 +1,74 @@
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List
+from bson import ObjectId
+import csv
+import io
+import json
+
+# Flush to the client once this many bytes of rows are buffered
+CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    return "" if value is None else value
+
+async def _ndjson_chunks(cursor, convert: Callable[[dict], Dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = []
+    size = 0
+    async for doc in cursor:
+        line = json.dumps(convert(doc), default=_json_default) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+async def _csv_chunks(cursor, convert: Callable[[dict], Dict[str, Any]], columns: List[str]) -> AsyncIterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    async for doc in cursor:
+        row = convert(doc)
+        writer.writerow([_csv_value(row.get(column)) for column in columns])
+        if out.tell() >= CHUNK_BYTES:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+def export_response(
+    cursor,
+    convert: Callable[[dict], Dict[str, Any]],
+    columns: List[str],
+    fmt: str,
+    filename: str
+) -> StreamingResponse:
+    """Stream a Motor cursor as NDJSON or CSV without materializing the result"""
+    if fmt == "csv":
+        body = _csv_chunks(cursor, convert, columns)
+    else:
+        body = _ndjson_chunks(cursor, convert)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
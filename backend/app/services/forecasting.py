@@ -0,0 +1,284 @@
+"""
+Local forecasting and anomaly detection over monthly metric series.
+
+Series are read from metric_rollups, one value per (metric_type, month).
+Each series gets a linear trend plus, once it covers two full years, a
+calendar-month seasonal component. Forecasts extrapolate that fit, and
+anomalies are the months whose residual from it stands out by z-score or IQR.
+
+The nightly batch stores results for every business in metric_forecasts:
+
+    python -m app.services.forecasting [--horizon 6]
+"""
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from app.models.database import init_db, close_db, get_rollups_collection, get_forecasts_collection
+from app.models.periods import add_months, format_period
+import argparse
+import asyncio
+import numpy as np
+import time
+
+SEASON_LENGTH = 12
+
+# Two-sided 95% band around forecasts
+INTERVAL_Z = 1.96
+
+# Default anomaly thresholds: |z| above 3, or beyond 1.5 IQRs outside the quartiles
+ANOMALY_THRESHOLDS = {"zscore": 3.0, "iqr": 1.5}
+
+# Fewer residuals than this make spread estimates meaningless
+MIN_POINTS_FOR_ANOMALIES = 6
+
+# Scales a median absolute deviation to a normal standard deviation
+MAD_TO_SIGMA = 1.4826
+
+def _month_index(period: datetime) -> int:
+    return period.year * 12 + period.month - 1
+
+def dense_series(periods: List[datetime], values: List[float]) -> Tuple[datetime, np.ndarray]:
+    """One value per month from the first to the last period; missing months are interpolated"""
+    months = np.array([_month_index(p) for p in periods])
+    offsets = months - months[0]
+    observed = np.asarray(values, dtype=float)
+    series = np.interp(np.arange(offsets[-1] + 1), offsets, observed)
+    return periods[0], series
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing moving average; the first window - 1 entries are NaN"""
+    if window <= 1:
+        return values.astype(float)
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    sums = np.cumsum(np.insert(values, 0, 0.0))
+    averages = (sums[window:] - sums[:-window]) / window
+    return np.concatenate([np.full(window - 1, np.nan), averages])
+
+class SeriesModel:
+    """Linear trend plus optional calendar-month seasonality fitted to one dense monthly series.
+
+    With only two or three points per calendar month, a single spike would
+    leak into its month's seasonal term and make the same month in other years
+    look anomalous. Seasonal fits are therefore refitted once without such
+    outliers; the outliers are still scored against the refitted model.
+    """
+
+    def __init__(self, start: datetime, values: np.ndarray):
+        self.start = start
+        self.values = values
+        n = len(values)
+        t = np.arange(n)
+        self.positions = (start.month - 1 + t) % SEASON_LENGTH
+        self.method = "linear" if n >= 2 else "constant"
+        if n >= 2 * SEASON_LENGTH:
+            self.method = "seasonal"
+
+        inliers = np.ones(n, dtype=bool)
+        self._fit(t, inliers)
+        if self.method == "seasonal":
+            outliers = self._seasonal_outliers(t)
+            if outliers.any():
+                inliers = ~outliers
+                self._fit(t, inliers)
+
+        self.fitted = self.intercept + self.slope * t + self.seasonal[self.positions]
+        self.residuals = values - self.fitted
+        self.sigma = float(self.residuals[inliers].std(ddof=1)) if inliers.sum() > 2 else 0.0
+
+    def _fit(self, t: np.ndarray, use: np.ndarray):
+        """Fit trend and seasonal terms to the points where use is True"""
+        values = self.values
+        self.seasonal = np.zeros(SEASON_LENGTH)
+        if self.method == "seasonal":
+            slope, intercept = np.polyfit(t[use], values[use], 1)
+            detrended = values - (intercept + slope * t)
+            counts = np.bincount(self.positions[use], minlength=SEASON_LENGTH)
+            sums = np.bincount(self.positions[use], weights=detrended[use], minlength=SEASON_LENGTH)
+            self.seasonal = np.divide(sums, counts, out=np.zeros(SEASON_LENGTH), where=counts > 0)
+            self.seasonal -= self.seasonal.mean()
+
+        if len(values) >= 2:
+            self.slope, self.intercept = np.polyfit(t[use], (values - self.seasonal[self.positions])[use], 1)
+        else:
+            self.slope, self.intercept = 0.0, float(values[0])
+
+    def _seasonal_outliers(self, t: np.ndarray) -> np.ndarray:
+        """Points to leave out of the seasonal fit: at most one per calendar month.
+
+        Residuals are screened by robust z-score (median and MAD, which the
+        spike itself cannot inflate). A spike splits its excess between itself
+        and the other years of that month, so of the flagged points in a month
+        only the one furthest from the trend line is treated as the outlier.
+        """
+        residuals = self.values - (self.intercept + self.slope * t + self.seasonal[self.positions])
+        deviation = np.abs(residuals - np.median(residuals))
+        flagged = deviation > ANOMALY_THRESHOLDS["zscore"] * MAD_TO_SIGMA * np.median(deviation)
+        trend_distance = np.abs(self.values - (self.intercept + self.slope * t))
+        outliers = np.zeros(len(self.values), dtype=bool)
+        for position in np.unique(self.positions[flagged]):
+            candidates = np.flatnonzero(flagged & (self.positions == position))
+            outliers[candidates[np.argmax(trend_distance[candidates])]] = True
+        return outliers
+
+    def forecast(self, horizon: int) -> Dict[str, np.ndarray]:
+        """Point forecast and 95% band for the next `horizon` months"""
+        t = np.arange(len(self.values), len(self.values) + horizon)
+        positions = (self.start.month - 1 + t) % SEASON_LENGTH
+        point = self.intercept + self.slope * t + self.seasonal[positions]
+        margin = INTERVAL_Z * self.sigma
+        return {"value": point, "lower": point - margin, "upper": point + margin}
+
+    def anomaly_scores(self, method: str) -> np.ndarray:
+        """Per-month score of how far each residual stands out; compare with ANOMALY_THRESHOLDS"""
+        residuals = self.residuals
+        if len(residuals) < MIN_POINTS_FOR_ANOMALIES:
+            return np.zeros(len(residuals))
+        if method == "zscore":
+            std = residuals.std()
+            return np.abs(residuals - residuals.mean()) / std if std > 0 else np.zeros(len(residuals))
+        q1, q3 = np.percentile(residuals, [25, 75])
+        iqr = q3 - q1
+        if iqr <= 0:
+            return np.zeros(len(residuals))
+        # Distance outside the quartile box, in IQRs (0 inside the box)
+        return np.maximum(q1 - residuals, residuals - q3).clip(min=0) / iqr
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+def forecast_series(model: SeriesModel, horizon: int, window: int) -> Dict[str, Any]:
+    """History with moving average, and a forecast with a 95% band"""
+    start, values = model.start, model.values
+    averages = moving_average(values, window)
+    future = model.forecast(horizon)
+    return {
+        "method": model.method,
+        "history": [
+            {"month": format_period(add_months(start, i)), "value": float(values[i]), "moving_average": _none_if_nan(averages[i])}
+            for i in range(len(values))
+        ],
+        "forecast": [
+            {
+                "month": format_period(add_months(start, len(values) + i)),
+                "value": round(float(future["value"][i]), 4),
+                "lower": round(float(future["lower"][i]), 4),
+                "upper": round(float(future["upper"][i]), 4)
+            }
+            for i in range(horizon)
+        ]
+    }
+
+def series_anomalies(model: SeriesModel, method: str, threshold: float) -> List[Dict[str, Any]]:
+    """Months whose value departs from the trend/seasonal fit by more than threshold"""
+    scores = model.anomaly_scores(method)
+    return [
+        {
+            "month": format_period(add_months(model.start, int(i))),
+            "value": float(model.values[i]),
+            "expected": round(float(model.fitted[i]), 4),
+            "score": round(float(scores[i]), 4)
+        }
+        for i in np.flatnonzero(scores > threshold)
+    ]
+
+async def _rollup_series(match: Dict[str, Any]) -> AsyncIterator[Tuple[str, str, datetime, np.ndarray]]:
+    """(business_id, metric_type, start, dense values) per series, streamed in rollup key order"""
+    cursor = get_rollups_collection().find(
+        match,
+        {"_id": 0, "business_id": 1, "metric_type": 1, "period": 1, "sum": 1}
+    ).sort([("business_id", 1), ("metric_type", 1), ("period", 1)])
+
+    key, periods, values = None, [], []
+    async for row in cursor:
+        row_key = (row["business_id"], row["metric_type"])
+        if row_key != key and periods:
+            yield (*key, *dense_series(periods, values))
+            periods, values = [], []
+        key = row_key
+        periods.append(row["period"])
+        values.append(row["sum"])
+    if periods:
+        yield (*key, *dense_series(periods, values))
+
+def _series_match(business_id: str, metric_types: Optional[List[str]]) -> Dict[str, Any]:
+    match = {"business_id": business_id}
+    if metric_types:
+        match["metric_type"] = {"$in": metric_types}
+    return match
+
+async def forecast_business(
+    business_id: str,
+    metric_types: Optional[List[str]],
+    horizon: int,
+    window: int
+) -> List[Dict[str, Any]]:
+    """Forecast every (or the selected) metric series of a business"""
+    return [
+        {"metric_type": metric_type, **forecast_series(SeriesModel(start, values), horizon, window)}
+        async for _, metric_type, start, values in _rollup_series(_series_match(business_id, metric_types))
+    ]
+
+async def detect_anomalies(
+    business_id: str,
+    metric_types: Optional[List[str]],
+    method: str,
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """Anomalous months across every (or the selected) metric series of a business"""
+    anomalies = []
+    async for _, metric_type, start, values in _rollup_series(_series_match(business_id, metric_types)):
+        anomalies.extend(
+            {"metric_type": metric_type, **anomaly}
+            for anomaly in series_anomalies(SeriesModel(start, values), method, threshold)
+        )
+    return anomalies
+
+async def run_batch(horizon: int, window: int, batch_size: int = 1000) -> int:
+    """Recompute stored forecasts and anomalies for every series; return how many were written"""
+    forecasts = get_forecasts_collection()
+    generated_at = datetime.utcnow()
+    operations = []
+    written = 0
+    async for business_id, metric_type, start, values in _rollup_series({}):
+        model = SeriesModel(start, values)
+        result = forecast_series(model, horizon, window)
+        operations.append(UpdateOne(
+            {"business_id": business_id, "metric_type": metric_type},
+            {"$set": {
+                "method": result["method"],
+                "forecast": result["forecast"],
+                "anomalies": {
+                    method: series_anomalies(model, method, threshold)
+                    for method, threshold in ANOMALY_THRESHOLDS.items()
+                },
+                "generated_at": generated_at
+            }},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            await forecasts.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        await forecasts.bulk_write(operations, ordered=False)
+        written += len(operations)
+
+    # Series that no longer have rollups keep no stale forecast
+    await forecasts.delete_many({"generated_at": {"$lt": generated_at}})
+    return written
+
+async def _main(args):
+    await init_db()
+    try:
+        started = time.perf_counter()
+        written = await run_batch(args.horizon, args.window)
+        print(f"Stored forecasts for {written} series in {time.perf_counter() - started:.1f}s")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute stored metric forecasts and anomalies")
+    parser.add_argument("--horizon", type=int, default=6, help="Months to forecast")
+    parser.add_argument("--window", type=int, default=3, help="Moving average window in months")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,18 +1,265 @@
 from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
 from app.config import get_settings
+from app.services.response_cache import ResponseCache
+from app.services.single_flight import SingleFlight
+from app.services.admission import AdmissionController
+from app.services.resilience import CircuitBreaker, backoff_delay
+from app.services.instrumentation import observe_gemini_call
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import functools
+import httpx
 import json
-from typing import Dict, Any, List
+import math
+import requests
+import time
+from typing import Dict, Any, List, AsyncIterator, Awaitable, Callable
 
 settings = get_settings()
-client = genai.Client(api_key=settings.gemini_api_key)
+
+def _http_options() -> genai_types.HttpOptions:
+    # A request running on a worker thread cannot be cancelled from asyncio, so
+    # the HTTP timeout (in milliseconds) is what bounds how long it holds a thread
+    options = {"timeout": int(settings.gemini_timeout_seconds * 1000)}
+    if settings.gemini_base_url:
+        # Point at a proxy or the local fake API used by the benchmarks
+        options["base_url"] = settings.gemini_base_url
+    return genai_types.HttpOptions(**options)
+
+client = genai.Client(api_key=settings.gemini_api_key, http_options=_http_options())
+
+# google-genai sends requests with the blocking `requests` library; its
+# client.aio methods only wrap them in asyncio.to_thread on the shared default
+# executor. Upstream calls run on this sized pool instead, so they can neither
+# block the event loop nor starve other to_thread users. Cancelling the
+# awaiting coroutine (timeout, client disconnect) frees the caller at once, but
+# the thread runs on until the request finishes or hits the HTTP timeout.
+executor = ThreadPoolExecutor(max_workers=settings.gemini_executor_workers, thread_name_prefix="gemini")
+
+async def _in_executor(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking SDK call on the Gemini pool"""
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+# Returned by next() once a streamed response is exhausted
+_STREAM_END = object()
+
+def _start_stream(model: str, prompt: str):
+    """Open a streamed generation and read its first chunk.
+
+    The SDK sends the request on the first read, so reading it here keeps
+    connection errors inside the retried part of the call.
+    """
+    iterator = iter(client.models.generate_content_stream(model=model, contents=prompt))
+    return iterator, next(iterator, _STREAM_END)
+
+# Calls not made for a business (market insights without a token) share one tenant with its own cap
+ANONYMOUS_TENANT = "anonymous"
+
+# Tenant on whose behalf upstream calls are made, set by the routes for admission fairness
+current_business_id: ContextVar[str] = ContextVar("current_business_id", default=ANONYMOUS_TENANT)
+
+# Bump whenever a prompt template changes so stale cached answers are not served
+PROMPT_TEMPLATE_VERSION = "1"
+
+# Seconds a cached response stays fresh, per service method (0 disables caching)
+CACHE_TTL_SECONDS = {
+    "get_business_insights": 6 * 3600,
+    "analyze_metrics": 3600,
+    "generate_growth_plan": 6 * 3600,
+    "get_market_insights": 24 * 3600,
+    "answer_business_question": 600,
+    "generate_recommendations": 6 * 3600,
+}
+
+# Upstream status codes worth retrying
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class GeminiTimeoutError(Exception):
+    """Raised when a Gemini call does not finish within the configured timeout"""
+
+class GeminiUnavailableError(Exception):
+    """Raised when Gemini is failing and no cached answer can stand in"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Connection-level failures of the SDK's HTTP transport: google-genai 1.2.0 uses
+# requests; httpx covers SDK versions that moved to it
+TRANSPORT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    httpx.TransportError,
+)
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, TRANSPORT_ERRORS)
 
 class GeminiService:
     def __init__(self):
         self.model = "gemini-2.0-flash"
+        self.timeout = settings.gemini_timeout_seconds
+        self.cache = ResponseCache(max_entries=settings.ai_cache_max_entries)
+        self.single_flight = SingleFlight()
+        self.admission = AdmissionController(
+            max_in_flight=settings.ai_max_in_flight,
+            max_per_tenant=settings.ai_max_in_flight_per_business,
+            max_queue=settings.ai_max_queue,
+            max_wait=settings.ai_queue_timeout_seconds,
+            tenant_limits={ANONYMOUS_TENANT: settings.ai_max_in_flight_anonymous}
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.gemini_breaker_failure_threshold,
+            reset_timeout=settings.gemini_breaker_reset_seconds
+        )
     
-    async def get_business_insights(self, business_data: Dict[str, Any]) -> str:
-        """Generate AI-powered business insights"""
-        prompt = f"""
+    async def _generate(self, prompt: str, method: str) -> str:
+        """Return the response for a prompt, served from cache when fresh"""
+        ttl = CACHE_TTL_SECONDS.get(method, 0)
+        key = ResponseCache.make_key(self.model, PROMPT_TEMPLATE_VERSION, prompt)
+        if ttl:
+            cached = await self.cache.get(key, method)
+            if cached is not None:
+                return cached
+        
+        try:
+            # Identical prompts already in flight share one upstream call
+            return await self.single_flight.do(key, method, lambda: self._fill(prompt, key, ttl, method))
+        except GeminiUnavailableError:
+            stale = await self.cache.get_stale(key, method)
+            if stale is None:
+                raise
+            return stale
+    
+    async def _fill(self, prompt: str, key: str, ttl: float, method: str) -> str:
+        """Call the model and populate the cache with its answer"""
+        response_text = await self._call_model(prompt, method)
+        if ttl:
+            await self.cache.set(key, response_text, ttl, method)
+        return response_text
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache and request coalescing counters"""
+        return {
+            "cache": self.cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "admission": self.admission.stats(),
+            "circuit_breaker": self.breaker.stats()
+        }
+    
+    @asynccontextmanager
+    async def _guarded(self):
+        """Admit one upstream call through the circuit breaker and admission control"""
+        permit = self.breaker.allow()
+        if permit is None:
+            raise GeminiUnavailableError(
+                "Gemini is unavailable (circuit open)",
+                retry_after=max(1, math.ceil(self.breaker.retry_after()))
+            )
+        try:
+            async with self.admission.slot(current_business_id.get()):
+                yield
+        except (GeminiTimeoutError, GeminiUnavailableError):
+            self.breaker.record_failure(permit)
+            raise
+        else:
+            self.breaker.record_success(permit)
+        finally:
+            self.breaker.release_probe(permit)
+    
+    async def _with_retries(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await an upstream call, retrying retryable errors with jittered backoff"""
+        for attempt in range(settings.gemini_max_retries + 1):
+            try:
+                return await asyncio.wait_for(call(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise GeminiTimeoutError(f"Gemini call timed out after {self.timeout}s")
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                if attempt == settings.gemini_max_retries:
+                    raise GeminiUnavailableError(f"Gemini upstream error after {attempt + 1} attempts: {e}") from e
+                await asyncio.sleep(backoff_delay(
+                    attempt,
+                    settings.gemini_retry_base_delay_seconds,
+                    settings.gemini_retry_max_delay_seconds
+                ))
+    
+    async def _call_model(self, prompt: str, method: str) -> str:
+        """Run a generation on the Gemini pool so the event loop stays free"""
+        started = time.perf_counter()
+        try:
+            async with self._guarded():
+                response = await self._with_retries(
+                    lambda: _in_executor(
+                        client.models.generate_content,
+                        model=self.model,
+                        contents=prompt
+                    )
+                )
+        except Exception as e:
+            observe_gemini_call(method, started, type(e).__name__)
+            raise
+        observe_gemini_call(method, started, "ok", response.usage_metadata)
+        return response.text
+    
+    async def _stream(self, prompt: str, method: str) -> AsyncIterator[str]:
+        """Yield response text as the model produces it, then cache the full answer"""
+        ttl = CACHE_TTL_SECONDS.get(method, 0)
+        key = ResponseCache.make_key(self.model, PROMPT_TEMPLATE_VERSION, prompt)
+        if ttl:
+            cached = await self.cache.get(key, method)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            async with self._guarded():
+                iterator, chunk = await self._with_retries(
+                    lambda: _in_executor(_start_stream, self.model, prompt)
+                )
+                while chunk is not _STREAM_END:
+                    # Usage metadata is cumulative; the last chunk carries the totals
+                    usage = chunk.usage_metadata or usage
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+                    # Each chunk is read with blocking I/O, so fetch it on the pool
+                    try:
+                        chunk = await asyncio.wait_for(_in_executor(next, iterator, _STREAM_END), timeout=self.timeout)
+                    except asyncio.TimeoutError:
+                        raise GeminiTimeoutError(f"Gemini stream stalled for more than {self.timeout}s")
+                    except Exception as e:
+                        if not _is_retryable(e):
+                            raise
+                        raise GeminiUnavailableError(f"Gemini stream failed: {e}") from e
+        except Exception as e:
+            observe_gemini_call(method, started, type(e).__name__)
+            if not isinstance(e, GeminiUnavailableError):
+                raise
+            # Fall back to the last cached answer if nothing has been sent yet
+            stale = None if chunks else await self.cache.get_stale(key, method)
+            if stale is None:
+                raise
+            yield stale
+            return
+        observe_gemini_call(method, started, "ok", usage)
+        
+        if ttl:
+            await self.cache.set(key, "".join(chunks), ttl, method)
+    
+    def _business_insights_prompt(self, business_data: Dict[str, Any]) -> str:
+        return f"""
         As a business growth expert, analyze this business and provide actionable insights:
         
         Business Name: {business_data.get('name')}
@@ -27,22 +274,23 @@ class GeminiService:
         
         Be specific, actionable, and concise.
         """
-        
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return response.text
     
-    async def analyze_metrics(self, metrics: List[Dict[str, Any]]) -> str:
-        """Analyze business metrics and trends"""
-        metrics_summary = "\n".join([
-            f"- {m['metric_type']}: {m['value']} ({m['period']})"
-            for m in metrics
-        ])
-        
+    async def get_business_insights(self, business_data: Dict[str, Any]) -> str:
+        """Generate AI-powered business insights"""
+        prompt = self._business_insights_prompt(business_data)
+        return await self._generate(prompt, "get_business_insights")
+    
+    def stream_business_insights(self, business_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream AI-powered business insights as they are generated"""
+        prompt = self._business_insights_prompt(business_data)
+        return self._stream(prompt, "get_business_insights")
+    
+    async def analyze_metrics(self, metrics_summary: str) -> str:
+        """Analyze business metrics and trends from a per-metric-type summary"""
         prompt = f"""
-        As a business analyst, analyze these metrics and provide insights:
+        As a business analyst, analyze these monthly metrics and provide insights.
+        Each metric type is summarized with its range, trend, quarterly means,
+        recent months and any detected anomalies:
         
         {metrics_summary}
         
@@ -55,11 +303,7 @@ class GeminiService:
         Be data-driven and specific.
         """
         
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return response.text
+        return await self._generate(prompt, "analyze_metrics")
     
     async def generate_growth_plan(self, business_data: Dict[str, Any], timeframe: str = "6 months") -> Dict[str, Any]:
         """Generate a comprehensive growth plan"""
@@ -80,11 +324,8 @@ class GeminiService:
         Format as JSON with categories, priorities, and action items.
         """
         
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return self._parse_structured_response(response.text)
+        response_text = await self._generate(prompt, "generate_growth_plan")
+        return self._parse_structured_response(response_text)
     
     async def get_market_insights(self, industry: str, business_context: str = "") -> str:
         """Get market trends and insights for an industry"""
@@ -103,17 +344,12 @@ class GeminiService:
         Be current, relevant, and actionable for SMEs.
         """
         
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return response.text
+        return await self._generate(prompt, "get_market_insights")
     
-    async def answer_business_question(self, question: str, business_context: Dict[str, Any]) -> str:
-        """Answer specific business questions with context"""
+    def _business_question_prompt(self, question: str, business_context: Dict[str, Any]) -> str:
         context_str = "\n".join([f"{k}: {v}" for k, v in business_context.items()])
         
-        prompt = f"""
+        return f"""
         As a business advisor, answer this question with expertise:
         
         Question: {question}
@@ -123,12 +359,16 @@ class GeminiService:
         
         Provide a clear, actionable answer tailored to this specific business.
         """
-        
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return response.text
+    
+    async def answer_business_question(self, question: str, business_context: Dict[str, Any]) -> str:
+        """Answer specific business questions with context"""
+        prompt = self._business_question_prompt(question, business_context)
+        return await self._generate(prompt, "answer_business_question")
+    
+    def stream_business_question(self, question: str, business_context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the answer to a business question as it is generated"""
+        prompt = self._business_question_prompt(question, business_context)
+        return self._stream(prompt, "answer_business_question")
     
     async def generate_recommendations(self, business_data: Dict[str, Any], focus_area: str = "general") -> List[Dict[str, Any]]:
         """Generate prioritized recommendations"""
@@ -149,11 +389,8 @@ class GeminiService:
         Format as JSON array.
         """
         
-        response = client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return self._parse_recommendations(response.text)
+        response_text = await self._generate(prompt, "generate_recommendations")
+        return self._parse_recommendations(response_text)
     
     def _parse_structured_response(self, response_text: str) -> Dict[str, Any]:
         """Parse structured JSON response from AI"""
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from pymongo.errors import DuplicateKeyError
+from app.models.database import get_idempotency_collection
+from app.config import get_settings
+import hashlib
+import json
+
+class IdempotencyConflict(Exception):
+    """An idempotency key is still being processed, or was used for a different request"""
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request payload, to detect a key reused for a different request"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class StreamDigest:
+    """SHA-256 of a streamed request body, computed as the body is consumed.
+
+    Streamed bodies cannot be fingerprinted before the call, so their digest is
+    stored with the response and compared when the key is replayed.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._sha = hashlib.sha256()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        async for chunk in self._chunks:
+            self._sha.update(chunk)
+            yield chunk
+
+    async def digest(self) -> str:
+        """Hex digest of the whole body, reading whatever has not been consumed yet"""
+        async for _ in self.stream():
+            pass
+        return self._sha.hexdigest()
+
+async def idempotent(
+    scope: str,
+    key: Optional[str],
+    call: Callable[[], Awaitable[Any]],
+    request_fingerprint: Optional[str] = None,
+    body: Optional[StreamDigest] = None
+) -> Any:
+    """Run `call` once per (scope, key) and replay its stored response for retries of the same key.
+
+    Without a key the call just runs. The key is reserved before the call, so a
+    concurrent retry gets IdempotencyConflict instead of writing twice; the
+    reservation is released if the call fails so the client can retry. A
+    reservation older than IDEMPOTENCY_LEASE_SECONDS belongs to a process that
+    died mid-call, and the next retry takes it over. For a streamed `body`, a
+    replay reads the new body and must match the stored digest.
+    """
+    if not key:
+        return await call()
+
+    keys = get_idempotency_collection()
+    doc_id = f"{scope}:{key}"
+    reserved_at = datetime.utcnow()
+    try:
+        await keys.insert_one({
+            "_id": doc_id,
+            "fingerprint": request_fingerprint,
+            "created_at": reserved_at,
+            "reserved_at": reserved_at
+        })
+    except DuplicateKeyError:
+        stored = await keys.find_one({"_id": doc_id})
+        if stored is None:
+            # Expired between the insert and the read
+            return await idempotent(scope, key, call, request_fingerprint, body=body)
+        if stored.get("fingerprint") != request_fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+        if "response" not in stored:
+            # Records written before reserved_at existed fall back to created_at
+            held_since = stored.get("reserved_at") or stored["created_at"]
+            if reserved_at - held_since < timedelta(seconds=get_settings().idempotency_lease_seconds):
+                raise IdempotencyConflict("A request with this Idempotency-Key is still in progress")
+            result = await keys.update_one(
+                {"_id": doc_id, "reserved_at": stored.get("reserved_at"), "response": {"$exists": False}},
+                {"$set": {"reserved_at": reserved_at}}
+            )
+            if not result.modified_count:
+                # Another retry took it over or the call finished; look again
+                return await idempotent(scope, key, call, request_fingerprint, body=body)
+        else:
+            if body is not None and await body.digest() != stored.get("body_digest"):
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            return stored["response"]
+
+    # Only touch the record while this call still holds the reservation
+    held = {"_id": doc_id, "reserved_at": reserved_at}
+    try:
+        response = await call()
+        update = {"response": response}
+        if body is not None:
+            update["body_digest"] = await body.digest()
+    except BaseException:
+        await keys.delete_one(held)
+        raise
+    await keys.update_one(held, {"$set": update})
+    return response
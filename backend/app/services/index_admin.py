@@ -0,0 +1,54 @@
+"""
+Build managed indexes and report how each index is used.
+
+    python -m app.services.index_admin build    # create missing indexes, drop redundant ones
+    python -m app.services.index_admin report   # $indexStats access counts and sizes
+
+`report` marks indexes that are not declared in app.models.indexes as
+unmanaged, and managed indexes with no accesses since the last mongod restart
+as unused. Both are candidates for removal, since every index costs a write per
+insert. Run it against a primary that has served production traffic for a
+while, because counters are per node and reset on restart.
+"""
+from app.models.database import init_db, close_db, get_database
+from app.models.indexes import ensure_indexes, index_usage
+from app.config import get_settings
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+def _status(row) -> str:
+    if row["redundant"]:
+        return "redundant"
+    if not row["managed"]:
+        return "unmanaged"
+    return "unused" if row["ops"] == 0 else "ok"
+
+async def _main(args) -> int:
+    settings = get_settings()
+    await init_db(create_indexes=False)
+    try:
+        if args.command == "build":
+            started = time.perf_counter()
+            await ensure_indexes(get_database(), settings.metrics_storage)
+            print(f"Indexes up to date in {time.perf_counter() - started:.1f}s")
+            return 0
+        report = await index_usage(get_database(), settings.metrics_storage)
+    finally:
+        await close_db()
+
+    if args.json:
+        print(json.dumps(report, default=str, indent=2))
+        return 0
+    for row in report:
+        size = f"{row['size_bytes'] / 1024:,.0f} KiB" if row["size_bytes"] is not None else "-"
+        print(f"{row['collection'] + '.' + row['name']:<72} {row['ops']:>12,} ops {size:>14}  {_status(row)}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Managed index builds and usage report")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,129 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from pydantic import ValidationError
+from app.models.database import get_metrics_repository
+from app.models.schemas import MetricCreate
+from app.models.periods import parse_period, MONTH
+from app.services.rollups import apply_metrics, rollup_key
+import json
+import zlib
+
+# Only the first few rejected rows are reported back in detail
+MAX_REPORTED_ERRORS = 20
+
+def metric_document(metric: MetricCreate) -> Dict[str, Any]:
+    """The stored form of a metric: its period as a month-start datetime plus its granularity"""
+    doc = metric.model_dump()
+    doc["period"] = parse_period(doc["period"])
+    doc["granularity"] = MONTH
+    return doc
+
+def latest_per_key(metrics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse metrics that share a key, keeping the last one submitted"""
+    return list({rollup_key(metric): metric for metric in metrics}.values())
+
+async def upsert_metrics(metrics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Upsert metric documents (one per key) and their rollups, setting `_id` on each"""
+    await get_metrics_repository().upsert_many(metrics, with_ids=True)
+    await apply_metrics(metrics)
+    return metrics
+
+async def _decompressed(chunks: AsyncIterator[bytes], gzipped: bool) -> AsyncIterator[bytes]:
+    if not gzipped:
+        async for chunk in chunks:
+            yield chunk
+        return
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = decoder.decompress(chunk)
+        if data:
+            yield data
+    tail = decoder.flush()
+    if tail:
+        yield tail
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    # Lines are yielded undecoded so a malformed line only rejects that row
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+async def _json_array_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    body = b"".join([chunk async for chunk in chunks])
+    rows = json.loads(body) if body.strip() else []
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of metrics")
+    for row in rows:
+        yield row
+
+def parse_rows(chunks: AsyncIterator[bytes], ndjson: bool, gzipped: bool) -> AsyncIterator[Any]:
+    """Decode a (possibly gzipped) JSON-array or NDJSON request body into raw rows"""
+    body = _decompressed(chunks, gzipped)
+    return _ndjson_rows(body) if ndjson else _json_array_rows(body)
+
+class MetricIngestor:
+    """Validate metric rows and write them in unordered chunks, without reading them back"""
+
+    def __init__(self, chunk_size: int, upsert: bool):
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+        self.summary = {"received": 0, "inserted": 0, "upserted": 0, "updated": 0, "unchanged": 0, "rejected": 0, "errors": []}
+        # (row number, metric document) pairs waiting for the next chunk write
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+
+    async def run(self, rows: AsyncIterator[Any]) -> Dict[str, Any]:
+        async for row in rows:
+            row_number = self.summary["received"]
+            self.summary["received"] += 1
+            try:
+                if isinstance(row, bytes):
+                    row = json.loads(row)
+                metric = MetricCreate.model_validate(row)
+            except json.JSONDecodeError:
+                self._reject(row_number, "Invalid JSON")
+                continue
+            except ValidationError as e:
+                error = e.errors(include_url=False)[0]
+                self._reject(row_number, f"{'.'.join(map(str, error['loc']))}: {error['msg']}")
+                continue
+            self._pending.append((row_number, metric_document(metric)))
+            if len(self._pending) >= self.chunk_size:
+                await self._flush()
+        await self._flush()
+        return self.summary
+
+    def _reject(self, row: int, message: str):
+        self.summary["rejected"] += 1
+        if len(self.summary["errors"]) < MAX_REPORTED_ERRORS:
+            self.summary["errors"].append({"row": row, "error": message})
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        now = datetime.utcnow()
+        for _, doc in pending:
+            doc["timestamp"] = now
+
+        repository = get_metrics_repository()
+        if self.upsert:
+            # Repeats of a key within the chunk collapse onto the last one
+            collapsed = {rollup_key(doc): (row, doc) for row, doc in pending}
+            self.summary["unchanged"] += len(pending) - len(collapsed)
+            pending = list(collapsed.values())
+            result = await repository.upsert_many([doc for _, doc in pending])
+        else:
+            result = await repository.insert_new([doc for _, doc in pending])
+
+        for index, message in sorted(result["failed"].items()):
+            self._reject(pending[index][0], message)
+        for field in ("inserted", "upserted", "updated", "unchanged"):
+            self.summary[field] += result[field]
+
+        await apply_metrics(doc for i, (_, doc) in enumerate(pending) if i not in result["failed"])
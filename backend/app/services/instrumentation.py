@@ -0,0 +1,222 @@
+"""
+Prometheus instrumentation, exported on GET /metrics.
+
+Measured directly:
+- request latency per route template, method and status, plus in-flight requests
+- MongoDB command latency per command and collection (pymongo CommandListener)
+- Gemini call latency, outcome and token usage per GeminiService method
+- event-loop lag, sampled by a background task
+
+Components that already keep their own counters (the AI response cache,
+request coalescing, admission control, the circuit breaker, the principal
+cache, the password-hash pool) register a stats function instead. Their
+counters are converted to metrics at scrape time, so each count is tracked in
+exactly one place.
+"""
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+from typing import Any, Callable, Dict, Iterable
+from app.services.resilience import CLOSED, OPEN, HALF_OPEN
+import asyncio
+import time
+
+registry = CollectorRegistry()
+
+# Finer buckets at the low end, where route and Mongo latencies live
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=registry
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being handled", registry=registry
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time as seen by the driver",
+    ["command", "collection"], buckets=LATENCY_BUCKETS, registry=registry
+)
+mongo_command_failures = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error",
+    ["command", "collection", "code"], registry=registry
+)
+gemini_call_duration = Histogram(
+    "gemini_call_duration_seconds", "Upstream Gemini call time including retries, per service method",
+    ["method", "outcome"], buckets=LATENCY_BUCKETS, registry=registry
+)
+gemini_tokens = Counter(
+    "gemini_tokens_total", "Tokens reported by Gemini usage metadata",
+    ["method", "kind"], registry=registry
+)
+gemini_errors = Counter(
+    "gemini_errors_total", "Failed upstream Gemini calls by error type",
+    ["method", "error"], registry=registry
+)
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5), registry=registry
+)
+
+# Interval of the event-loop lag probe
+LAG_PROBE_INTERVAL_SECONDS = 0.5
+
+class PrometheusMiddleware:
+    """ASGI middleware timing each HTTP request until its response is fully sent.
+
+    Requests are labelled with the matched route template (for example
+    /api/business/{business_id}/kpis), so path parameters do not multiply series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status)
+            ).observe(time.perf_counter() - started)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Record every driver command's latency; registered on the Motor client"""
+
+    # Commands whose first field is not a collection name
+    _NO_COLLECTION = {"ping", "hello", "isMaster", "ismaster", "buildInfo", "endSessions", "listCollections"}
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) and event.command_name not in self._NO_COLLECTION else ""
+        self._collections[event.request_id] = collection
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_command_duration.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_command_duration.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        code = event.failure.get("code", "") if isinstance(event.failure, dict) else ""
+        mongo_command_failures.labels(event.command_name, collection, str(code)).inc()
+
+mongo_listener = MongoCommandListener()
+
+def observe_gemini_call(method: str, started: float, outcome: str, usage: Any = None):
+    """Record one upstream Gemini call; outcome is "ok" or the error class name"""
+    gemini_call_duration.labels(method, outcome).observe(time.perf_counter() - started)
+    if outcome != "ok":
+        gemini_errors.labels(method, outcome).inc()
+    if usage is not None:
+        for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+            count = getattr(usage, field, None)
+            if count:
+                gemini_tokens.labels(method, kind).inc(count)
+
+async def monitor_event_loop_lag(interval: float = LAG_PROBE_INTERVAL_SECONDS):
+    """Sleep for interval in a loop and record how much later than asked each wake-up came"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - started - interval))
+
+class StatsCollector:
+    """Expose components' own stats() counters and gauges at scrape time"""
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        self._sources[name] = stats
+
+    def collect(self) -> Iterable:
+        stats = {name: source() for name, source in self._sources.items()}
+
+        cache = CounterMetricFamily(
+            "ai_response_cache_lookups", "AI response cache lookups by tier result", labels=["method", "result"]
+        )
+        coalesced = CounterMetricFamily(
+            "ai_single_flight_calls", "Gemini calls made upstream vs. joined onto an identical in-flight call",
+            labels=["method", "role"]
+        )
+        for method, counts in stats.get("gemini", {}).get("cache", {}).get("by_method", {}).items():
+            for result in ("local_hits", "shared_hits", "misses", "stale_hits"):
+                cache.add_metric([method, result], counts[result])
+        for method, counts in stats.get("gemini", {}).get("single_flight", {}).get("by_method", {}).items():
+            coalesced.add_metric([method, "upstream"], counts["upstream_calls"])
+            coalesced.add_metric([method, "coalesced"], counts["coalesced_calls"])
+        yield cache
+        yield coalesced
+        if "single_flight" in stats.get("gemini", {}):
+            yield GaugeMetricFamily(
+                "ai_single_flight_in_flight", "Distinct Gemini calls currently in flight",
+                value=stats["gemini"]["single_flight"]["in_flight"]
+            )
+
+        in_flight = GaugeMetricFamily("admission_in_flight", "Calls holding an admission slot", labels=["pool"])
+        queued = GaugeMetricFamily("admission_queue_depth", "Calls waiting for an admission slot", labels=["pool"])
+        admitted = CounterMetricFamily("admission_admitted", "Calls admitted", labels=["pool"])
+        rejected = CounterMetricFamily("admission_rejected", "Calls rejected", labels=["pool", "reason"])
+        for pool, admission in self._admission_pools(stats):
+            in_flight.add_metric([pool], admission["in_flight"])
+            queued.add_metric([pool], admission["queue_depth"])
+            admitted.add_metric([pool], admission["admitted"])
+            for reason, count in admission["rejected"].items():
+                rejected.add_metric([pool, reason], count)
+        yield in_flight
+        yield queued
+        yield admitted
+        yield rejected
+
+        breaker = stats.get("gemini", {}).get("circuit_breaker")
+        if breaker:
+            state = GaugeMetricFamily("gemini_circuit_state", "1 for the circuit breaker's current state", labels=["state"])
+            for name in (CLOSED, OPEN, HALF_OPEN):
+                state.add_metric([name], 1.0 if breaker["state"] == name else 0.0)
+            yield state
+            yield CounterMetricFamily("gemini_circuit_opened", "Times the circuit breaker opened", value=breaker["times_opened"])
+
+        principals = stats.get("principal_cache")
+        if principals:
+            lookups = CounterMetricFamily("principal_cache_lookups", "Auth principal cache lookups", labels=["result"])
+            lookups.add_metric(["hit"], principals["hits"])
+            lookups.add_metric(["miss"], principals["misses"])
+            yield lookups
+            yield GaugeMetricFamily("principal_cache_entries", "Cached auth principals", value=principals["entries"])
+
+    @staticmethod
+    def _admission_pools(stats: Dict[str, Any]):
+        if "admission" in stats.get("gemini", {}):
+            yield "gemini", stats["gemini"]["admission"]
+        if "admission" in stats.get("password_hashing", {}):
+            yield "password_hash", stats["password_hashing"]["admission"]
+
+stats_collector = StatsCollector()
+registry.register(stats_collector)
+
+def render_metrics() -> bytes:
+    """Current metrics in the Prometheus text exposition format"""
+    return generate_latest(registry)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
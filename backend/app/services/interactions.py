@@ -0,0 +1,153 @@
+"""
+AI interaction storage: recording, history listing, retrieval and retention.
+
+Each interaction keeps a short preview next to its body. The body is zlib
+compressed once it is large enough to benefit. History pages read previews
+only, newest first, with keyset pagination on (timestamp, _id). Full bodies
+are fetched one at a time by id.
+
+Interactions older than INTERACTION_ARCHIVE_AFTER_DAYS are moved to
+ai_interactions_archive, which is zstd block-compressed. It is only read when
+a history page runs past the recent interactions, by id lookups and by
+export, so ai_interactions and its index stay proportional to recent
+activity. Archived interactions can be purged after
+INTERACTION_PURGE_AFTER_DAYS (0 keeps them). Schedule retention daily:
+
+    python -m app.services.interactions archive
+
+Interactions written before previews existed are compressed in place with:
+
+    python -m app.services.interactions compact
+"""
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.models.database import (
+    init_db,
+    close_db,
+    get_interactions_collection,
+    get_interactions_archive_collection,
+    interaction_document,
+    interaction_body_fields,
+    interaction_preview_helper,
+    INTERACTION_PREVIEW_PROJECTION
+)
+from app.models.pagination import encode_cursor, keyset_filter
+from app.config import get_settings
+import argparse
+import asyncio
+
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+
+async def record_interaction(business_id: str, query: str, response: str, interaction_type: str):
+    """Store one AI interaction"""
+    await get_interactions_collection().insert_one(
+        interaction_document(business_id, query, response, interaction_type)
+    )
+
+async def history_page(business_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of interaction previews, newest first; raises InvalidCursor for a bad cursor"""
+    query = {"business_id": business_id, **keyset_filter("timestamp", cursor, descending=True)}
+    # Fetch one extra row to know whether there is a next page
+    docs = await get_interactions_collection().find(query, INTERACTION_PREVIEW_PROJECTION)\
+        .sort(HISTORY_SORT)\
+        .limit(limit + 1)\
+        .to_list(length=limit + 1)
+    # Everything archived is older than everything still in ai_interactions
+    if len(docs) <= limit:
+        docs += await get_interactions_archive_collection().find(query, INTERACTION_PREVIEW_PROJECTION)\
+            .sort(HISTORY_SORT)\
+            .limit(limit + 1 - len(docs))\
+            .to_list(length=limit + 1 - len(docs))
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["timestamp"], docs[-1]["_id"])
+
+    return {"items": [interaction_preview_helper(doc) for doc in docs], "next_cursor": next_cursor}
+
+async def get_interaction(business_id: str, interaction_id: ObjectId) -> Optional[dict]:
+    """The full stored interaction, from recent or archived storage"""
+    query = {"_id": interaction_id, "business_id": business_id}
+    interaction = await get_interactions_collection().find_one(query)
+    if interaction is None:
+        interaction = await get_interactions_archive_collection().find_one(query)
+    return interaction
+
+async def history_cursor(business_id: str, batch_size: int) -> AsyncIterator[dict]:
+    """Every interaction of a business, oldest first, archived ones included"""
+    for collection in (get_interactions_archive_collection(), get_interactions_collection()):
+        cursor = collection.find({"business_id": business_id})\
+            .sort([("timestamp", 1), ("_id", 1)])\
+            .batch_size(batch_size)
+        async for interaction in cursor:
+            yield interaction
+
+async def archive_interactions(after_days: int) -> int:
+    """Move interactions older than after_days to the archive; return how many moved"""
+    interactions = get_interactions_collection()
+    archive = get_interactions_archive_collection()
+    match = {"timestamp": {"$lt": datetime.utcnow() - timedelta(days=after_days)}}
+    # Copy server-side first; a rerun after a failure skips what was already copied
+    await interactions.aggregate([
+        {"$match": match},
+        {"$merge": {"into": archive.name, "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}}
+    ]).to_list(length=None)
+    result = await interactions.delete_many(match)
+    return result.deleted_count
+
+async def purge_archive(after_days: int) -> int:
+    """Delete archived interactions older than after_days; return how many were deleted"""
+    result = await get_interactions_archive_collection().delete_many(
+        {"timestamp": {"$lt": datetime.utcnow() - timedelta(days=after_days)}}
+    )
+    return result.deleted_count
+
+def _compacted_fields(response: str) -> Dict[str, Any]:
+    fields = interaction_body_fields(response)
+    update = {"$set": fields}
+    if "response_z" in fields:
+        update["$unset"] = {"response": ""}
+    return update
+
+async def compact_interactions(collection, batch_size: int = 1000) -> int:
+    """Add previews to, and compress, interactions stored before previews existed"""
+    compacted = 0
+    operations = []
+    cursor = collection.find({"preview": {"$exists": False}}, {"response": 1}).batch_size(batch_size)
+    async for interaction in cursor:
+        operations.append(UpdateOne({"_id": interaction["_id"]}, _compacted_fields(interaction.get("response", ""))))
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations, ordered=False)
+            compacted += len(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        compacted += len(operations)
+    return compacted
+
+async def _main(args):
+    settings = get_settings()
+    await init_db()
+    try:
+        if args.command == "compact":
+            for collection in (get_interactions_collection(), get_interactions_archive_collection()):
+                print(f"{collection.name}: compacted {await compact_interactions(collection)} interactions")
+            return
+
+        after_days = args.after_days if args.after_days is not None else settings.interaction_archive_after_days
+        purge_after_days = args.purge_after_days if args.purge_after_days is not None else settings.interaction_purge_after_days
+        print(f"Archived {await archive_interactions(after_days)} interactions older than {after_days} days")
+        if purge_after_days > 0:
+            print(f"Purged {await purge_archive(purge_after_days)} archived interactions older than {purge_after_days} days")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI interaction retention and compaction")
+    parser.add_argument("command", choices=["archive", "compact"])
+    parser.add_argument("--after-days", type=int, help="Archive interactions older than this (default INTERACTION_ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--purge-after-days", type=int, help="Delete archived interactions older than this; 0 keeps them (default INTERACTION_PURGE_AFTER_DAYS)")
+    asyncio.run(_main(parser.parse_args()))
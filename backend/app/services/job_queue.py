@@ -0,0 +1,153 @@
+from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.models.database import get_jobs_collection
+from app.services.gemini_service import current_business_id
+import asyncio
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+class JobQueue:
+    """Run long AI generations on a pool of asyncio workers, persisting jobs in ai_jobs"""
+
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: "asyncio.Queue[ObjectId]" = None
+        self._workers = []
+        # Completion events for jobs someone is long-polling, with their waiter counts
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._waiters: Counter = Counter()
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the coroutine that runs jobs of the given kind"""
+        self._handlers[kind] = handler
+
+    async def start(self, worker_count: int, stale_after: float):
+        """Start the worker pool and pick up jobs left queued, or abandoned while running, by earlier processes"""
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(worker_count)]
+
+        jobs = get_jobs_collection()
+        await jobs.update_many(
+            {"status": "running", "started_at": {"$lt": datetime.utcnow() - timedelta(seconds=stale_after)}},
+            {"$set": {"status": "queued"}}
+        )
+        async for job in jobs.find({"status": "queued"}, {"_id": 1}).sort("created_at", 1):
+            self._queue.put_nowait(job["_id"])
+
+    async def stop(self):
+        """Cancel the worker pool; unfinished jobs are resumed on next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @staticmethod
+    def input_hash(kind: str, business_id: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"kind": kind, "business_id": business_id, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def submit(self, kind: str, business_id: str, params: Dict[str, Any]) -> Tuple[dict, bool]:
+        """Queue a job, or return the identical job already queued or running.
+
+        Returns the job document and whether it was deduplicated.
+        """
+        jobs = get_jobs_collection()
+        input_hash = self.input_hash(kind, business_id, params)
+        job_doc = {
+            "kind": kind,
+            "business_id": business_id,
+            "params": params,
+            "input_hash": input_hash,
+            "status": "queued",
+            # Present only while queued/running; backs the unique dedup index
+            "active": True,
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None
+        }
+        try:
+            result = await jobs.insert_one(job_doc)
+        except DuplicateKeyError:
+            existing = await jobs.find_one({"input_hash": input_hash, "active": True})
+            if existing:
+                return existing, True
+            # The duplicate finished in the meantime; queue a fresh job
+            result = await jobs.insert_one(job_doc)
+
+        job_doc["_id"] = result.inserted_id
+        self._queue.put_nowait(result.inserted_id)
+        return job_doc, False
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[dict]:
+        """Fetch a job, optionally waiting up to wait seconds for it to finish"""
+        jobs = get_jobs_collection()
+        if wait <= 0:
+            return await jobs.find_one({"_id": ObjectId(job_id)})
+
+        # Register before reading the status, so a job finishing in between still sets the event
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] += 1
+        try:
+            job = await jobs.find_one({"_id": ObjectId(job_id)})
+            if job and job["status"] in ("queued", "running"):
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                job = await jobs.find_one({"_id": ObjectId(job_id)})
+        finally:
+            # The last waiter removes the event, whether the job finished, timed out or runs elsewhere
+            self._waiters[job_id] -= 1
+            if self._waiters[job_id] <= 0:
+                del self._waiters[job_id]
+                self._finished.pop(job_id, None)
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("AI job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: ObjectId):
+        jobs = get_jobs_collection()
+        job = await jobs.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "started_at": datetime.utcnow()}}
+        )
+        if not job:
+            return
+
+        handler = self._handlers[job["kind"]]
+        current_business_id.set(job["business_id"])
+        update = {}
+        try:
+            update["result"] = await handler(job["business_id"], job["params"])
+            update["status"] = "succeeded"
+        except Exception as e:
+            logger.warning("AI job %s failed: %s", job_id, e)
+            update["error"] = str(e)
+            update["status"] = "failed"
+        update["finished_at"] = datetime.utcnow()
+
+        await jobs.update_one({"_id": job_id}, {"$set": update, "$unset": {"active": ""}})
+        event = self._finished.get(str(job_id))
+        if event:
+            event.set()
+
+# Singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,164 @@
+"""
+Compact per-metric-type summaries for the analyze-metrics prompt.
+
+The aggregation runs in Mongo over metric_rollups and returns one summary per
+metric type: count, min/max/mean, quarterly means (the downsampled series)
+and the last few monthly points. Anomalies come from the nightly forecasts.
+render_metric_summaries then drops detail until the text fits a token budget.
+"""
+from typing import Any, Dict, List, Optional
+from app.models.database import get_rollups_collection, get_forecasts_collection
+from app.models.periods import format_period
+from app.services.rollups import KPI_FIELDS
+import math
+
+# Rough size of a prompt token in characters, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Anomalies listed per metric type at full detail
+MAX_ANOMALIES = 3
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def metric_summary_pipeline(business_id: str, recent_points: int) -> List[Dict[str, Any]]:
+    """Per-metric-type statistics, quarterly means and the latest monthly points"""
+    point = {"period": "$period", "value": "$sum"}
+    return [
+        {"$match": {"business_id": business_id}},
+        {"$sort": {"metric_type": 1, "period": 1}},
+        {"$facet": {
+            "series": [
+                {"$group": {
+                    "_id": "$metric_type",
+                    "count": {"$sum": 1},
+                    "min": {"$min": "$sum"},
+                    "max": {"$max": "$sum"},
+                    "mean": {"$avg": "$sum"},
+                    "first": {"$first": point},
+                    # Only the charted points, so a long history cannot hit the 16 MB document limit
+                    "recent": {"$lastN": {"input": point, "n": recent_points}}
+                }}
+            ],
+            "quarters": [
+                {"$group": {
+                    "_id": {
+                        "metric_type": "$metric_type",
+                        "year": {"$year": "$period"},
+                        "quarter": {"$ceil": {"$divide": [{"$month": "$period"}, 3]}}
+                    },
+                    "mean": {"$avg": "$sum"}
+                }},
+                {"$sort": {"_id.metric_type": 1, "_id.year": 1, "_id.quarter": 1}},
+                {"$group": {
+                    "_id": "$_id.metric_type",
+                    "quarters": {"$push": {"year": "$_id.year", "quarter": "$_id.quarter", "mean": "$mean"}}
+                }}
+            ]
+        }}
+    ]
+
+async def load_metric_summaries(business_id: str, recent_points: int) -> List[Dict[str, Any]]:
+    """Summaries ordered by importance: dashboard KPIs first, then the longest series"""
+    result = await get_rollups_collection().aggregate(metric_summary_pipeline(business_id, recent_points)).to_list(length=1)
+    if not result:
+        return []
+    quarters = {row["_id"]: row["quarters"] for row in result[0]["quarters"]}
+
+    anomalies = {}
+    async for forecast in get_forecasts_collection().find(
+        {"business_id": business_id},
+        {"_id": 0, "metric_type": 1, "anomalies.zscore": 1}
+    ):
+        anomalies[forecast["metric_type"]] = forecast.get("anomalies", {}).get("zscore", [])
+
+    summaries = [
+        {
+            "metric_type": row["_id"],
+            "count": row["count"],
+            "min": row["min"],
+            "max": row["max"],
+            "mean": row["mean"],
+            "first": row["first"],
+            "recent": row["recent"],
+            "quarters": quarters.get(row["_id"], []),
+            "anomalies": anomalies.get(row["_id"], [])
+        }
+        for row in result[0]["series"]
+    ]
+    summaries.sort(key=lambda s: (s["metric_type"] not in KPI_FIELDS, -s["count"], s["metric_type"]))
+    return summaries
+
+def _number(value: float) -> str:
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+def _trend(summary: Dict[str, Any]) -> str:
+    # Quarterly means smooth out single noisy months; fall back to raw endpoints
+    quarters = summary["quarters"]
+    if len(quarters) >= 2:
+        start, end = quarters[0]["mean"], quarters[-1]["mean"]
+    else:
+        start, end = summary["first"]["value"], summary["recent"][-1]["value"]
+    if start == 0:
+        return "flat" if end == 0 else "rising from zero"
+    change = (end - start) / abs(start) * 100
+    direction = "rising" if change > 2 else "falling" if change < -2 else "flat"
+    return f"{direction} ({change:+.1f}%)"
+
+def _tail(items: List[Any], limit: Optional[int]) -> List[Any]:
+    """The last `limit` items (all of them for None, none for 0)"""
+    if limit is None:
+        return items
+    return items[-limit:] if limit else []
+
+def _render(summary: Dict[str, Any], max_quarters: Optional[int], max_recent: Optional[int], max_anomalies: int) -> str:
+    first_period = format_period(summary["first"]["period"])
+    last = summary["recent"][-1]
+    lines = [
+        f"- {summary['metric_type']} ({summary['count']} months, {first_period} to {format_period(last['period'])}): "
+        f"latest {_number(last['value'])}, min {_number(summary['min'])}, max {_number(summary['max'])}, "
+        f"mean {_number(summary['mean'])}, trend {_trend(summary)}"
+    ]
+    quarters = _tail(summary["quarters"], max_quarters)
+    if quarters:
+        lines.append("  quarterly means: " + ", ".join(f"{q['year']}Q{q['quarter']} {_number(q['mean'])}" for q in quarters))
+    recent = _tail(summary["recent"], max_recent)
+    if recent:
+        lines.append("  recent months: " + ", ".join(f"{format_period(p['period'])} {_number(p['value'])}" for p in recent))
+    anomalies = _tail(summary["anomalies"], max_anomalies)
+    if anomalies:
+        lines.append("  anomalies: " + ", ".join(
+            f"{a['month']} {_number(a['value'])} (expected {_number(a['expected'])})" for a in anomalies
+        ))
+    return "\n".join(lines)
+
+# Progressively coarser (max_quarters, max_recent, max_anomalies) settings; None keeps everything
+DETAIL_LEVELS = [
+    (None, None, MAX_ANOMALIES),
+    (8, None, MAX_ANOMALIES),
+    (4, 3, 1),
+    (0, 0, 0),
+]
+
+def render_metric_summaries(summaries: List[Dict[str, Any]], token_budget: int) -> str:
+    """Render summaries at the most detailed level that fits the budget.
+
+    If even the one-line form does not fit, the least important metric types
+    are left out and the omission is stated.
+    """
+    for max_quarters, max_recent, max_anomalies in DETAIL_LEVELS:
+        text = "\n".join(_render(s, max_quarters, max_recent, max_anomalies) for s in summaries)
+        if estimate_tokens(text) <= token_budget:
+            return text
+
+    lines = []
+    used = 0
+    for index, summary in enumerate(summaries):
+        line = _render(summary, 0, 0, 0)
+        omitted = f"- ({len(summaries) - index} more metric types omitted)"
+        if used + estimate_tokens(line) + estimate_tokens(omitted) > token_budget:
+            lines.append(omitted)
+            break
+        lines.append(line)
+        used += estimate_tokens(line) + 1
+    return "\n".join(lines)
@@ -0,0 +1,240 @@
+"""
+One-off data migrations for the metrics collections.
+
+Run from the backend directory with:
+
+    python -m app.services.migrations dedupe-metrics
+    python -m app.services.migrations normalize-periods
+    python -m app.services.migrations to-timeseries
+    python -m app.services.migrations to-collection
+
+dedupe-metrics keeps the most recently written document for every
+(business_id, metric_type, period) in business_metrics and deletes the rest.
+
+normalize-periods converts free-form string periods ("2024-03", "2024/3",
+"Mar 2024", ...) to month-start datetimes with a granularity, merging any
+rows that turn out to name the same month, then dedupes.
+
+to-timeseries and to-collection move business_metrics between the plain and
+the time-series storage layout. Set METRICS_STORAGE to the target layout and
+stop the API before running them. Going to time-series keeps the original
+collection as business_metrics_backup; drop it once the data is verified.
+to-timeseries first runs normalize-periods and stops before touching the data
+if any document still has no valid period. An interrupted conversion is rolled
+back, so it can simply be run again.
+
+All of them then rebuild metric_rollups and create the managed indexes for
+the configured layout, including the unique key in the collection layout.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.database import (
+    init_db,
+    close_db,
+    get_database,
+    get_metrics_collection,
+    get_metrics_repository,
+    stored_metrics_layout,
+    MetricsRepository,
+    TIMESERIES_OPTIONS
+)
+from app.models.indexes import ensure_indexes, DUPLICATE_KEY_ERROR, COLLECTION_LAYOUT, TIMESERIES_LAYOUT
+from app.config import get_settings
+from app.models.periods import parse_period, MONTH
+from app.services.rollups import rebuild_rollups
+import argparse
+import asyncio
+import sys
+
+# Documents are deleted, converted or copied in batches of this many
+DELETE_BATCH_SIZE = 1000
+CONVERT_BATCH_SIZE = 1000
+COPY_BATCH_SIZE = 5000
+
+BACKUP_COLLECTION = "business_metrics_backup"
+STAGING_COLLECTION = "business_metrics_staging"
+
+async def dedupe_metrics() -> int:
+    """Delete all but the latest metric for each (business_id, metric_type, period); return how many were removed"""
+    metrics = get_metrics_repository()
+    pipeline = [
+        {"$sort": {"timestamp": -1, "_id": -1}},
+        {"$group": {
+            "_id": {"business_id": "$business_id", "metric_type": "$metric_type", "period": "$period"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$project": {"stale": {"$slice": ["$ids", 1, {"$subtract": ["$count", 1]}]}}}
+    ]
+
+    removed = 0
+    batch = []
+    async for group in metrics.aggregate(pipeline, allowDiskUse=True):
+        batch.extend(group["stale"])
+        if len(batch) >= DELETE_BATCH_SIZE:
+            removed += await _delete(batch)
+            batch = []
+    if batch:
+        removed += await _delete(batch)
+    return removed
+
+async def _delete(ids) -> int:
+    result = await get_metrics_collection().delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
+
+async def normalize_periods() -> Dict[str, Any]:
+    """Convert string periods to month-start datetimes; report converted and merged counts and invalid ids"""
+    metrics = get_metrics_collection()
+    report = {"converted": 0, "merged": 0, "invalid": []}
+    batch: List[Tuple[ObjectId, datetime]] = []
+    async for doc in metrics.find({"period": {"$type": "string"}}, {"period": 1}):
+        try:
+            batch.append((doc["_id"], parse_period(doc["period"])))
+        except ValueError:
+            report["invalid"].append(doc["_id"])
+            continue
+        if len(batch) >= CONVERT_BATCH_SIZE:
+            await _convert(batch, report)
+            batch = []
+    if batch:
+        await _convert(batch, report)
+    return report
+
+async def _convert(batch: List[Tuple[ObjectId, datetime]], report: Dict[str, Any]):
+    failed = set()
+    try:
+        await get_metrics_collection().bulk_write([
+            UpdateOne({"_id": doc_id}, {"$set": {"period": period, "granularity": MONTH}})
+            for doc_id, period in batch
+        ], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error["code"] != DUPLICATE_KEY_ERROR:
+                raise
+            failed.add(error["index"])
+            await _merge_into_existing(*batch[error["index"]])
+            report["merged"] += 1
+    report["converted"] += len(batch) - len(failed)
+
+async def _merge_into_existing(doc_id: ObjectId, period: datetime):
+    """Fold a string-period document into the already converted one for the same month, keeping the newer value"""
+    metrics = get_metrics_collection()
+    doc = await metrics.find_one({"_id": doc_id})
+    existing = await metrics.find_one({"business_id": doc["business_id"], "metric_type": doc["metric_type"], "period": period})
+    if doc.get("timestamp") and doc["timestamp"] > existing.get("timestamp", datetime.min):
+        await metrics.update_one(
+            {"_id": existing["_id"]},
+            {"$set": {"value": doc["value"], "metadata": doc.get("metadata"), "timestamp": doc["timestamp"]}}
+        )
+    await metrics.delete_one({"_id": doc_id})
+
+class MigrationAborted(Exception):
+    """A migration refused to start because the data or a previous run needs attention first"""
+
+async def convert_layout(target: str) -> int:
+    """Move business_metrics into the target storage layout; return how many metrics were copied"""
+    database = get_database()
+    current = await stored_metrics_layout(database)
+    if current in (None, target):
+        return 0
+
+    if target == TIMESERIES_LAYOUT:
+        await _check_ready_for_timeseries(database)
+        # A plain collection can be renamed, so the original stays as a backup
+        await database["business_metrics"].rename(BACKUP_COLLECTION)
+        await database.create_collection("business_metrics", timeseries=TIMESERIES_OPTIONS)
+        try:
+            return await _copy(
+                MetricsRepository(database[BACKUP_COLLECTION], COLLECTION_LAYOUT),
+                MetricsRepository(database["business_metrics"], TIMESERIES_LAYOUT)
+            )
+        except BaseException:
+            # Put the original back so a rerun starts from the plain layout instead of a partial copy
+            await database["business_metrics"].drop()
+            await database[BACKUP_COLLECTION].rename("business_metrics")
+            raise
+
+    # Time-series collections cannot be renamed: copy into a staging collection and swap it in.
+    # Anything left in staging is from an interrupted run.
+    await database[STAGING_COLLECTION].drop()
+    try:
+        copied = await _copy(
+            MetricsRepository(database["business_metrics"], TIMESERIES_LAYOUT),
+            MetricsRepository(database[STAGING_COLLECTION], COLLECTION_LAYOUT)
+        )
+    except BaseException:
+        await database[STAGING_COLLECTION].drop()
+        raise
+    await database["business_metrics"].drop()
+    await database[STAGING_COLLECTION].rename("business_metrics")
+    return copied
+
+async def _check_ready_for_timeseries(database):
+    """Normalize periods and refuse to convert while any row still has no datetime period"""
+    if await database.list_collection_names(filter={"name": BACKUP_COLLECTION}):
+        raise MigrationAborted(f"{BACKUP_COLLECTION} already exists; drop it or restore it before converting again")
+    report = await normalize_periods()
+    if report["converted"] or report["merged"]:
+        print(f"Converted {report['converted']} periods, merged {report['merged']} same-month duplicates")
+    # The time-series timeField must be a date, so one bad row would fail the copy half way
+    invalid = await database["business_metrics"].find(
+        {"period": {"$not": {"$type": "date"}}}, {"_id": 1}
+    ).to_list(length=20)
+    if invalid:
+        ids = "\n".join(f"  {doc['_id']}" for doc in invalid)
+        raise MigrationAborted(f"Some documents have no valid period; fix or delete them before converting:\n{ids}")
+
+async def _copy(source: MetricsRepository, target: MetricsRepository) -> int:
+    copied = 0
+    batch = []
+    async for doc in source.find({}):
+        batch.append(target.storage_document(doc))
+        if len(batch) >= COPY_BATCH_SIZE:
+            await target.collection.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        await target.collection.insert_many(batch, ordered=False)
+        copied += len(batch)
+    return copied
+
+async def _main(args) -> int:
+    settings = get_settings()
+    if args.migration.startswith("to-") and args.migration != f"to-{settings.metrics_storage}":
+        print(f"Set METRICS_STORAGE={args.migration[3:]} before running {args.migration}")
+        return 1
+
+    # Connect without building indexes: the unique key cannot exist until duplicates are gone
+    await init_db(create_indexes=False)
+    try:
+        if args.migration.startswith("to-"):
+            try:
+                copied = await convert_layout(settings.metrics_storage)
+            except MigrationAborted as e:
+                print(e)
+                return 1
+            print(f"Copied {copied} metrics into the {settings.metrics_storage} layout")
+        if args.migration == "normalize-periods":
+            report = await normalize_periods()
+            print(f"Converted {report['converted']} periods, merged {report['merged']} same-month duplicates")
+            if report["invalid"]:
+                print(f"{len(report['invalid'])} documents have unparseable periods and were left unchanged; fix or delete them:")
+                for doc_id in report["invalid"][:20]:
+                    print(f"  {doc_id}")
+        removed = await dedupe_metrics()
+        print(f"Removed {removed} duplicate metric documents")
+        print(f"Rebuilt {await rebuild_rollups()} rollup documents")
+        await ensure_indexes(get_database(), settings.metrics_storage)
+        print("Managed indexes created")
+    finally:
+        await close_db()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a one-off metrics data migration")
+    parser.add_argument("migration", choices=["dedupe-metrics", "normalize-periods", "to-timeseries", "to-collection"])
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,68 @@
+"""
+Password hashing and verification off the event loop.
+
+New hashes use bcrypt at PASSWORD_BCRYPT_ROUNDS. Accounts created before that
+still hold unsalted SHA-256 hex digests; those verify as before and are
+rehashed with bcrypt on the next successful login, as are bcrypt hashes below
+the configured cost.
+
+Each hash takes tens to hundreds of milliseconds of CPU, so it runs on a small
+thread pool (bcrypt releases the GIL). At most PASSWORD_HASH_WORKERS hashes run
+at once, one per account, and a burst beyond that waits in a bounded fair queue.
+A request that waits longer than PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS, or finds
+the queue full, is rejected with 503 instead of piling onto the CPU.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from passlib.context import CryptContext
+from app.services.admission import AdmissionController
+from app.config import get_settings
+import asyncio
+
+settings = get_settings()
+
+password_context = CryptContext(
+    schemes=["bcrypt", "hex_sha256"],
+    deprecated="auto",
+    bcrypt__rounds=settings.password_bcrypt_rounds,
+    bcrypt__min_rounds=settings.password_bcrypt_rounds
+)
+
+_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+
+admission = AdmissionController(
+    max_in_flight=settings.password_hash_workers,
+    max_per_tenant=1,
+    max_queue=settings.password_hash_max_queue,
+    max_wait=settings.password_hash_queue_timeout_seconds,
+    service="Password hashing"
+)
+
+async def _offload(fn: Callable[..., Any], *args) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+async def _run(account: str, fn: Callable[..., Any], *args) -> Any:
+    async with admission.slot(account.lower()):
+        return await _offload(fn, *args)
+
+async def hash_password(password: str, account: str) -> str:
+    """Hash a new password with the current scheme and cost"""
+    return await _run(account, password_context.hash, password)
+
+async def verify_password(password: str, hashed_password: Optional[str], account: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; the second item is a replacement hash when the stored one is outdated.
+
+    A missing hash (unknown account) still costs one hash, so response time
+    does not reveal whether the account exists.
+    """
+    if hashed_password is None:
+        await _run(account, password_context.dummy_verify)
+        return False, None
+    try:
+        return await _run(account, password_context.verify_and_update, password, hashed_password)
+    except ValueError:
+        # Unrecognized hash format
+        return False, None
+
+def stats() -> Dict[str, Any]:
+    return {"workers": settings.password_hash_workers, "admission": admission.stats()}
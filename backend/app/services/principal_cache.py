@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import time
+
+class PrincipalCache:
+    """Short-lived in-process cache of authenticated principals, keyed by bearer token.
+
+    An entry lives for at most ttl seconds and never past the token's own exp.
+    Updating a business should call invalidate_business so its principals are
+    rebuilt on the next request. Other workers only see the change once their
+    entries expire, which is why the TTL is kept short.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._tokens_by_business: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(token)
+        if entry is not None:
+            expires_at, principal = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return principal
+            self._remove(token)
+        self.misses += 1
+        return None
+
+    def set(self, token: str, principal: Dict[str, Any], token_exp: Optional[float] = None):
+        """Cache principal for token; token_exp is the JWT exp claim as a Unix timestamp"""
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        self._remove(token)
+        self._entries[token] = (time.monotonic() + ttl, principal)
+        self._tokens_by_business.setdefault(principal["business_id"], set()).add(token)
+        while len(self._entries) > self.max_entries:
+            oldest, _ = next(iter(self._entries.items()))
+            self._remove(oldest)
+
+    def invalidate_business(self, business_id: str):
+        """Drop every cached principal of a business"""
+        for token in self._tokens_by_business.pop(business_id, set()):
+            self._entries.pop(token, None)
+        self.invalidations += 1
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        business_id = entry[1]["business_id"]
+        tokens = self._tokens_by_business.get(business_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_business[business_id]
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_business.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,158 @@
+"""
+Opt-in per-request sampling profiles.
+
+A request is profiled when it carries `X-Profile: <PROFILING_ADMIN_TOKEN>`, or
+at random with probability PROFILING_SAMPLE_RATE. pyinstrument samples the
+request's own async context every PROFILING_INTERVAL_SECONDS. Time spent in
+helpers, Pydantic validation, Mongo awaits and JSON encoding therefore shows
+up, and concurrent requests do not. Only one request per process is profiled
+at a time; others pass through untouched.
+
+Each profile is written to PROFILING_DIR in two forms:
+- a speedscope JSON (open at https://www.speedscope.app)
+- collapsed stacks ("a;b;c <microseconds>", for flamegraph.pl and similar)
+
+A small JSON sidecar holds the route, business_id, status and duration. The
+newest PROFILING_MAX_FILES profiles are kept, and profiled responses carry an
+X-Profile-Id header.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from app.config import get_settings
+import asyncio
+import hmac
+import json
+import random
+import re
+import time
+import uuid
+
+settings = get_settings()
+
+PROFILE_HEADER = b"x-profile"
+
+# Download formats and their file suffixes
+PROFILE_FORMATS = {
+    "speedscope": ".speedscope.json",
+    "collapsed": ".collapsed.txt",
+}
+
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Whether token matches the configured admin token (never true while it is unset)"""
+    return bool(settings.profiling_admin_token) and token is not None and hmac.compare_digest(
+        token.encode(), settings.profiling_admin_token.encode()
+    )
+
+def profile_dir() -> Path:
+    return Path(settings.profiling_dir)
+
+def valid_profile_id(profile_id: str) -> bool:
+    return bool(_PROFILE_ID.match(profile_id))
+
+def _frame_name(frame) -> str:
+    return f"{frame.function} ({frame.file_path_short}:{frame.line_no})" if frame.file_path_short else frame.function
+
+def collapsed_stacks(root_frame) -> str:
+    """Collapsed-stack lines weighted by self time in microseconds"""
+    lines = []
+
+    def walk(frame, prefix: str):
+        path = f"{prefix};{_frame_name(frame)}" if prefix else _frame_name(frame)
+        self_time = frame.time - sum(child.time for child in frame.children)
+        if self_time > 0:
+            lines.append(f"{path.replace(' ', '_')} {round(self_time * 1e6)}")
+        for child in frame.children:
+            walk(child, path)
+
+    if root_frame is not None:
+        walk(root_frame, "")
+    return "\n".join(lines) + "\n"
+
+def _write_profile(profile_id: str, profiler: Profiler, meta: Dict[str, Any]):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{profile_id}.speedscope.json").write_text(profiler.output(renderer=SpeedscopeRenderer()))
+    (directory / f"{profile_id}.collapsed.txt").write_text(collapsed_stacks(profiler.last_session.root_frame()))
+    (directory / f"{profile_id}.json").write_text(json.dumps(meta))
+
+    # Keep the newest profiles; ids sort by creation time
+    metas = sorted(directory.glob("*.json"))
+    metas = [path for path in metas if valid_profile_id(path.stem)]
+    for stale in metas[:-settings.profiling_max_files]:
+        for suffix in (".json", *PROFILE_FORMATS.values()):
+            (directory / f"{stale.stem}{suffix}").unlink(missing_ok=True)
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Metadata of stored profiles, newest first"""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        if valid_profile_id(path.stem):
+            profiles.append(json.loads(path.read_text()))
+    return profiles
+
+def profile_path(profile_id: str, fmt: str) -> Optional[Path]:
+    """Path of a stored profile file, or None if it does not exist"""
+    if not valid_profile_id(profile_id) or fmt not in PROFILE_FORMATS:
+        return None
+    path = profile_dir() / f"{profile_id}{PROFILE_FORMATS[fmt]}"
+    return path if path.exists() else None
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests selected by admin header or sample rate"""
+
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+
+    def _wanted(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return is_admin_token(value.decode("latin-1"))
+        return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        created_at = datetime.utcnow()
+        profile_id = f"{created_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        self._active = True
+        profiler = Profiler(interval=settings.profiling_interval_seconds, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self._active = False
+            route = scope.get("route")
+            meta = {
+                "id": profile_id,
+                "created_at": created_at.isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route.path if route is not None else None,
+                "business_id": scope.get("path_params", {}).get("business_id"),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "formats": list(PROFILE_FORMATS)
+            }
+            # Rendering walks the whole frame tree; keep it off the event loop
+            await asyncio.to_thread(_write_profile, profile_id, profiler, meta)
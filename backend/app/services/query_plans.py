@@ -0,0 +1,225 @@
+"""
+Query-plan checks for the metrics hot paths.
+
+Runs explain() on every hot query and reports any that would scan the whole
+collection (COLLSCAN) or sort documents in memory. In-memory sorts show up as
+a SORT stage of the query plan or, for aggregations, as a $sort stage the
+planner could not push down to an index, including inside $facet
+sub-pipelines. Sorting the output of a $group is inherent to the query and
+reported as SORT(grouped) / $sort(grouped) without failing. Run it from the
+backend directory with:
+
+    python -m app.services.query_plans
+
+It exits non-zero when a plan regresses. Set CHECK_QUERY_PLANS_ON_STARTUP=true
+to run the same check when the API starts.
+"""
+from bson import ObjectId
+from datetime import datetime
+from typing import Any, Dict, List
+from app.models.database import init_db, close_db, get_database, get_metrics_repository, INTERACTION_PREVIEW_PROJECTION
+from app.models.pagination import encode_cursor, keyset_filter
+from app.services.rollups import KPI_STAGES, REVENUE_TREND_STAGES, GROWTH_STAGES, dashboard_pipeline, monthly_series_query
+from app.services.metric_summary import metric_summary_pipeline
+import asyncio
+import sys
+
+# Any business id works: plans depend on the query shape, not on the data
+PROBE_BUSINESS_ID = "000000000000000000000000"
+
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT", "$sort"}
+
+# Stages after which documents are group results rather than collection documents
+GROUPING_PLAN_STAGES = {"GROUP"}
+GROUPING_PIPELINE_STAGES = {"$group", "$bucket", "$bucketAuto", "$sortByCount"}
+
+def hot_queries() -> List[Dict[str, Any]]:
+    """The explain commands for each hot query, keyed by a readable name"""
+    match = {"$match": {"business_id": PROBE_BUSINESS_ID}}
+    metrics = get_metrics_repository()
+    return [
+        {
+            "name": "kpis",
+            "command": {"aggregate": "metric_rollups", "pipeline": [match] + KPI_STAGES, "cursor": {}}
+        },
+        {
+            "name": "revenue_trends",
+            "command": {"aggregate": "metric_rollups", "pipeline": [match] + REVENUE_TREND_STAGES, "cursor": {}}
+        },
+        {
+            "name": "growth_by_category",
+            "command": {"aggregate": "metric_rollups", "pipeline": [match] + GROWTH_STAGES, "cursor": {}}
+        },
+        {
+            "name": "dashboard",
+            "command": {"aggregate": "metric_rollups", "pipeline": dashboard_pipeline(PROBE_BUSINESS_ID), "cursor": {}}
+        },
+        {
+            "name": "metric_summary",
+            "command": {
+                "aggregate": "metric_rollups",
+                "pipeline": metric_summary_pipeline(PROBE_BUSINESS_ID, 12),
+                "cursor": {}
+            }
+        },
+        {
+            "name": "metrics_page",
+            # Time-series indexes cannot include _id, so ties on period are sorted after the index scan
+            "allowed": {"SORT"} if metrics.timeseries else set(),
+            "command": {
+                "find": "business_metrics",
+                "filter": metrics.storage_filter({
+                    "business_id": PROBE_BUSINESS_ID,
+                    **keyset_filter("period", encode_cursor(datetime(2024, 1, 1), ObjectId(PROBE_BUSINESS_ID)))
+                }),
+                "sort": {"period": 1, "_id": 1},
+                "limit": 101
+            }
+        },
+        {
+            "name": "monthly_series",
+            "command": {
+                "find": "metric_rollups",
+                "filter": monthly_series_query(PROBE_BUSINESS_ID, "revenue", datetime(2023, 1, 1), datetime(2024, 12, 1)),
+                "projection": {"_id": 0, "period": 1, "sum": 1}
+            }
+        },
+        {
+            "name": "interaction_history",
+            "command": {
+                "find": "ai_interactions",
+                "filter": {
+                    "business_id": PROBE_BUSINESS_ID,
+                    **keyset_filter("timestamp", encode_cursor(datetime(2024, 1, 1), ObjectId(PROBE_BUSINESS_ID)), descending=True)
+                },
+                "projection": INTERACTION_PREVIEW_PROJECTION,
+                "sort": {"timestamp": -1, "_id": -1},
+                "limit": 11
+            }
+        },
+        {
+            "name": "rollup_rebuild",
+            "command": {
+                "aggregate": "business_metrics",
+                "pipeline": metrics.storage_pipeline([match, {"$group": {
+                    "_id": {"metric_type": "$metric_type", "period": "$period"},
+                    "sum": {"$sum": "$value"}
+                }}]),
+                "cursor": {}
+            }
+        },
+    ]
+
+def _find_winning_plans(node: Any) -> List[dict]:
+    plans = []
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan":
+                plans.append(value)
+            elif key != "rejectedPlans":
+                plans.extend(_find_winning_plans(value))
+    elif isinstance(node, list):
+        for item in node:
+            plans.extend(_find_winning_plans(item))
+    return plans
+
+def _contains_stage(node: Any, names: set) -> bool:
+    if isinstance(node, dict):
+        if node.get("stage") in names:
+            return True
+        return any(_contains_stage(value, names) for value in node.values())
+    if isinstance(node, list):
+        return any(_contains_stage(item, names) for item in node)
+    return False
+
+def _plan_stages(node: Any) -> List[str]:
+    """Stage names of a query plan tree, top-down; a SORT fed by a GROUP is marked grouped"""
+    stages = []
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stage = node["stage"]
+            if stage == "SORT" and _contains_stage({k: v for k, v in node.items() if k != "stage"}, GROUPING_PLAN_STAGES):
+                stage = "SORT(grouped)"
+            stages.append(stage)
+        for value in node.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(node, list):
+        for item in node:
+            stages.extend(_plan_stages(item))
+    return stages
+
+def _pipeline_stages(node: Any, grouped: bool = False) -> List[str]:
+    """Aggregation stages left in the pipeline after pushdown, including $facet sub-pipelines.
+
+    Aggregation explain output lists them as `stages: [{"$cursor": ...}, {"$group": ...}, ...]`,
+    possibly nested per shard; $facet holds one such list per facet.
+    """
+    names = []
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "stages" and isinstance(value, list):
+                names.extend(_pipeline(value, grouped))
+            elif key != "queryPlanner":
+                names.extend(_pipeline_stages(value, grouped))
+    elif isinstance(node, list):
+        for item in node:
+            names.extend(_pipeline_stages(item, grouped))
+    return names
+
+def _pipeline(stages: List[Any], grouped: bool) -> List[str]:
+    names = []
+    for stage in stages:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            continue
+        (name, spec), = stage.items()
+        if name == "$cursor":
+            # A $group pushed down into the query plan still groups what follows
+            grouped = grouped or _contains_stage(spec, GROUPING_PLAN_STAGES)
+            continue
+        if not name.startswith("$"):
+            continue
+        if name == "$facet" and isinstance(spec, dict):
+            names.append(name)
+            for sub_pipeline in spec.values():
+                names.extend(_pipeline(sub_pipeline, grouped) if isinstance(sub_pipeline, list) else [])
+            continue
+        names.append(f"{name}(grouped)" if name == "$sort" and grouped else name)
+        grouped = grouped or name in GROUPING_PIPELINE_STAGES
+    return names
+
+async def check_query_plans() -> List[Dict[str, Any]]:
+    """Explain every hot query and report its plan stages and any problems"""
+    database = get_database()
+    results = []
+    for query in hot_queries():
+        explain = await database.command("explain", query["command"], verbosity="queryPlanner")
+        plan_stages = [stage for plan in _find_winning_plans(explain) for stage in _plan_stages(plan)]
+        stages = plan_stages + _pipeline_stages(explain)
+
+        problems = sorted(FORBIDDEN_STAGES.intersection(stages) - query.get("allowed", set()))
+        if not plan_stages:
+            problems.append("NO_PLAN")
+        results.append({"name": query["name"], "stages": stages, "problems": problems})
+    return results
+
+async def verify_query_plans():
+    """Raise if any hot query has a collection scan or in-memory sort"""
+    failures = [r for r in await check_query_plans() if r["problems"]]
+    if failures:
+        details = ", ".join(f"{r['name']}: {'/'.join(r['problems'])}" for r in failures)
+        raise RuntimeError(f"Hot query plans regressed ({details})")
+
+async def _main() -> int:
+    await init_db()
+    try:
+        results = await check_query_plans()
+    finally:
+        await close_db()
+
+    for result in results:
+        status = "FAIL " + ",".join(result["problems"]) if result["problems"] else "ok"
+        print(f"{result['name']:<24} {status:<20} {' > '.join(result['stages'])}")
+    return 1 if any(r["problems"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
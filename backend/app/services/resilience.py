@@ -0,0 +1,92 @@
+from typing import Dict, Any, NamedTuple, Optional
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given zero-based retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class Permit(NamedTuple):
+    """One call admitted by the breaker: whether it is the half-open probe, and the breaker generation it started in"""
+    probe: bool
+    generation: int
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down.
+
+    Only the half-open probe decides whether the breaker closes or reopens.
+    Calls admitted before the breaker last opened report into an older
+    generation and are ignored, so a late success cannot close it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._generation = 0
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    def allow(self) -> Optional[Permit]:
+        """A permit if a call may go upstream now, else None; in half-open state only one probe is let through"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return Permit(probe=False, generation=self._generation)
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return Permit(probe=True, generation=self._generation)
+        self.short_circuited += 1
+        return None
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def _current(self, permit: Permit) -> bool:
+        return permit.generation == self._generation
+
+    def _open(self):
+        self.times_opened += 1
+        self._generation += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def record_success(self, permit: Permit):
+        if permit.probe and self._current(permit):
+            self.state = CLOSED
+            self._probing = False
+            self.consecutive_failures = 0
+        elif self.state == CLOSED and self._current(permit):
+            self.consecutive_failures = 0
+
+    def record_failure(self, permit: Permit):
+        if permit.probe and self._current(permit):
+            self._probing = False
+            self._open()
+        elif self.state == CLOSED and self._current(permit):
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self, permit: Permit):
+        """Give up a half-open probe slot whose call ended without a verdict; no-op for other permits"""
+        if permit.probe and self._current(permit) and self.state == HALF_OPEN:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited
+        }
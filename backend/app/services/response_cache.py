@@ -0,0 +1,121 @@
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, Dict, Any
+from pymongo.errors import PyMongoError
+from app.models.database import get_ai_cache_collection
+import hashlib
+import time
+
+class ResponseCache:
+    """Two-tier cache for model responses: an in-process LRU plus an optional shared MongoDB tier"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.local_hits = Counter()
+        self.shared_hits = Counter()
+        self.misses = Counter()
+        self.stale_hits = Counter()
+
+    @staticmethod
+    def make_key(model: str, template_version: str, prompt: str) -> str:
+        """Content-address a rendered prompt"""
+        digest = hashlib.sha256()
+        for part in (model, template_version, prompt):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str, method: str) -> Optional[str]:
+        """Look a key up in the local tier, then the shared tier"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.local_hits[method] += 1
+                return value
+
+        shared = get_ai_cache_collection()
+        if shared is not None:
+            try:
+                doc = await shared.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+            except PyMongoError:
+                doc = None
+            if doc:
+                remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+                self._store_local(key, doc["response"], remaining)
+                self.shared_hits[method] += 1
+                return doc["response"]
+
+        self.misses[method] += 1
+        return None
+
+    async def get_stale(self, key: str, method: str) -> Optional[str]:
+        """Look a key up ignoring expiry, for use when the upstream is failing"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stale_hits[method] += 1
+            return entry[1]
+
+        shared = get_ai_cache_collection()
+        if shared is not None:
+            try:
+                doc = await shared.find_one({"_id": key})
+            except PyMongoError:
+                doc = None
+            if doc:
+                self.stale_hits[method] += 1
+                return doc["response"]
+        return None
+
+    async def set(self, key: str, value: str, ttl: float, method: str):
+        """Store a response in both tiers"""
+        self._store_local(key, value, ttl)
+
+        shared = get_ai_cache_collection()
+        if shared is not None:
+            try:
+                await shared.replace_one(
+                    {"_id": key},
+                    {
+                        "response": value,
+                        "method": method,
+                        "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+                    },
+                    upsert=True
+                )
+            except PyMongoError:
+                pass
+
+    def _store_local(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry from the local tier"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, overall and per service method"""
+        methods = set(self.local_hits) | set(self.shared_hits) | set(self.misses) | set(self.stale_hits)
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": sum(self.local_hits.values()) + sum(self.shared_hits.values()),
+            "local_hits": sum(self.local_hits.values()),
+            "shared_hits": sum(self.shared_hits.values()),
+            "misses": sum(self.misses.values()),
+            "stale_hits": sum(self.stale_hits.values()),
+            "by_method": {
+                method: {
+                    "local_hits": self.local_hits[method],
+                    "shared_hits": self.shared_hits[method],
+                    "misses": self.misses[method],
+                    "stale_hits": self.stale_hits[method]
+                }
+                for method in sorted(methods)
+            }
+        }
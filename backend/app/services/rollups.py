@@ -0,0 +1,211 @@
+"""
+Per-period metric rollups maintained incrementally on write.
+
+Each metric_rollups document holds the sum and count of one
+(business_id, metric_type, period). Metrics are unique on that key, so a
+rollup mirrors the latest value written for it. Rebuild from raw metrics with:
+
+    python -m app.services.rollups [--business-id ID]
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from app.models.database import init_db, close_db, get_metrics_repository, get_rollups_collection
+from app.models.periods import add_months, current_period, format_period
+import argparse
+import asyncio
+
+# KPI field name for each metric type shown on the dashboard
+KPI_FIELDS = {
+    "revenue": "monthly_revenue",
+    "customers": "customer_growth",
+    "conversion_rate": "conversion_rate"
+}
+
+# Order of the rollup key index after business_id. KPI and growth stages rely
+# on it, so both sort the same way and the dashboard can sort once for both
+ROLLUP_ORDER = {"metric_type": 1, "period": 1}
+
+# Rollup aggregation stages, shared by the individual endpoints and /dashboard
+# so both always report the same numbers
+KPI_STAGES = [
+    {"$match": {"metric_type": {"$in": list(KPI_FIELDS)}}},
+    {"$sort": ROLLUP_ORDER},
+    # Keep only the last two periods per type, so memory does not grow with history
+    {"$group": {"_id": "$metric_type", "latest": {"$lastN": {"input": "$sum", "n": 2}}}},
+    # Newest first
+    {"$project": {"latest": {"$reverseArray": "$latest"}}}
+]
+
+REVENUE_TREND_STAGES = [
+    {"$match": {"metric_type": {"$in": ["revenue", "customers"]}}},
+    {"$group": {
+        "_id": "$period",
+        "has_revenue": {"$max": {"$eq": ["$metric_type", "revenue"]}},
+        "revenue": {"$sum": {"$cond": [{"$eq": ["$metric_type", "revenue"]}, "$sum", 0]}},
+        "customers": {"$sum": {"$cond": [{"$eq": ["$metric_type", "customers"]}, "$sum", 0]}}
+    }},
+    {"$match": {"has_revenue": True}},
+    {"$sort": {"_id": 1}},
+    {"$project": {"_id": 0, "month": {"$dateToString": {"date": "$_id", "format": "%Y-%m"}}, "revenue": 1, "customers": 1}}
+]
+
+GROWTH_STAGES = [
+    {"$sort": ROLLUP_ORDER},
+    {"$group": {
+        "_id": "$metric_type",
+        "first": {"$first": "$sum"},
+        "last": {"$last": "$sum"}
+    }},
+    {"$project": {
+        "category": "$_id",
+        "growth": {
+            "$cond": [
+                {"$eq": ["$first", 0]},
+                0,
+                {"$multiply": [{"$divide": [{"$subtract": ["$last", "$first"]}, "$first"]}, 100]}
+            ]
+        }
+    }}
+]
+
+def dashboard_pipeline(business_id: str) -> List[Dict[str, Any]]:
+    """KPIs, revenue trends and category growth in one aggregation.
+
+    Stages inside $facet cannot use an index, so the shared sort runs once
+    before it (an index-ordered scan) and is left out of the sub-pipelines.
+    """
+    def unsorted(stages):
+        return [stage for stage in stages if "$sort" not in stage]
+
+    return [
+        {"$match": {"business_id": business_id}},
+        {"$sort": ROLLUP_ORDER},
+        {"$facet": {
+            "kpis": unsorted(KPI_STAGES),
+            "revenue_trends": REVENUE_TREND_STAGES,
+            "growth_by_category": unsorted(GROWTH_STAGES)
+        }}
+    ]
+
+def kpis_from_rollups(rows: List[dict]) -> dict:
+    """Turn KPI_STAGES output into the KPI payload"""
+    kpis = {
+        "monthly_revenue": 0,
+        "monthly_revenue_change": 0,
+        "customer_growth": 0,
+        "customer_growth_change": 0,
+        "conversion_rate": 0,
+        "conversion_rate_change": 0
+    }
+
+    for row in rows:
+        kpi = KPI_FIELDS[row["_id"]]
+        latest = row["latest"]
+        kpis[kpi] = latest[0]
+        if len(latest) > 1:
+            kpis[f"{kpi}_change"] = (latest[0] - latest[1]) / latest[1] if latest[1] != 0 else 0
+
+    return kpis
+
+def monthly_series_query(business_id: str, metric_type: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """Rollups of one metric between two month starts; a range scan on the rollup key index"""
+    return {"business_id": business_id, "metric_type": metric_type, "period": {"$gte": start, "$lte": end}}
+
+async def monthly_series(
+    business_id: str,
+    metric_type: str,
+    months: int,
+    end: Optional[datetime] = None,
+    year_over_year: bool = False
+) -> List[dict]:
+    """One bucket per month for the `months` months up to `end`, optionally with the same month a year earlier"""
+    end = end or current_period()
+    start = add_months(end, -(months - 1))
+    scan_from = add_months(start, -12) if year_over_year else start
+
+    cursor = get_rollups_collection().find(
+        monthly_series_query(business_id, metric_type, scan_from, end),
+        {"_id": 0, "period": 1, "sum": 1}
+    )
+    values = {row["period"]: row["sum"] async for row in cursor}
+
+    buckets = []
+    for offset in range(months):
+        period = add_months(start, offset)
+        bucket = {"month": format_period(period), "value": values.get(period)}
+        if year_over_year:
+            previous = values.get(add_months(period, -12))
+            bucket["previous_year"] = previous
+            bucket["yoy_change"] = (bucket["value"] - previous) / previous if bucket["value"] is not None and previous else None
+        buckets.append(bucket)
+    return buckets
+
+def rollup_key(metric: Dict[str, Any]) -> tuple:
+    return (metric["business_id"], metric["metric_type"], metric["period"])
+
+async def apply_metrics(metrics: Iterable[Dict[str, Any]]):
+    """Write the values of newly upserted metric documents into their period rollups"""
+    # Later writes of the same key win, matching the upserts on business_metrics
+    latest = {rollup_key(metric): metric["value"] for metric in metrics}
+    if not latest:
+        return
+
+    now = datetime.utcnow()
+    await get_rollups_collection().bulk_write([
+        UpdateOne(
+            {"business_id": business_id, "metric_type": metric_type, "period": period},
+            {"$set": {"sum": value, "count": 1, "updated_at": now}},
+            upsert=True
+        )
+        for (business_id, metric_type, period), value in latest.items()
+    ], ordered=False)
+
+async def _merge_from_metrics(match: Dict[str, Any]):
+    """Recompute the rollups of every metric matching `match` and merge them in"""
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"business_id": "$business_id", "metric_type": "$metric_type", "period": "$period"},
+            "sum": {"$sum": "$value"},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "business_id": "$_id.business_id",
+            "metric_type": "$_id.metric_type",
+            "period": "$_id.period",
+            "sum": 1,
+            "count": 1,
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {
+            "into": get_rollups_collection().name,
+            "on": ["business_id", "metric_type", "period"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    await get_metrics_repository().aggregate(pipeline).to_list(length=None)
+
+async def rebuild_rollups(business_id: Optional[str] = None) -> int:
+    """Recompute rollups from raw metrics, for one business or all of them"""
+    rollups = get_rollups_collection()
+    match = {"business_id": business_id} if business_id else {}
+
+    await rollups.delete_many(match)
+    await _merge_from_metrics(match)
+    return await rollups.count_documents(match)
+
+async def _main(args):
+    await init_db()
+    try:
+        count = await rebuild_rollups(args.business_id)
+        print(f"Rebuilt {count} rollup documents")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild metric_rollups from business_metrics")
+    parser.add_argument("--business-id", help="Only rebuild rollups for this business")
+    asyncio.run(_main(parser.parse_args()))
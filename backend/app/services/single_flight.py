@@ -0,0 +1,59 @@
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Any, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one upstream task"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = Counter()
+        self.coalesced = Counter()
+
+    async def do(self, key: str, method: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Run factory() for key, or join the call already in flight for it"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.leaders[method] += 1
+        else:
+            self.coalesced[method] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            # Only abandon the upstream call once nobody is waiting for it
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Upstream vs. coalesced call counters, overall and per service method"""
+        methods = set(self.leaders) | set(self.coalesced)
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": sum(self.leaders.values()),
+            "coalesced_calls": sum(self.coalesced.values()),
+            "by_method": {
+                method: {
+                    "upstream_calls": self.leaders[method],
+                    "coalesced_calls": self.coalesced[method]
+                }
+                for method in sorted(methods)
+            }
+        }
@@ -0,0 +1,68 @@
+"""
+Benchmark: per-request authentication overhead with and without the principal cache.
+
+Creates a synthetic business and token, then times get_current_user called
+directly (JWT decode plus business lookup) and GET /api/auth/me end to end,
+first with the principal cache disabled and then warm.
+
+Usage (from the backend directory, with MongoDB running):
+
+    python -m benchmarks.auth_overhead --iterations 5000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from benchmarks.common import create_business, drop_business, http_client, summarize
+from app.models import database
+from app.routers.auth import create_access_token, get_current_user, principal_cache
+
+
+async def direct(credentials, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await get_current_user(credentials)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def over_http(http, headers, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = await http.get("/api/auth/me", headers=headers)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main(args):
+    await database.init_db()
+    business_id = await create_business("Auth Benchmark")
+    token = create_access_token({"sub": "auth.benchmark@example.com", "business_id": business_id})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    headers = {"Authorization": f"Bearer {token}"}
+    ttl = principal_cache.ttl
+    try:
+        async with http_client() as http:
+            for label, cache_ttl in (("uncached", 0), ("cached", ttl or 30.0)):
+                principal_cache.clear()
+                principal_cache.ttl = cache_ttl
+                await direct(credentials, 50)
+                print(summarize(f"get_current_user {label}", await direct(credentials, args.iterations)))
+                print(summarize(f"GET /api/auth/me {label}", await over_http(http, headers, args.iterations)))
+        print(principal_cache.stats())
+    finally:
+        principal_cache.ttl = ttl
+        principal_cache.clear()
+        await drop_business(business_id)
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""Shared helpers for the benchmark scripts"""
+import os
+import random
+import statistics
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE_NAME", "business_growth_benchmark")
+
+import httpx
+
+from app.main import app
+from app.models import database
+from app.models.periods import parse_period, MONTH
+
+METRIC_TYPES = ("revenue", "customers", "conversion_rate", "orders")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(samples_ms):
+    """p50/p95/p99/max in milliseconds, for JSON results"""
+    if not samples_ms:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "p50": round(statistics.median(samples_ms), 3),
+        "p95": round(percentile(samples_ms, 95), 3),
+        "p99": round(percentile(samples_ms, 99), 3),
+        "max": round(max(samples_ms), 3),
+    }
+
+
+def summarize(label, samples_ms):
+    return (
+        f"{label:>32}: n={len(samples_ms):5d} "
+        f"p50={statistics.median(samples_ms):8.2f}ms "
+        f"p95={percentile(samples_ms, 95):8.2f}ms "
+        f"p99={percentile(samples_ms, 99):8.2f}ms"
+    )
+
+
+def http_client():
+    """An httpx client that calls the ASGI app in-process"""
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+
+def period_labels(count):
+    """count consecutive YYYY-MM labels ending at 2024-12"""
+    labels = []
+    year, month = 2024, 12
+    for _ in range(count):
+        labels.append(f"{year}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return labels[::-1]
+
+
+def metric_keys(count, periods):
+    """count distinct (metric_type, period) pairs.
+
+    Metrics are unique per (business_id, metric_type, period), so counts beyond
+    len(METRIC_TYPES) * periods spill over into synthetic custom_N metric types.
+    """
+    labels = period_labels(periods)
+    types = list(METRIC_TYPES)
+    while len(types) * periods < count:
+        types.append(f"custom_{len(types) - len(METRIC_TYPES)}")
+    pairs = ((metric_type, period) for metric_type in types for period in labels)
+    return [next(pairs) for _ in range(count)]
+
+
+async def create_business(name="Benchmark Bakery"):
+    businesses = database.get_businesses_collection()
+    result = await businesses.insert_one({
+        "name": name,
+        "industry": "Food",
+        "description": "Synthetic tenant for benchmarking",
+        "owner_email": f"{name.lower().replace(' ', '.')}@example.com",
+    })
+    return str(result.inserted_id)
+
+
+async def seed_metrics(business_id, count, periods=36, chunk_size=10_000, seed=42, repository=None):
+    """Insert count synthetic metrics spread over the given number of periods"""
+    rng = random.Random(seed)
+    keys = metric_keys(count, periods)
+    metrics = repository or database.get_metrics_repository()
+    for start in range(0, count, chunk_size):
+        await metrics.collection.insert_many([
+            metrics.storage_document({
+                "business_id": business_id,
+                "metric_type": metric_type,
+                "value": round(rng.uniform(10, 1000), 2),
+                "period": parse_period(period),
+                "granularity": MONTH,
+                "metadata": None,
+            })
+            for metric_type, period in keys[start:start + chunk_size]
+        ], ordered=False)
+
+
+async def drop_business(business_id):
+    from bson import ObjectId
+
+    await database.get_metrics_repository().delete_many({"business_id": business_id})
+    await database.get_rollups_collection().delete_many({"business_id": business_id})
+    await database.get_interactions_collection().delete_many({"business_id": business_id})
+    await database.get_interactions_archive_collection().delete_many({"business_id": business_id})
+    await database.get_forecasts_collection().delete_many({"business_id": business_id})
+    await database.get_jobs_collection().delete_many({"business_id": business_id})
+    await database.get_businesses_collection().delete_one({"_id": ObjectId(business_id)})
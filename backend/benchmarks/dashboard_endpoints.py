@@ -0,0 +1,84 @@
+"""
+Benchmark: three dashboard endpoints vs. the combined /dashboard endpoint.
+
+Seeds a synthetic business at each requested scale, rebuilds its rollups,
+checks that /dashboard returns exactly what /kpis, /revenue-trends and
+/growth-by-category return, then times both approaches.
+
+Usage (from the backend directory, with MongoDB running):
+
+    python -m benchmarks.dashboard_endpoints --scales 10000 1000000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import create_business, drop_business, http_client, seed_metrics, summarize
+from app.models import database
+from app.services.rollups import rebuild_rollups
+
+
+async def separate(http, business_id):
+    kpis, trends, growth = await asyncio.gather(
+        http.get(f"/api/business/{business_id}/kpis"),
+        http.get(f"/api/business/{business_id}/revenue-trends"),
+        http.get(f"/api/business/{business_id}/growth-by-category"),
+    )
+    return {
+        "kpis": kpis.json(),
+        "revenue_trends": trends.json(),
+        "growth_by_category": growth.json(),
+    }
+
+
+async def combined(http, business_id):
+    response = await http.get(f"/api/business/{business_id}/dashboard")
+    return response.json()
+
+
+def normalized(payload):
+    return {
+        "kpis": payload["kpis"],
+        "revenue_trends": payload["revenue_trends"],
+        "growth_by_category": sorted(payload["growth_by_category"], key=lambda row: row["category"]),
+    }
+
+
+async def timed(fn, http, business_id, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await fn(http, business_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main(args):
+    await database.init_db()
+    try:
+        async with http_client() as http:
+            for scale in args.scales:
+                business_id = await create_business(f"Dashboard Bench {scale}")
+                try:
+                    started = time.perf_counter()
+                    await seed_metrics(business_id, scale, periods=args.periods)
+                    await rebuild_rollups(business_id)
+                    print(f"\n{scale:,} metrics seeded in {time.perf_counter() - started:.1f}s")
+
+                    if normalized(await separate(http, business_id)) != normalized(await combined(http, business_id)):
+                        raise SystemExit("Mismatch between /dashboard and the individual endpoints")
+
+                    print(summarize("3 endpoints", await timed(separate, http, business_id, args.iterations)))
+                    print(summarize("/dashboard", await timed(combined, http, business_id, args.iterations)))
+                finally:
+                    await drop_business(business_id)
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--periods", type=int, default=36)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
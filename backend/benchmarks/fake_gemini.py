@@ -0,0 +1,144 @@
+"""
+Local stand-in for the Gemini REST API.
+
+Serves generateContent and streamGenerateContent (SSE) for any model. Each
+response waits --first-token-latency, then produces --response-tokens tokens
+at --tokens-per-second, and reports usage metadata like the real API.
+--error-rate answers that fraction of calls with 503, to exercise retries and
+the circuit breaker.
+
+The benchmark suite starts it in a background thread. It can also run on its
+own, with the API pointed at it through GEMINI_BASE_URL:
+
+    python -m benchmarks.fake_gemini --port 8765
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("growth", "revenue", "customers", "market", "strategy", "retention", "pricing", "channel", "margin", "team")
+
+# Tokens per streamed chunk
+STREAM_CHUNK_TOKENS = 10
+
+
+@dataclass
+class FakeGeminiConfig:
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 200.0
+    response_tokens: int = 300
+    error_rate: float = 0.0
+
+
+def _prompt_tokens(body):
+    text = " ".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    return max(1, len(text) // 4)
+
+
+def _chunk(text, prompt_tokens, completion_tokens, model, finished):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        },
+        "modelVersion": model,
+    }
+
+
+def create_app(config: FakeGeminiConfig) -> FastAPI:
+    app = FastAPI()
+    stats = {"calls": 0, "errors": 0}
+    app.state.stats = stats
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate(version: str, model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        body = await request.json()
+        stats["calls"] += 1
+        if random.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": {"code": 503, "message": "fake overload", "status": "UNAVAILABLE"}})
+
+        prompt_tokens = _prompt_tokens(body)
+        words = [random.choice(WORDS) for _ in range(config.response_tokens)]
+        await asyncio.sleep(config.first_token_latency)
+
+        if action == "generateContent":
+            await asyncio.sleep(config.response_tokens / config.tokens_per_second)
+            return _chunk(" ".join(words), prompt_tokens, len(words), model, finished=True)
+
+        async def events():
+            for start in range(0, len(words), STREAM_CHUNK_TOKENS):
+                piece = words[start:start + STREAM_CHUNK_TOKENS]
+                await asyncio.sleep(len(piece) / config.tokens_per_second)
+                finished = start + STREAM_CHUNK_TOKENS >= len(words)
+                chunk = _chunk(" ".join(piece) + " ", prompt_tokens, start + len(piece), model, finished)
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeGeminiServer:
+    """Run the fake API on a background thread with its own event loop"""
+
+    def __init__(self, config: FakeGeminiConfig, port: int = 8765):
+        self.app = create_app(config)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def stats(self):
+        return dict(self.app.state.stats)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def add_arguments(parser):
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--response-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 503")
+
+
+def config_from_args(args) -> FakeGeminiConfig:
+    return FakeGeminiConfig(args.first_token_latency, args.tokens_per_second, args.response_tokens, args.error_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host="127.0.0.1", port=args.port)
@@ -0,0 +1,61 @@
+"""
+Benchmark: forecasting and anomaly detection cost per series.
+
+Fits synthetic monthly series (trend, seasonality, noise and a few spikes)
+exactly as the nightly batch does, and reports per-series latency plus the
+projected CPU time for a nightly run over every tenant. No database needed.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.forecasting_batch --series 20000 --months 36
+"""
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import summarize
+from app.services.forecasting import ANOMALY_THRESHOLDS, SeriesModel, forecast_series, series_anomalies
+
+
+def synthetic_series(rng, months):
+    t = np.arange(months)
+    values = 1000 + 15 * t + 120 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 40, months)
+    spikes = rng.choice(months, size=max(1, months // 24), replace=False)
+    values[spikes] += rng.choice([-1, 1], size=len(spikes)) * 400
+    return values
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    start = datetime(2022, 1, 1)
+    series = [synthetic_series(rng, args.months) for _ in range(args.series)]
+
+    samples = []
+    flagged = 0
+    started = time.perf_counter()
+    for values in series:
+        began = time.perf_counter()
+        model = SeriesModel(start, values)
+        forecast_series(model, args.horizon, args.window)
+        for method, threshold in ANOMALY_THRESHOLDS.items():
+            flagged += len(series_anomalies(model, method, threshold))
+        samples.append((time.perf_counter() - began) * 1000)
+    elapsed = time.perf_counter() - started
+
+    print(summarize(f"{args.months}-month series", samples))
+    print(f"{args.series:,} series in {elapsed:.2f}s = {args.series / elapsed:,.0f} series/sec, {flagged:,} anomalies flagged")
+    tenants_per_hour = 3600 / elapsed * args.series / args.series_per_tenant
+    print(f"At {args.series_per_tenant} series per tenant: ~{tenants_per_hour:,.0f} tenants per CPU-hour (excluding database I/O)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--series", type=int, default=20_000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--horizon", type=int, default=6)
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--series-per-tenant", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
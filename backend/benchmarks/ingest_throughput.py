@@ -0,0 +1,99 @@
+"""
+Benchmark: bulk ingest throughput in rows/sec.
+
+Posts the same synthetic rows through /metrics/batch (JSON array),
+/metrics/ingest (gzipped NDJSON) in insert and upsert mode, then re-submits
+them to the upsert endpoint, and reports rows/sec for each.
+
+Usage (from the backend directory, with MongoDB running):
+
+    python -m benchmarks.ingest_throughput --rows 100000 --request-rows 5000
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import time
+
+from benchmarks.common import create_business, drop_business, http_client, metric_keys
+from app.models import database
+
+
+def synthetic_rows(business_id, count, periods, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            "business_id": business_id,
+            "metric_type": metric_type,
+            "value": round(rng.uniform(10, 1000), 2),
+            "period": period,
+        }
+        for metric_type, period in metric_keys(count, periods)
+    ]
+
+
+def batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+async def post_batch(http, rows):
+    response = await http.post("/api/business/metrics/batch", json=rows)
+    response.raise_for_status()
+
+
+async def post_ingest(http, rows, upsert):
+    body = gzip.compress("".join(json.dumps(row) + "\n" for row in rows).encode())
+    response = await http.post(
+        "/api/business/metrics/ingest",
+        params={"upsert": str(upsert).lower()},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    response.raise_for_status()
+    summary = response.json()
+    if summary["rejected"]:
+        raise SystemExit(f"Ingest rejected rows: {summary['errors']}")
+
+
+async def run(label, send, http, rows, request_rows):
+    started = time.perf_counter()
+    for chunk in batches(rows, request_rows):
+        await send(http, chunk)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>32}: {len(rows):,} rows in {elapsed:7.2f}s = {len(rows) / elapsed:10,.0f} rows/sec")
+
+
+async def main(args):
+    await database.init_db()
+    try:
+        async with http_client() as http:
+            modes = [
+                ("/metrics/batch", post_batch),
+                ("/metrics/ingest?upsert=false", lambda h, r: post_ingest(h, r, upsert=False)),
+                ("/metrics/ingest?upsert=true", lambda h, r: post_ingest(h, r, upsert=True)),
+            ]
+            for number, (label, send) in enumerate(modes):
+                business_id = await create_business(f"Ingest Bench {number}")
+                try:
+                    rows = synthetic_rows(business_id, args.rows, args.periods)
+                    await run(label, send, http, rows, args.request_rows)
+                    if label.endswith("upsert=true"):
+                        # Re-submitting the same rows must not grow the collection
+                        await run("  re-submitted", send, http, rows, args.request_rows)
+                        stored = await database.get_metrics_repository().count_documents({"business_id": business_id})
+                        if stored != len(rows):
+                            raise SystemExit(f"Expected {len(rows)} stored metrics after re-submission, found {stored}")
+                finally:
+                    await drop_business(business_id)
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--request-rows", type=int, default=5_000)
+    parser.add_argument("--periods", type=int, default=36)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Load test: dashboard KPI latency while concurrent AI insight calls are running.
+
+The Gemini client is replaced with a stub that takes ``--model-latency`` seconds
+per call. The stub exposes both the blocking (``client.models``) and the async
+(``client.aio.models``) entry points. The service runs the blocking one on its
+sized pool (GEMINI_EXECUTOR_WORKERS); the script shows the stall if it were
+called from the event loop instead.
+
+Usage (from the backend directory, with MongoDB running):
+
+    python -m benchmarks.kpi_latency_under_ai_load --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import create_business, drop_business, http_client, summarize
+from app.models import database
+from app.services import gemini_service as gemini_module
+
+
+class SlowModels:
+    """Blocking stand-in for ``client.models``"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, model, contents):
+        time.sleep(self.latency)
+        return SimpleNamespace(text="stubbed insight")
+
+
+class AsyncSlowModels:
+    """Async stand-in for ``client.aio.models``"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def generate_content(self, model, contents):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(text="stubbed insight")
+
+
+async def sample_kpis(http, business_id, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await http.get(f"/api/business/{business_id}/kpis")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def measure(http, business_id, ai_business_ids, duration: float):
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_kpis(http, business_id, stop, samples))
+    ai_calls = [
+        asyncio.create_task(http.post(f"/api/ai/insights/{ai_business_id}"))
+        for ai_business_id in ai_business_ids
+    ]
+    await asyncio.sleep(duration)
+    stop.set()
+    await sampler
+    await asyncio.gather(*ai_calls, return_exceptions=True)
+    return samples
+
+
+async def main(args):
+    gemini_module.client = SimpleNamespace(
+        models=SlowModels(args.model_latency),
+        aio=SimpleNamespace(models=AsyncSlowModels(args.model_latency)),
+    )
+
+    await database.init_db()
+    business_id = await create_business()
+    # Distinct tenants, so the response cache and request coalescing don't collapse the AI load
+    ai_business_ids = [await create_business(f"Benchmark Tenant {i}") for i in range(args.concurrency)]
+    try:
+        async with http_client() as http:
+            for month in range(1, 13):
+                for metric_type in ("revenue", "customers", "conversion_rate"):
+                    await http.post("/api/business/metrics", json={
+                        "business_id": business_id,
+                        "metric_type": metric_type,
+                        "value": float(month * 100),
+                        "period": f"2024-{month:02d}",
+                    })
+            baseline = await measure(http, business_id, [], args.duration)
+            loaded = await measure(http, business_id, ai_business_ids, args.duration)
+    finally:
+        for tenant_id in [business_id, *ai_business_ids]:
+            await drop_business(tenant_id)
+        await database.close_db()
+
+    print(summarize("idle", baseline))
+    print(summarize(f"{args.concurrency} concurrent AI calls", loaded))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=3.0)
+    asyncio.run(main(parser.parse_args()))
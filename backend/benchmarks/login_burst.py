@@ -0,0 +1,98 @@
+"""
+Load test: a burst of logins and its effect on other endpoints.
+
+Creates --accounts accounts sharing one bcrypt hash, then fires --burst
+concurrent logins spread over them while sampling GET /kpis latency. The
+burst runs twice: once with hashing on the worker pool, as deployed, and once
+with hashing inline on the event loop for comparison. A baseline with no burst
+is measured first.
+
+Usage (from the backend directory, with MongoDB running):
+
+    python -m benchmarks.login_burst --accounts 50 --burst 200
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from benchmarks.common import create_business, drop_business, http_client, summarize
+from app.models import database
+from app.services import passwords
+
+PASSWORD = "correct horse battery staple"
+
+
+async def inline(fn, *args):
+    """Run the hash on the event loop, as a synchronous KDF call would"""
+    return fn(*args)
+
+
+async def sample_kpis(http, business_id, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await http.get(f"/api/business/{business_id}/kpis")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def login(http, email, latencies, statuses):
+    started = time.perf_counter()
+    response = await http.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+    latencies.append((time.perf_counter() - started) * 1000)
+    statuses[response.status_code] += 1
+
+
+async def measure(http, business_id, emails, burst, duration):
+    kpi_samples, login_latencies, statuses = [], [], Counter()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_kpis(http, business_id, stop, kpi_samples))
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    logins = [asyncio.create_task(login(http, emails[i % len(emails)], login_latencies, statuses)) for i in range(burst)]
+    await asyncio.gather(*logins)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(max(0.0, duration - elapsed))
+    stop.set()
+    await sampler
+    return kpi_samples, login_latencies, statuses, elapsed
+
+
+async def main(args):
+    await database.init_db()
+    businesses = database.get_businesses_collection()
+    business_id = await create_business()
+    password_hash = passwords.password_context.hash(PASSWORD)
+    account_ids = [await create_business(f"Login Tenant {i}") for i in range(args.accounts)]
+    emails = [f"login.tenant.{i}@example.com" for i in range(args.accounts)]
+    for email in emails:
+        await businesses.update_one({"owner_email": email}, {"$set": {"password_hash": password_hash}})
+    try:
+        async with http_client() as http:
+            baseline, _, _, _ = await measure(http, business_id, emails, 0, args.duration)
+            print(summarize("/kpis, no logins", baseline))
+
+            offload = passwords._offload
+            for label, runner in (("worker pool", offload), ("inline", inline)):
+                passwords._offload = runner
+                try:
+                    kpis, logins, statuses, elapsed = await measure(http, business_id, emails, args.burst, args.duration)
+                finally:
+                    passwords._offload = offload
+                print(summarize(f"/kpis during burst, {label}", kpis))
+                print(summarize(f"/login, {label}", logins))
+                print(f"{'':>34}{args.burst} logins in {elapsed:.2f}s, statuses {dict(statuses)}")
+        print(passwords.stats())
+    finally:
+        for account_id in [business_id, *account_ids]:
+            await drop_business(account_id)
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5.0, help="Minimum sampling window per run, in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""
+Benchmark: business_metrics as a plain collection vs. a time-series collection.
+
+Seeds the same synthetic metrics into two scratch databases, one per storage
+layout, then reports storage and index size and the latency of the revenue
+trend aggregation computed from raw metrics (the query the rollups replace,
+and what a rollup rebuild runs per business). Results must match across layouts.
+
+Usage (from the backend directory, with MongoDB 7.0+ running):
+
+    python -m benchmarks.metrics_storage_layouts --businesses 50 --metrics-per-business 2000
+"""
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+
+from benchmarks.common import seed_metrics, summarize
+from app.config import get_settings
+from app.models import database
+from app.models.database import MetricsRepository, TIMESERIES_OPTIONS
+from app.models.indexes import COLLECTION_LAYOUT, TIMESERIES_LAYOUT, ensure_indexes
+from app.services.rollups import REVENUE_TREND_STAGES
+
+
+def revenue_trend_pipeline(business_id):
+    return [
+        {"$match": {"business_id": business_id, "metric_type": {"$in": ["revenue", "customers"]}}},
+        {"$project": {"metric_type": 1, "period": 1, "sum": "$value"}},
+    ] + REVENUE_TREND_STAGES
+
+
+async def prepare(client, layout, business_ids, args):
+    db = client[f"{get_settings().database_name}_{layout}"]
+    await client.drop_database(db.name)
+    if layout == TIMESERIES_LAYOUT:
+        await db.create_collection("business_metrics", timeseries=TIMESERIES_OPTIONS)
+    await ensure_indexes(db, layout)
+    repository = MetricsRepository(db["business_metrics"], layout)
+
+    started = time.perf_counter()
+    for business_id in business_ids:
+        await seed_metrics(business_id, args.metrics_per_business, periods=args.periods, repository=repository)
+    print(f"{layout}: seeded {len(business_ids) * args.metrics_per_business:,} metrics in {time.perf_counter() - started:.1f}s")
+    return db, repository
+
+
+async def storage(db):
+    stats = await db.command("collStats", "business_metrics")
+    return stats["storageSize"], stats["totalIndexSize"]
+
+
+async def timed_trends(repository, business_ids, iterations):
+    samples = []
+    for i in range(iterations):
+        business_id = business_ids[i % len(business_ids)]
+        started = time.perf_counter()
+        await repository.aggregate(revenue_trend_pipeline(business_id)).to_list(length=None)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main(args):
+    await database.init_db(create_indexes=False)
+    business_ids = [str(ObjectId()) for _ in range(args.businesses)]
+    layouts = {}
+    try:
+        for layout in (COLLECTION_LAYOUT, TIMESERIES_LAYOUT):
+            layouts[layout] = await prepare(database.client, layout, business_ids, args)
+
+        probe = business_ids[0]
+        results = [
+            await repository.aggregate(revenue_trend_pipeline(probe)).to_list(length=None)
+            for _, repository in layouts.values()
+        ]
+        if results[0] != results[1]:
+            raise SystemExit("Revenue trends differ between the two layouts")
+
+        print()
+        for layout, (db, repository) in layouts.items():
+            storage_size, index_size = await storage(db)
+            print(f"{layout:>32}: storage={storage_size / 2**20:8.2f}MiB indexes={index_size / 2**20:8.2f}MiB")
+        for layout, (db, repository) in layouts.items():
+            print(summarize(f"{layout} revenue trends", await timed_trends(repository, business_ids, args.iterations)))
+    finally:
+        if not args.keep:
+            for db, _ in layouts.values():
+                await database.client.drop_database(db.name)
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--businesses", type=int, default=50)
+    parser.add_argument("--metrics-per-business", type=int, default=2_000)
+    parser.add_argument("--periods", type=int, default=36)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch databases for inspection")
+    asyncio.run(main(parser.parse_args()))
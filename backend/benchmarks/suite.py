@@ -0,0 +1,412 @@
+"""
+Benchmark suite: every business, ai and auth route under concurrent load.
+
+Runs the app in-process with its startup hooks (database, index builds, job
+workers). Gemini calls go to a local fake API (benchmarks.fake_gemini) with
+configurable latency and token rate, and the AI response cache is off unless
+--ai-cache is given. For each --scales value the suite seeds a tenant with that
+many metrics. It also seeds --interactions AI interactions for it, a few small
+tenants for the AI routes, and a scratch tenant for the write routes. Each route
+is then driven with --concurrency workers. Throughput and p50/p95/p99 latency
+per route are printed and saved as JSON, together with the event-loop lag seen
+while each route was under load. A route whose p99 loop lag exceeds
+--max-loop-lag-ms (blocking work on the event loop, such as synchronous SDK
+I/O) is reported and makes the run exit non-zero. Two result files can be
+compared to catch regressions between commits.
+
+Usage (from the backend directory, with MongoDB running; DATABASE_NAME
+defaults to business_growth_benchmark and is dropped afterwards):
+
+    python -m benchmarks.suite --scales 1000 100000 --output before.json
+    python -m benchmarks.suite --scales 1000 100000 --output after.json
+    python -m benchmarks.suite --compare before.json after.json
+
+--mongomock runs against mongomock-motor instead of a server. It needs no
+MongoDB, but mongomock lacks $facet, $merge, $indexStats and explain. Routes
+that rely on those are reported with errors, and its latencies say nothing
+about a real server.
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from benchmarks.common import drop_business, http_client, latency_summary, seed_metrics
+from benchmarks.fake_gemini import FakeGeminiServer, add_arguments, config_from_args
+from app.main import app
+from app.models import database
+from app.models.periods import add_months, format_period
+from app.services import gemini_service as gemini_module
+from app.services.rollups import rebuild_rollups
+
+ROUTE_PREFIXES = ("/api/business", "/api/ai", "/api/auth")
+PASSWORD = "benchmark-password"
+BASE_PERIOD = datetime(2000, 1, 1)
+
+
+class Scenario:
+    """One route and how to build its i-th request"""
+
+    def __init__(self, method, route, build, ai=False, max_requests=None):
+        self.method = method
+        self.route = route
+        self.build = build
+        self.ai = ai
+        self.max_requests = max_requests
+
+
+def _month(n):
+    return format_period(add_months(BASE_PERIOD, n))
+
+
+def _metric(business_id, metric_type, n, value=100.0):
+    """The n-th distinct metric of a write scenario; keys spill into new metric types every 50 years of months"""
+    series, month = divmod(n, 600)
+    return {"business_id": business_id, "metric_type": f"{metric_type}_{series}", "value": value + n % 50, "period": _month(month)}
+
+
+def _ndjson(rows):
+    return gzip.compress("".join(json.dumps(row) + "\n" for row in rows).encode())
+
+
+def scenarios(args):
+    def auth(fx):
+        return {"Authorization": f"Bearer {fx.token}"}
+
+    def ai_tenant(fx, i):
+        return fx.ai_tenants[i % len(fx.ai_tenants)]
+
+    return [
+        # business.py
+        Scenario("POST", "/api/business/", lambda fx, i: {"url": "/api/business/", "json": {
+            "name": f"Created {i}", "industry": "Retail", "description": "Benchmark",
+            "owner_email": f"created.{i}.{fx.run_id}@bench.example.com"}}),
+        Scenario("GET", "/api/business/", lambda fx, i: {"url": "/api/business/", "headers": auth(fx)}),
+        Scenario("GET", "/api/business/{business_id}", lambda fx, i: {"url": f"/api/business/{fx.business_id}"}),
+        Scenario("POST", "/api/business/metrics", lambda fx, i: {
+            "url": "/api/business/metrics", "json": _metric(fx.writer_id, "bench_single", i)}),
+        Scenario("POST", "/api/business/metrics/batch", lambda fx, i: {
+            "url": "/api/business/metrics/batch",
+            "json": [_metric(fx.writer_id, "bench_batch", i * args.batch_rows + k) for k in range(args.batch_rows)]}),
+        Scenario("POST", "/api/business/metrics/ingest", lambda fx, i: {
+            "url": "/api/business/metrics/ingest",
+            "content": _ndjson(_metric(fx.writer_id, "bench_ingest", i * args.ingest_rows + k) for k in range(args.ingest_rows)),
+            "headers": {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}}),
+        Scenario("GET", "/api/business/{business_id}/metrics", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/metrics", "params": {"limit": 100, "metric_type": "revenue"}}),
+        Scenario("GET", "/api/business/{business_id}/metrics/monthly", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/metrics/monthly",
+            "params": {"metric_type": "revenue", "months": 24, "end": "2024-12", "yoy": "true"}}),
+        Scenario("GET", "/api/business/{business_id}/forecast", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/forecast", "params": {"metric_type": "revenue"}}),
+        Scenario("GET", "/api/business/{business_id}/anomalies", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/anomalies"}),
+        Scenario("GET", "/api/business/{business_id}/kpis", lambda fx, i: {"url": f"/api/business/{fx.business_id}/kpis"}),
+        Scenario("GET", "/api/business/{business_id}/revenue-trends", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/revenue-trends"}),
+        Scenario("GET", "/api/business/{business_id}/growth-by-category", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/growth-by-category"}),
+        Scenario("GET", "/api/business/{business_id}/dashboard", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/dashboard"}),
+        Scenario("GET", "/api/business/{business_id}/export/metrics", lambda fx, i: {
+            "url": f"/api/business/{fx.business_id}/export/metrics"}, max_requests=args.export_requests),
+        Scenario("GET", "/api/business/debug/all-metrics", lambda fx, i: {"url": "/api/business/debug/all-metrics"}),
+
+        # ai.py
+        Scenario("POST", "/api/ai/insights/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/insights/{ai_tenant(fx, i)}"}, ai=True),
+        Scenario("POST", "/api/ai/insights/{business_id}/stream", lambda fx, i: {
+            "url": f"/api/ai/insights/{ai_tenant(fx, i)}/stream"}, ai=True),
+        Scenario("POST", "/api/ai/analyze-metrics/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/analyze-metrics/{ai_tenant(fx, i)}"}, ai=True),
+        Scenario("POST", "/api/ai/growth-plan/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/growth-plan/{ai_tenant(fx, i)}", "params": {"timeframe": f"{i % 24 + 1} months"}}, ai=True),
+        Scenario("GET", "/api/ai/market-insights/{industry}", lambda fx, i: {
+            "url": f"/api/ai/market-insights/Industry {i}"}, ai=True),
+        Scenario("POST", "/api/ai/ask", lambda fx, i: {"url": "/api/ai/ask", "json": {
+            "business_id": ai_tenant(fx, i), "query": f"How do we grow revenue, take {i}?"}}, ai=True),
+        Scenario("POST", "/api/ai/ask/stream", lambda fx, i: {"url": "/api/ai/ask/stream", "json": {
+            "business_id": ai_tenant(fx, i), "query": f"How do we keep customers, take {i}?"}}, ai=True),
+        Scenario("POST", "/api/ai/recommendations/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/recommendations/{ai_tenant(fx, i)}", "params": {"focus_area": f"area {i}"}}, ai=True),
+        Scenario("POST", "/api/ai/jobs/growth-plan/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/jobs/growth-plan/{ai_tenant(fx, i)}", "params": {"timeframe": f"job {i}"}}, ai=True),
+        Scenario("POST", "/api/ai/jobs/recommendations/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/jobs/recommendations/{ai_tenant(fx, i)}", "params": {"focus_area": f"job {i}"}}, ai=True),
+        Scenario("GET", "/api/ai/jobs/{job_id}", lambda fx, i: {"url": f"/api/ai/jobs/{fx.job_id}"}),
+        Scenario("GET", "/api/ai/history/{business_id}", lambda fx, i: {
+            "url": f"/api/ai/history/{fx.business_id}", "params": {"limit": 20}}),
+        Scenario("GET", "/api/ai/history/{business_id}/export", lambda fx, i: {
+            "url": f"/api/ai/history/{fx.business_id}/export"}, max_requests=args.export_requests),
+        Scenario("GET", "/api/ai/history/{business_id}/{interaction_id}", lambda fx, i: {
+            "url": f"/api/ai/history/{fx.business_id}/{fx.interaction_ids[i % len(fx.interaction_ids)]}"}),
+        Scenario("GET", "/api/ai/stats", lambda fx, i: {"url": "/api/ai/stats"}),
+
+        # auth.py
+        Scenario("POST", "/api/auth/signup", lambda fx, i: {"url": "/api/auth/signup", "json": {
+            "name": f"Signup {i}", "email": f"signup.{i}.{fx.run_id}@bench.example.com", "password": PASSWORD,
+            "industry": "Retail", "description": "Benchmark"}}),
+        Scenario("POST", "/api/auth/login", lambda fx, i: {"url": "/api/auth/login", "json": {
+            "email": fx.email, "password": PASSWORD}}),
+        Scenario("GET", "/api/auth/me", lambda fx, i: {"url": "/api/auth/me", "headers": auth(fx)}),
+        Scenario("POST", "/api/auth/complete-metrics/{business_id}", lambda fx, i: {
+            "url": f"/api/auth/complete-metrics/{fx.incomplete_ids[i % len(fx.incomplete_ids)]}"}),
+    ]
+
+
+def uncovered_routes(driven):
+    """Routes of the benchmarked routers that no scenario drives"""
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if getattr(route, "path", "").startswith(ROUTE_PREFIXES)
+        for method in getattr(route, "methods", ()) - {"HEAD"}
+    }
+    return sorted(routes - {(s.method, s.route) for s in driven})
+
+
+async def signup(http, name, email):
+    response = await http.post("/api/auth/signup", json={
+        "name": name, "email": email, "password": PASSWORD, "industry": "Retail", "description": "Benchmark tenant"})
+    response.raise_for_status()
+    return response.json()
+
+
+async def seed_interactions(business_id, count):
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        doc = database.interaction_document(business_id, f"Question {i}", "Synthetic answer. " * (20 + i % 200), "question")
+        doc["timestamp"] = now - timedelta(minutes=count - i)
+        docs.append(doc)
+    ids = []
+    for start in range(0, len(docs), 10_000):
+        result = await database.get_interactions_collection().insert_many(docs[start:start + 10_000])
+        ids.extend(str(inserted) for inserted in result.inserted_ids)
+    return ids[-100:]
+
+
+async def setup_fixture(http, scale, args):
+    run_id = f"{scale}-{uuid.uuid4().hex[:8]}"
+    email = f"primary.{run_id}@bench.example.com"
+    primary = await signup(http, f"Primary {scale}", email)
+    fx = SimpleNamespace(run_id=run_id, email=email, token=primary["access_token"], business_id=primary["business_id"])
+
+    started = time.perf_counter()
+    await seed_metrics(fx.business_id, scale, periods=args.periods)
+    await rebuild_rollups(fx.business_id)
+    fx.interaction_ids = await seed_interactions(fx.business_id, args.interactions)
+    fx.writer_id = (await signup(http, f"Writer {scale}", f"writer.{run_id}@bench.example.com"))["business_id"]
+    fx.ai_tenants = []
+    for i in range(args.ai_tenants):
+        tenant = await signup(http, f"AI Tenant {i}", f"ai.{i}.{run_id}@bench.example.com")
+        await seed_metrics(tenant["business_id"], 96, periods=24, seed=i)
+        await rebuild_rollups(tenant["business_id"])
+        fx.ai_tenants.append(tenant["business_id"])
+    # complete-metrics 404s on a business that is already marked, so each request gets a fresh one
+    result = await database.get_businesses_collection().insert_many([
+        {"name": f"Incomplete {i}", "industry": "Retail", "description": "Benchmark",
+         "owner_email": f"incomplete.{i}.{run_id}@bench.example.com", "has_completed_metrics": False}
+        for i in range(args.requests)
+    ])
+    fx.incomplete_ids = [str(inserted) for inserted in result.inserted_ids]
+    job = await http.post(f"/api/ai/jobs/recommendations/{fx.ai_tenants[0]}", params={"focus_area": "fixture"})
+    job.raise_for_status()
+    fx.job_id = job.json()["job_id"]
+    print(f"\nscale {scale:,}: seeded in {time.perf_counter() - started:.1f}s")
+    return fx
+
+
+async def teardown_fixture(fx):
+    businesses = database.get_businesses_collection()
+    async for business in businesses.find({"owner_email": {"$regex": f"{fx.run_id}@bench\\.example\\.com$"}}, {"_id": 1}):
+        await drop_business(str(business["_id"]))
+
+
+async def sample_loop_lag(stop, lags_ms, interval=0.01):
+    """Record how late the event loop wakes a short sleep until stop is set"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags_ms.append(max(0.0, loop.time() - started - interval) * 1000)
+
+
+async def drive(http, scenario, fx, total, concurrency):
+    samples, statuses, lags = [], Counter(), []
+    counter = itertools.count()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(stop, lags))
+
+    async def worker():
+        while (i := next(counter)) < total:
+            request = scenario.build(fx, i)
+            started = time.perf_counter()
+            try:
+                response = await http.request(scenario.method, **request)
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            samples.append((time.perf_counter() - started) * 1000)
+            statuses[str(response.status_code)] += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    finally:
+        stop.set()
+        await sampler
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": min(concurrency, total),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "statuses": dict(statuses),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary(samples),
+        "loop_lag_ms": latency_summary(lags),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        database.AsyncIOMotorClient = AsyncMongoMockClient
+
+    with FakeGeminiServer(config_from_args(args), port=args.gemini_port) as gemini:
+        from google import genai
+        from google.genai import types
+
+        gemini_module.client = genai.Client(api_key="benchmark", http_options=types.HttpOptions(base_url=gemini.base_url))
+        if not args.ai_cache:
+            for method in gemini_module.CACHE_TTL_SECONDS:
+                gemini_module.CACHE_TTL_SECONDS[method] = 0
+
+        selected = [s for s in scenarios(args) if not args.routes or any(pattern in s.route for pattern in args.routes)]
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "started_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "mongomock": args.mongomock,
+                "args": {key: value for key, value in vars(args).items() if key != "compare"},
+                "uncovered_routes": [f"{method} {path}" for method, path in uncovered_routes(scenarios(args))],
+            },
+            "scales": {},
+        }
+        for route in results["meta"]["uncovered_routes"]:
+            print(f"warning: no scenario drives {route}")
+        blocked = []
+
+        await app.router.startup()
+        try:
+            async with http_client() as http:
+                for scale in args.scales:
+                    fx = await setup_fixture(http, scale, args)
+                    scale_results = results["scales"][str(scale)] = {}
+                    try:
+                        for scenario in selected:
+                            total = args.ai_requests if scenario.ai else args.requests
+                            if scenario.max_requests is not None:
+                                total = min(total, scenario.max_requests)
+                            result = await drive(http, scenario, fx, total, args.concurrency)
+                            scale_results[f"{scenario.method} {scenario.route}"] = result
+                            latency, lag = result["latency_ms"], result["loop_lag_ms"]
+                            if (lag["p99"] or 0) > args.max_loop_lag_ms:
+                                blocked.append(f"{scale}: {scenario.method} {scenario.route}")
+                            print(
+                                f"{scenario.method + ' ' + scenario.route:<58} {result['throughput_rps'] or 0:>9.1f} req/s "
+                                f"p50={latency['p50'] or 0:>9.2f} p95={latency['p95'] or 0:>9.2f} p99={latency['p99'] or 0:>9.2f}ms "
+                                f"loop lag p99={lag['p99'] or 0:>7.2f}ms"
+                                + (f"  errors={result['errors']} {result['statuses']}" if result["errors"] else "")
+                            )
+                    finally:
+                        await teardown_fixture(fx)
+            results["meta"]["loop_blocked_routes"] = blocked
+            results["meta"]["fake_gemini"] = gemini.stats
+            results["meta"]["ai_stats"] = gemini_module.gemini_service.stats()
+            if not args.keep_database and "benchmark" in database.settings.database_name:
+                await database.client.drop_database(database.settings.database_name)
+        finally:
+            await app.router.shutdown()
+
+    output = args.output or os.path.join("benchmarks", "results", f"{datetime.utcnow():%Y%m%dT%H%M%S}-{results['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {output}")
+    for route in results["meta"]["loop_blocked_routes"]:
+        print(f"event loop blocked: p99 lag above {args.max_loop_lag_ms}ms during {route}")
+    return 1 if results["meta"]["loop_blocked_routes"] else 0
+
+
+def compare(before_path, after_path, threshold):
+    """Print per-route latency changes; return 1 if any p95 regressed by more than threshold percent"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    regressed = False
+    for scale, routes in after["scales"].items():
+        print(f"\nscale {int(scale):,}")
+        for route, result in routes.items():
+            old = before["scales"].get(scale, {}).get(route)
+            if not old or old["latency_ms"]["p95"] is None or result["latency_ms"]["p95"] is None:
+                continue
+            changes = []
+            for pct in ("p50", "p95", "p99"):
+                was, now = old["latency_ms"][pct], result["latency_ms"][pct]
+                changes.append(f"{pct} {was:>8.2f} -> {now:>8.2f}ms ({(now - was) / was * 100 if was else 0:+6.1f}%)")
+            was, now = old["latency_ms"]["p95"], result["latency_ms"]["p95"]
+            flag = was and (now - was) / was * 100 > threshold
+            regressed = regressed or bool(flag)
+            print(f"{route:<58} {'  '.join(changes)}{'  REGRESSION' if flag else ''}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 100_000], help="Metrics seeded for the measured tenant, e.g. 1000 100000 10000000")
+    parser.add_argument("--periods", type=int, default=36, help="Months the seeded metrics span")
+    parser.add_argument("--interactions", type=int, default=1_000)
+    parser.add_argument("--ai-tenants", type=int, default=8, help="Tenants the AI routes rotate over")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per non-AI route")
+    parser.add_argument("--ai-requests", type=int, default=40, help="Requests per AI route")
+    parser.add_argument("--export-requests", type=int, default=3, help="Cap for the full-export routes")
+    parser.add_argument("--batch-rows", type=int, default=50)
+    parser.add_argument("--ingest-rows", type=int, default=1_000)
+    parser.add_argument("--routes", nargs="*", help="Only routes containing any of these substrings")
+    parser.add_argument("--ai-cache", action="store_true", help="Keep the AI response cache on")
+    parser.add_argument("--mongomock", action="store_true", help="Use mongomock-motor instead of a MongoDB server")
+    parser.add_argument("--keep-database", action="store_true")
+    parser.add_argument("--gemini-port", type=int, default=8765)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 increase in percent reported as a regression")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=100.0, help="p99 event-loop lag a route may cause under load")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    sys.exit(asyncio.run(run(args)))
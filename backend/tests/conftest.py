@@ -0,0 +1,6 @@
+"""Test defaults; set before app modules read their settings"""
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("DATABASE_NAME", "business_growth_test")
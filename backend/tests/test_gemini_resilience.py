@@ -0,0 +1,37 @@
+import asyncio
+import socket
+
+import pytest
+from google import genai
+from google.genai import types
+
+from app.services import gemini_service as gemini_module
+from app.services.gemini_service import GeminiService, GeminiUnavailableError
+from app.services.resilience import CircuitBreaker, OPEN
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_breaker_opens_when_upstream_refuses_connections(monkeypatch):
+    base_url = f"http://127.0.0.1:{closed_port()}"
+    monkeypatch.setattr(gemini_module, "client", genai.Client(
+        api_key="test", http_options=types.HttpOptions(base_url=base_url, timeout=2000)
+    ))
+    monkeypatch.setattr(gemini_module.settings, "gemini_max_retries", 1)
+    monkeypatch.setattr(gemini_module.settings, "gemini_retry_base_delay_seconds", 0.01)
+    service = GeminiService()
+    service.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    for _ in range(2):
+        with pytest.raises(GeminiUnavailableError, match="after 2 attempts"):
+            asyncio.run(service._call_model("hello", "test"))
+
+    assert service.breaker.stats()["state"] == OPEN
+    assert service.breaker.stats()["times_opened"] == 1
+    with pytest.raises(GeminiUnavailableError, match="circuit open"):
+        asyncio.run(service._call_model("hello", "test"))
+    assert service.breaker.stats()["short_circuited"] == 1
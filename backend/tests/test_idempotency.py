@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import UpdateResult
+
+from app.config import get_settings
+from app.services import idempotency
+from app.services.idempotency import IdempotencyConflict, StreamDigest, idempotent
+
+
+class FakeKeys:
+    """Just enough of the idempotency_keys collection; expire_on_read drops a document when it is next read"""
+
+    def __init__(self):
+        self.docs = {}
+        self.expire_on_read = set()
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate key")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def find_one(self, query):
+        if query["_id"] in self.expire_on_read:
+            self.expire_on_read.discard(query["_id"])
+            self.docs.pop(query["_id"], None)
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    @staticmethod
+    def matches(doc, query):
+        for field, value in query.items():
+            if isinstance(value, dict) and "$exists" in value:
+                if (field in doc) != value["$exists"]:
+                    return False
+            elif doc.get(field) != value:
+                return False
+        return True
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if doc is None or not self.matches(doc, query):
+            return UpdateResult({"nModified": 0}, acknowledged=True)
+        doc.update(update.get("$set", {}))
+        return UpdateResult({"nModified": 1}, acknowledged=True)
+
+    async def delete_one(self, query):
+        doc = self.docs.get(query["_id"])
+        if doc is not None and self.matches(doc, query):
+            del self.docs[query["_id"]]
+
+def body(data: bytes) -> StreamDigest:
+    async def chunks():
+        yield data
+    return StreamDigest(chunks())
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    fake = FakeKeys()
+    monkeypatch.setattr(idempotency, "get_idempotency_collection", lambda: fake)
+    return fake
+
+
+def run(key, data, calls):
+    async def call():
+        calls.append(data)
+        return {"received": len(data)}
+    return asyncio.run(idempotent("metrics/ingest", key, call, "options", body=body(data)))
+
+
+def test_replay_after_expired_reservation_still_checks_the_body(keys):
+    calls = []
+    # A stale record that expires between the failed insert and the read sends the call down the retry branch
+    keys.docs["metrics/ingest:k1"] = {"_id": "metrics/ingest:k1", "fingerprint": "options", "response": {"received": 0}}
+    keys.expire_on_read.add("metrics/ingest:k1")
+
+    assert run("k1", b"first body", calls) == {"received": 10}
+    assert run("k1", b"first body", calls) == {"received": 10}
+    with pytest.raises(IdempotencyConflict):
+        run("k1", b"other body", calls)
+    assert calls == [b"first body"]
+
+
+def reservation(key, age_seconds):
+    reserved_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    return {"_id": f"metrics/ingest:{key}", "fingerprint": "options", "created_at": reserved_at, "reserved_at": reserved_at}
+
+
+def test_retry_takes_over_an_abandoned_reservation(keys):
+    calls = []
+    lease = get_settings().idempotency_lease_seconds
+    keys.docs["metrics/ingest:k2"] = reservation("k2", lease + 1)
+
+    assert run("k2", b"body", calls) == {"received": 4}
+    assert calls == [b"body"]
+    assert keys.docs["metrics/ingest:k2"]["response"] == {"received": 4}
+    # The finished key now replays instead of running again
+    assert run("k2", b"body", calls) == {"received": 4}
+    assert calls == [b"body"]
+
+
+def test_retry_within_the_lease_is_still_in_progress(keys):
+    calls = []
+    keys.docs["metrics/ingest:k3"] = reservation("k3", 1)
+
+    with pytest.raises(IdempotencyConflict, match="still in progress"):
+        run("k3", b"body", calls)
+    assert calls == []
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import JobQueue
+
+
+class FakeJobs:
+    """Just enough of the ai_jobs collection; before_read runs once, after find_one has taken its snapshot"""
+
+    def __init__(self):
+        self.docs = {}
+        self.before_read = None
+
+    @staticmethod
+    def matches(doc, query):
+        return all(doc.get(field) == value for field, value in query.items())
+
+    async def find_one(self, query):
+        doc = next((dict(d) for d in self.docs.values() if self.matches(d, query)), None)
+        if self.before_read:
+            hook, self.before_read = self.before_read, None
+            await hook()
+        return doc
+
+    async def find_one_and_update(self, query, update):
+        doc = next((d for d in self.docs.values() if self.matches(d, query)), None)
+        if doc is None:
+            return None
+        before = dict(doc)
+        doc.update(update.get("$set", {}))
+        return before
+
+    async def update_one(self, query, update):
+        for doc in self.docs.values():
+            if self.matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for field in update.get("$unset", {}):
+                    doc.pop(field, None)
+                return
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    fake = FakeJobs()
+    monkeypatch.setattr(job_queue_module, "get_jobs_collection", lambda: fake)
+    return fake
+
+
+def test_long_poll_wakes_when_the_job_finishes_right_after_the_status_read(jobs):
+    queue = JobQueue()
+
+    async def handler(business_id, params):
+        return {"report": business_id}
+    queue.register("report", handler)
+
+    job_id = ObjectId()
+    jobs.docs[job_id] = {"_id": job_id, "kind": "report", "business_id": "b1", "params": {}, "status": "queued", "active": True}
+    # The worker finishes the job after get() has read it as queued but before it starts waiting
+    jobs.before_read = lambda: queue._run(job_id)
+
+    started = time.monotonic()
+    job = asyncio.run(queue.get(str(job_id), wait=5))
+
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"report": "b1"}
+    assert time.monotonic() - started < 1
+    assert not queue._finished and not queue._waiters
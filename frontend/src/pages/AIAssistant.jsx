@@ -52,18 +52,24 @@ function AIAssistant() {
     setInput('');
     setLoading(true);
 
+    // Append an empty AI message and grow it as chunks stream in
+    setMessages(prev => [...prev, { type: 'ai', content: '' }]);
+    const updateLastMessage = (update) => setMessages(prev => {
+      const last = prev[prev.length - 1];
+      return [...prev.slice(0, -1), { ...last, content: update(last.content) }];
+    });
+
     try {
-      const response = await aiAPI.askQuestion({
-        business_id: selectedBusiness.id,
-        query: input,
-      });
-      
-      const aiMessage = { type: 'ai', content: response.data.response };
-      setMessages(prev => [...prev, aiMessage]);
+      await aiAPI.streamQuestion(
+        { business_id: selectedBusiness.id, query: input },
+        (text) => {
+          setLoading(false);
+          updateLastMessage(content => content + text);
+        }
+      );
     } catch (error) {
       console.error('Error sending message:', error);
-      const errorMessage = { type: 'ai', content: 'Sorry, I encountered an error. Please try again.' };
-      setMessages(prev => [...prev, errorMessage]);
+      updateLastMessage(() => 'Sorry, I encountered an error. Please try again.');
     }
     setLoading(false);
   };
@@ -114,7 +120,7 @@ function AIAssistant() {
                       <p>Start a conversation with your AI business advisor</p>
                     </div>
                   )}
-                  {messages.map((msg, idx) => (
+                  {messages.map((msg, idx) => msg.content && (
                     <div key={idx} className={`message ${msg.type}`}>
                       {msg.content}
                     </div>
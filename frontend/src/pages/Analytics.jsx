@@ -34,23 +34,20 @@ function Analytics() {
     if (!user?.business_id) return;
 
     try {
-      const [kpisRes, revenueRes, growthRes, metricsRes] = await Promise.all([
-        businessAPI.getKpis(user.business_id),
-        businessAPI.getRevenueTrends(user.business_id),
-        businessAPI.getGrowthByCategory(user.business_id),
-        businessAPI.getMetrics(user.business_id),
+      const [dashboardRes, metricsRes] = await Promise.all([
+        businessAPI.getDashboard(user.business_id),
+        // Only used to check whether any metrics exist
+        businessAPI.getMetrics(user.business_id, { limit: 1, fields: 'period' }),
       ]);
 
       // Add console logs to debug
-      console.log("KPIs Response:", kpisRes.data);
-      console.log("Revenue Trends Response:", revenueRes.data);
-      console.log("Growth Data Response:", growthRes.data);
+      console.log("Dashboard Response:", dashboardRes.data);
       console.log("Metrics Response:", metricsRes.data);
 
-      setKpis(kpisRes.data);
-      setRevenueData(revenueRes.data);
-      setGrowthData(growthRes.data);
-      setMetrics(metricsRes.data);
+      setKpis(dashboardRes.data.kpis);
+      setRevenueData(dashboardRes.data.revenue_trends);
+      setGrowthData(dashboardRes.data.growth_by_category);
+      setMetrics(metricsRes.data.items);
     } catch (error) {
       console.error("Error loading analytics data:", error);
     }
@@ -8,11 +8,52 @@ export const businessAPI = {
   list: () => axios.get('/api/business/'),
   get: (id) => axios.get(`/api/business/${id}`),
   addMetric: (data) => axios.post('/api/business/metrics', data),
-  getMetrics: (businessId) => axios.get(`/api/business/${businessId}/metrics`),
+  getMetrics: (businessId, params = {}) => axios.get(`/api/business/${businessId}/metrics`, { params }),
+  getMonthlyMetric: (businessId, params = {}) => axios.get(`/api/business/${businessId}/metrics/monthly`, { params }),
+  getForecast: (businessId, params = {}) => axios.get(`/api/business/${businessId}/forecast`, { params }),
+  getAnomalies: (businessId, params = {}) => axios.get(`/api/business/${businessId}/anomalies`, { params }),
   addMetricsBatch: (data) => axios.post('/api/business/metrics/batch', data),
   getKpis: (businessId) => axios.get(`/api/business/${businessId}/kpis`),
   getRevenueTrends: (businessId) => axios.get(`/api/business/${businessId}/revenue-trends`),
   getGrowthByCategory: (businessId) => axios.get(`/api/business/${businessId}/growth-by-category`),
+  getDashboard: (businessId) => axios.get(`/api/business/${businessId}/dashboard`),
+};
+
+// Reads a server-sent-event stream, calling onText for every chunk.
+// Resolves with the payload of the final "done" event.
+const streamSSE = async (url, body, onText) => {
+  const response = await fetch(`${axios.defaults.baseURL}${url}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: axios.defaults.headers.common['Authorization'] || '',
+    },
+    body: body ? JSON.stringify(body) : undefined,
+  });
+  if (!response.ok) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = raw.match(/^event: (.*)$/m)?.[1] || 'message';
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+      if (event === 'done') return data;
+      if (event === 'error') throw new Error(data.detail);
+      onText(data.text);
+    }
+  }
+  throw new Error('Stream ended unexpectedly');
 };
 
 // AI APIs
@@ -23,10 +64,19 @@ export const aiAPI = {
     axios.post(`/api/ai/growth-plan/${businessId}?timeframe=${encodeURIComponent(timeframe)}`),
   getMarketInsights: (industry) => axios.get(`/api/ai/market-insights/${encodeURIComponent(industry)}`),
   askQuestion: (data) => axios.post('/api/ai/ask', data),
+  streamInsights: (businessId, onText) => streamSSE(`/api/ai/insights/${businessId}/stream`, null, onText),
+  streamQuestion: (data, onText) => streamSSE('/api/ai/ask/stream', data, onText),
   getRecommendations: (businessId, focusArea = 'general') => 
     axios.post(`/api/ai/recommendations/${businessId}?focus_area=${focusArea}`),
-  getHistory: (businessId, limit = 10) => 
-    axios.get(`/api/ai/history/${businessId}?limit=${limit}`),
+  getHistory: (businessId, limit = 10, cursor = null) => 
+    axios.get(`/api/ai/history/${businessId}`, { params: { limit, cursor } }),
+  getInteraction: (businessId, interactionId) =>
+    axios.get(`/api/ai/history/${businessId}/${interactionId}`),
+  submitGrowthPlanJob: (businessId, timeframe = '6 months') =>
+    axios.post(`/api/ai/jobs/growth-plan/${businessId}?timeframe=${encodeURIComponent(timeframe)}`),
+  submitRecommendationsJob: (businessId, focusArea = 'general') =>
+    axios.post(`/api/ai/jobs/recommendations/${businessId}?focus_area=${encodeURIComponent(focusArea)}`),
+  getJob: (jobId, wait = 0) => axios.get(`/api/ai/jobs/${jobId}?wait=${wait}`),
 };
 
 export default axios;